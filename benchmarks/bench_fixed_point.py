@@ -0,0 +1,109 @@
+"""
+Benchmark of the fixed point path of the monetary checks (a check with "decimals", see
+process_function.load_checks).
+
+Random amounts in cents are drawn for every store (see fixtures.draw_cents), for a relative and
+an absolute check:
+
+- random: GPT amounts up to 10 million, the portal amounts off by up to 0.2%
+- boundary: the deviation is the tolerance of the relative check (half of the stores) or of the
+  absolute check, give or take a cent
+- large: GPT amounts up to 10**11, off by up to 0.1%
+
+For each run, the statuses of the float64 path (the same check without decimals) are compared
+with those of the fixed point path, to count the statuses that rounding noise flips. The fixed
+point path itself is checked against a decimal.Decimal reference by tests/test_fixed_point.py.
+Then store_level_summary is timed with and without decimals on the synthetic reports of
+fixtures.synthetic_reports.
+
+The results are written to ``benchmarks/results/fixed_point.json``.
+
+Usage
+-----
+    python benchmarks/bench_fixed_point.py [--stores 200000] [--runs 20] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import time
+
+import numpy as np
+
+from fixtures import draw_cents, synthetic_reports
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+CHECKS = [
+    {"name": "relative", "gpt_column": "GPT", "portal_column": "portal", "level": "store", "tolerance": 0.0005, "mode": "relative"},
+    {"name": "absolute", "gpt_column": "GPT", "portal_column": "portal", "level": "store", "tolerance": 0.25, "mode": "absolute"},
+]
+
+
+def float_mismatches(GPT_cents, portal_cents, checks):
+    """
+    Count the statuses of the float64 path that differ from the fixed point path, per check.
+    """
+    from summary_comp.process_function import check_deviations, check_status_codes, load_checks
+
+    # the amounts as they are read from the reports, e.g. 1234.56 parsed to the nearest float64
+    GPT_values = np.repeat((GPT_cents / 100)[:, np.newaxis], len(checks), axis=1)
+    portal_values = np.repeat((portal_cents / 100)[:, np.newaxis], len(checks), axis=1)
+    fixed_checks = load_checks([{**check, "decimals": 2} for check in checks])
+    float_checks = load_checks(checks)
+    fixed_status = check_status_codes(fixed_checks, GPT_values, check_deviations(fixed_checks, GPT_values, portal_values))
+    float_status = check_status_codes(float_checks, GPT_values, check_deviations(float_checks, GPT_values, portal_values))
+    return {check["name"]: int((float_status[:, i] != fixed_status[:, i]).sum()) for i, check in enumerate(checks)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stores", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--property-stores", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "results", "fixed_point.json"))
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    from summary_comp.process_function import DEFAULT_CHECKS, store_level_summary
+
+    results = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "runs": args.runs,
+        "property_stores": args.property_stores,
+        "cases": {},
+    }
+    for case in ("random", "boundary", "large"):
+        mismatches = {check["name"]: 0 for check in CHECKS}
+        for run in range(args.runs):
+            GPT_cents, portal_cents = draw_cents(case, args.property_stores, np.random.default_rng(run))
+            for name, count in float_mismatches(GPT_cents, portal_cents, CHECKS).items():
+                mismatches[name] += count
+        results["cases"][case] = {"stores": args.runs * args.property_stores, "float64_status_mismatches": mismatches}
+        print(f"{case:>9}: float64 statuses off the fixed point ones on {args.runs * args.property_stores} stores: {mismatches}")
+
+    reports = synthetic_reports(args.stores)
+    float_checks = [{key: value for key, value in check.items() if key != "decimals"} for check in DEFAULT_CHECKS]
+    timings = {}
+    for name, checks in (("float64", float_checks), ("fixed_point", DEFAULT_CHECKS)):
+        durations = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            store_level_summary(reports["GPT_summary_per_store"], reports["portal_summary_per_store"], checks)
+            durations.append((time.perf_counter() - start) * 1000)
+        timings[name] = round(statistics.median(durations), 1)
+    results["store_level_summary_ms"] = {"stores": args.stores, **timings}
+    print(f"store_level_summary of {args.stores} stores: float64 {timings['float64']} ms, fixed point {timings['fixed_point']} ms")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
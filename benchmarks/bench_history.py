@@ -0,0 +1,124 @@
+"""
+Benchmark of the history store: appending the summaries of many report dates and markets, and
+the trend queries over them.
+
+The store level summaries of synthetic reports (see fixtures.synthetic_reports) are appended to a
+local history for every market and date, then timed:
+
+- append: adding the summaries of one validation
+- chronic_failures: the stores failing a check on 3 or more of the last 14 days of every market
+- chronic_failures_full_read: the same, reading every column of the parts and filtering in pandas
+- overall_trend: the overall checks of one market over all the dates
+
+The results are written to ``benchmarks/results/history.json``.
+
+Usage
+-----
+    python benchmarks/bench_history.py [--stores 10000] [--days 30] [--markets 4] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from fixtures import synthetic_reports
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def timed(function, repeat):
+    """
+    Run a function repeat times.
+
+    Returns
+    -------
+    tuple:
+        The median wall time in ms and the result of the last run.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(durations), 1), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stores", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--markets", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "results", "history.json"))
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    from summary_comp.history import STORE_HISTORY, HistoryStore
+    from summary_comp.process_function import evaluate_overall_checks, load_checks, store_level_summary
+
+    checks = load_checks()
+    markets = [f"market{number}" for number in range(args.markets)]
+    dates = [date(2024, 1, 1) + timedelta(days=day) for day in range(args.days)]
+    # a few summaries are reused over the dates, generating the reports is not what is measured
+    summaries = []
+    for seed in range(3):
+        reports = synthetic_reports(args.stores, mismatch_rate=0.02, seed=seed)
+        summaries.append((
+            store_level_summary(reports["GPT_summary_per_store"], reports["portal_summary_per_store"], checks),
+            evaluate_overall_checks(reports["GPT_overall_summary"].rename(columns={"total_units": "total_alacarte_units"}), reports["portal_overall_summary"], checks),
+        ))
+
+    with tempfile.TemporaryDirectory() as directory:
+        history = HistoryStore(directory)
+        append_durations = []
+        for market_number, market in enumerate(markets):
+            for day, report_date in enumerate(dates):
+                store_summary, overall_summary = summaries[(market_number + day) % len(summaries)]
+                start = time.perf_counter()
+                history.append(market, report_date.strftime("%Y%m%d"), store_summary, overall_summary, checks)
+                append_durations.append((time.perf_counter() - start) * 1000)
+
+        def chronic_full_read():
+            # every column of the parts, as if the reports were read back whole
+            frame = history.read(STORE_HISTORY, days=14)
+            failures = frame[frame["Status"] == "FAIL"]
+            counts = failures.groupby(["market", "Global_Store_Id", "Check"], observed=True)["report_date"].nunique()
+            return counts[counts >= 3]
+
+        results = {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "stores": args.stores,
+            "days": args.days,
+            "markets": args.markets,
+            "store_history_rows": args.stores * len([check for check in checks if check["level"] == "store"]) * args.days * args.markets,
+            "append_ms": round(statistics.median(append_durations), 1),
+            "history_bytes": sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names),
+            "queries": {},
+        }
+        results["queries"]["index"], index = timed(history.index, args.repeat)
+        results["queries"]["chronic_failures"], chronic = timed(lambda: history.chronic_failures(min_failures=3, days=14), args.repeat)
+        results["queries"]["chronic_failures_full_read"], full = timed(chronic_full_read, args.repeat)
+        results["queries"]["overall_trend"], trend = timed(lambda: history.overall_trend([markets[0]]), args.repeat)
+        if len(chronic) != len(full):
+            raise AssertionError(f"{len(chronic)} chronic failures, the full read found {len(full)}")
+        results["parts"] = len(index)
+        results["chronic_failures"] = len(chronic)
+        results["overall_trend_rows"] = len(trend)
+
+    print(f"{results['store_history_rows']} store history rows in {results['parts']} parts, {results['history_bytes']} bytes, append {results['append_ms']} ms")
+    for name, duration in results["queries"].items():
+        print(f"{name:>28} {duration:>10.1f} ms")
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
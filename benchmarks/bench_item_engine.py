@@ -0,0 +1,120 @@
+"""
+Benchmark of the item level comparison on synthetic item extracts (see fixtures.write_item_extracts).
+
+Each scenario runs in its own process, so that its peak RSS is its own:
+
+- streamed: compare_item_extracts with the default ITEM_CHUNKSIZE
+- one_chunk: compare_item_extracts reading each extract as one chunk
+- pandas_merge: both extracts loaded whole, grouped by store and item id and outer merged
+
+The results are written to ``benchmarks/results/item_engine.json``.
+
+Usage
+-----
+    python benchmarks/bench_item_engine.py [--stores 2000] [--items 500] [--days 5]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from fixtures import ITEM_CHECKS, PATH_PREFIXES, write_item_extracts
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_DATE = "20240131"
+
+
+def run_scenario(scenario, root):
+    """
+    Run one scenario in this process.
+
+    Returns
+    -------
+    dict:
+        The wall time, the peak RSS and the failing items found.
+    """
+    import pandas as pd
+
+    from summary_comp.items import GPT_ITEM_KEY, PORTAL_ITEM_KEY, compare_item_extracts
+    from summary_comp.metrics import peak_rss_mb
+    from summary_comp.process_function import GPT_STORE_KEY, PORTAL_STORE_KEY
+
+    portal_report_path = f"{root}portal/{PATH_PREFIXES['portal_path_prefix']}{REPORT_DATE}.xlsx"
+    start = time.perf_counter()
+    if scenario == "pandas_merge":
+        GPT = pd.read_csv(f"{root}gpt/Daily_Pmix_ItemXStore_{REPORT_DATE}.txt.gz", sep="\t", dtype={GPT_ITEM_KEY: str})
+        portal = pd.read_parquet(f"{root}portal/Daily_Pmix_ItemXStore_{REPORT_DATE}.parquet")
+        GPT = GPT.groupby([GPT_STORE_KEY, GPT_ITEM_KEY], sort=False)[["net_sales", "units"]].sum()
+        portal = portal.groupby([PORTAL_STORE_KEY, PORTAL_ITEM_KEY], sort=False)[["net_sales", "units"]].sum()
+        GPT.index.names = portal.index.names = ["store", "item"]
+        merged = GPT.join(portal, how="outer", lsuffix=" (GPT)", rsuffix=" (Portal)")
+        deviation = merged["net_sales (GPT)"] - merged["net_sales (Portal)"]
+        failing = int(((deviation.abs() > 0.0005 * merged["net_sales (GPT)"]) | (merged["units (GPT)"] != merged["units (Portal)"])).sum())
+    else:
+        chunksize = 1 << 40 if scenario == "one_chunk" else None
+        result = compare_item_extracts(portal_report_path, f"{root}gpt/", {}, REPORT_DATE, ITEM_CHECKS, **({"chunksize": chunksize} if chunksize else {}))
+        failing = int(result["stores"]["Failing Items"].sum())
+    return {"duration_s": round(time.perf_counter() - start, 2), "peak_rss_mb": peak_rss_mb(), "failing_items": failing}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stores", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--root", help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "results", "item_engine.json"))
+    args = parser.parse_args()
+
+    if args.scenario:
+        import contextlib
+        import io
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run_scenario(args.scenario, args.root)
+        print(json.dumps(result))
+        return
+
+    import pandas as pd
+
+    results = {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "stores": args.stores,
+        "items": args.items,
+        "days": args.days,
+        "scenarios": {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        root = directory + "/"
+        start = time.perf_counter()
+        paths = write_item_extracts(root, REPORT_DATE, args.stores, args.items, args.days)
+        print(f"{paths['rows']} rows per extract written in {time.perf_counter() - start:.1f} s")
+        results["rows"] = paths["rows"]
+        results["bytes"] = {"GPT": os.path.getsize(paths["GPT"]), "portal": os.path.getsize(paths["portal"])}
+        for scenario in ("streamed", "one_chunk", "pandas_merge"):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--scenario", scenario, "--root", root],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            results["scenarios"][scenario] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'scenario':>14} {'time (s)':>9} {'peak RSS (MB)':>14} {'failing items':>14}")
+    for name, scenario in results["scenarios"].items():
+        print(f"{name:>14} {scenario['duration_s']:>9.2f} {scenario['peak_rss_mb']:>14.1f} {scenario['failing_items']:>14}")
+    if len({scenario["failing_items"] for scenario in results["scenarios"].values()}) != 1:
+        raise AssertionError("the scenarios found different failing items")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Memory benchmark of the store level summary and of a full validation on synthetic reports.
+
+For the store count, the synthetic reports (see fixtures.py) are written once and each checkout
+(this one, and optionally a baseline one, e.g. a git worktree of an earlier commit) is measured in
+its own processes:
+
+- summary: the deep memory of the store level summary and the tracemalloc peak of store_level_summary
+- validation: the peak RSS of generate_validation_report (xlsx and parquet outputs, no email)
+
+Then the streamed comparison (store_chunksize) is measured on this checkout against the loaded one,
+on a GPT TotXStore file with far more stores than the portal's, as a multi-country file has:
+
+- streaming: the peak RSS of generate_validation_report (parquet output, no email), loaded and streamed
+
+The results are written to ``benchmarks/results/memory.json``.
+
+Usage
+-----
+    python benchmarks/bench_memory.py [--stores 50000] [--baseline-repo /tmp/baseline]
+                                      [--GPT-stores 1000000] [--store-chunksize 50000]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+from fixtures import PATH_PREFIXES, REPO_DIR, SHEET_NAMES, write_fixtures
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_DATE = "20240101"
+
+
+def run_scenario(scenario, paths, peak_rss_mb, store_chunksize=None):
+    """
+    Run one scenario with the summary_comp package first on sys.path, measuring the peak RSS with
+    the peak_rss_mb of this checkout.
+    """
+    import contextlib
+    import io
+    import tracemalloc
+
+    from summary_comp.process_function import generate_validation_report, read_files, store_level_summary
+
+    if scenario == "summary":
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, portal_summary_per_store, _, GPT_summary_per_store, _, _, _ = read_files(
+                paths["portal_report_path"], paths["GPT_report_path"], SHEET_NAMES, PATH_PREFIXES,
+            )
+        tracemalloc.start()
+        store_summary = store_level_summary(GPT_summary_per_store, portal_summary_per_store)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            "store_summary_bytes": int(store_summary.memory_usage(deep=True).sum()),
+            "store_level_summary_peak_bytes": peak,
+            "GPT_summary_per_store_bytes": int(GPT_summary_per_store.memory_usage(deep=True).sum()),
+            "dtypes": {str(dtype): int(count) for dtype, count in store_summary.dtypes.astype(str).value_counts().items()},
+        }
+    if scenario == "streaming":
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_validation_report(
+                "benchmark", "benchmark", paths["portal_report_path"], paths["GPT_report_path"], paths["summary_report_path"],
+                SHEET_NAMES, PATH_PREFIXES, "unused", "unused", 0, [], send_notification=False,
+                output_formats=["parquet"], store_chunksize=store_chunksize,
+            )
+        return {"peak_rss_mb": peak_rss_mb()}
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate_validation_report(
+            "benchmark", "benchmark", paths["portal_report_path"], paths["GPT_report_path"], paths["summary_report_path"],
+            SHEET_NAMES, PATH_PREFIXES, "unused", "unused", 0, [], send_notification=False,
+            output_formats=["xlsx", "parquet"], excel_engine="xlsxwriter",
+        )
+    return {"peak_rss_mb": peak_rss_mb()}
+
+
+def run_process(scenario, repo, paths, store_chunksize=None):
+    """
+    Run one scenario of one checkout in a new process.
+    """
+    command = [
+        sys.executable, os.path.abspath(__file__), "--scenario", scenario, "--repo", repo, "--paths", json.dumps(paths),
+        "--store-chunksize", str(store_chunksize or 0),
+    ]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(repo, paths):
+    """
+    Run the scenarios of one checkout, each in a new process.
+    """
+    result = {}
+    for scenario in ("summary", "validation"):
+        result.update(run_process(scenario, repo, paths))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stores", type=int, default=50000)
+    parser.add_argument("--baseline-repo", help="another checkout of the repository to measure, e.g. a git worktree of an earlier commit")
+    parser.add_argument("--GPT-stores", type=int, default=1000000, help="the stores of GPT's file of the streaming scenario")
+    parser.add_argument("--store-chunksize", type=int, default=50000, help="the chunk size of the streamed comparison, 0 to load the file")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--repo", help=argparse.SUPPRESS)
+    parser.add_argument("--paths", help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "results", "memory.json"))
+    args = parser.parse_args()
+
+    if args.scenario:
+        # measured the same way in every checkout, see peak_rss_mb
+        from summary_comp.metrics import peak_rss_mb
+
+        sys.path.insert(0, os.path.abspath(args.repo))
+        for module in [name for name in sys.modules if name.startswith("summary_comp")]:
+            del sys.modules[module]
+        print(json.dumps(run_scenario(args.scenario, json.loads(args.paths), peak_rss_mb, args.store_chunksize or None)))
+        return
+
+    results = {"python": platform.python_version(), "stores": args.stores, "checkouts": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_fixtures(directory, REPORT_DATE, args.stores)
+        results["checkouts"]["current"] = measure(REPO_DIR, paths)
+        if args.baseline_repo:
+            results["checkouts"]["baseline"] = measure(args.baseline_repo, paths)
+        streaming_paths = write_fixtures(os.path.join(directory, "streaming"), REPORT_DATE, args.stores, GPT_stores=args.GPT_stores)
+        results["streaming"] = {
+            "GPT_stores": args.GPT_stores,
+            "store_chunksize": args.store_chunksize,
+            "peak_rss_mb": {
+                mode: run_process("streaming", REPO_DIR, streaming_paths, store_chunksize)["peak_rss_mb"]
+                for mode, store_chunksize in (("loaded", None), ("streamed", args.store_chunksize))
+            },
+        }
+
+    print(f"{args.stores} stores")
+    for name, checkout in results["checkouts"].items():
+        print(
+            f"{name:>9}: store summary {checkout['store_summary_bytes'] / 2**20:.1f} MB, "
+            f"store_level_summary peak {checkout['store_level_summary_peak_bytes'] / 2**20:.1f} MB, "
+            f"GPT store frame {checkout['GPT_summary_per_store_bytes'] / 2**20:.1f} MB, "
+            f"validation peak RSS {checkout['peak_rss_mb']:.1f} MB"
+        )
+    streaming = results["streaming"]
+    print(
+        f"{args.stores} portal stores, {streaming['GPT_stores']} GPT stores, parquet output: validation peak RSS "
+        f"loaded {streaming['peak_rss_mb']['loaded']:.1f} MB, streamed in chunks of {streaming['store_chunksize']} "
+        f"{streaming['peak_rss_mb']['streamed']:.1f} MB"
+    )
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
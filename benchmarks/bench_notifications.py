@@ -0,0 +1,139 @@
+"""
+Benchmark of the notification emails of a burst of validations, sent to a local SMTP sink.
+
+The same notifications (one per market and report date, to a few recipient lists, each with a
+small report attached) are sent:
+
+- per_message_connection: with a new connection (and login) per email, as before SMTPSession
+- shared_session: over one SMTPSession
+- notification_queue: queued in a NotificationQueue, so each recipient list gets one digest email
+- retried: over one SMTPSession to a sink answering the first emails with a temporary error
+
+The results are written to ``benchmarks/results/notifications.json``.
+
+Usage
+-----
+    python benchmarks/bench_notifications.py [--markets 5] [--dates 10] [--recipient-lists 2]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+
+from fixtures import SMTPSink
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SECRET_NAME = "benchmark-email-secret"
+REGION_NAME = "local"
+
+
+def notifications(directory, n_markets, n_dates, n_recipient_lists):
+    """
+    Build the (receiver_email, message_dict, attachment_path) of every notification of the burst.
+    """
+    attachment_path = os.path.join(directory, "PMIX_Validation.xlsx")
+    with open(attachment_path, "wb") as f:
+        f.write(os.urandom(64 * 1024))
+    result = []
+    for market_number in range(n_markets):
+        market = f"market{market_number}"
+        receiver_email = [f"team{market_number % n_recipient_lists}@example.com"]
+        for date_number in range(n_dates):
+            report_date = f"202401{date_number + 1:02d}"
+            message_dict = {
+                "subject": f"PMIX ( {market} ) Summary Comparison {report_date}",
+                "environment": "benchmark",
+                "market": market,
+                "report path": f"s3://bucket/{market}/PMIX_Validation_{report_date}.xlsx",
+                "overall summary status": "PASS",
+                "store summary status": "PASS",
+            }
+            result.append((receiver_email, message_dict, attachment_path))
+    return result
+
+
+def run(sink, function):
+    """
+    Run a scenario with its prints silenced.
+
+    Returns
+    -------
+    dict:
+        The wall time, the connections opened to the sink and the emails it accepted.
+    """
+    connections, emails = sink.connections, len(sink.messages)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+    return {
+        "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        "connections": sink.connections - connections,
+        "emails": len(sink.messages) - emails,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--markets", type=int, default=5)
+    parser.add_argument("--dates", type=int, default=10)
+    parser.add_argument("--recipient-lists", type=int, default=2)
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "results", "notifications.json"))
+    args = parser.parse_args()
+
+    from summary_comp.mail import NotificationQueue, SMTPSession, send_email_from_secret
+    from summary_comp.runtime import get_runtime_context
+
+    def session(sink, **kwargs):
+        return SMTPSession(SECRET_NAME, REGION_NAME, sink.port, use_ssl=False, **kwargs)
+
+    def send_all(sink, burst, smtp_session=None):
+        for receiver_email, message_dict, attachment_path in burst:
+            with contextlib.ExitStack() as stack:
+                email_session = smtp_session or stack.enter_context(session(sink))
+                send_email_from_secret(SECRET_NAME, REGION_NAME, receiver_email, [], sink.port, message_dict, [attachment_path], email_session)
+
+    def queue_all(sink, burst):
+        with session(sink) as smtp_session, NotificationQueue(smtp_session, window_seconds=60) as notification_queue:
+            for receiver_email, message_dict, attachment_path in burst:
+                notification_queue.put(receiver_email, [], message_dict, [attachment_path])
+
+    results = {
+        "python": platform.python_version(),
+        "markets": args.markets,
+        "dates": args.dates,
+        "recipient_lists": args.recipient_lists,
+        "scenarios": {},
+    }
+    get_runtime_context().put_secret(SECRET_NAME, REGION_NAME, {
+        "EMAIL_HOST": "127.0.0.1", "EMAIL_HOST_USER": "benchmark@example.com", "EMAIL_HOST_PASSWORD": "benchmark",
+    })
+    with tempfile.TemporaryDirectory() as directory:
+        burst = notifications(directory, args.markets, args.dates, args.recipient_lists)
+        results["notifications"] = len(burst)
+        with SMTPSink() as sink:
+            results["scenarios"]["per_message_connection"] = run(sink, lambda: send_all(sink, burst))
+            with session(sink) as smtp_session:
+                results["scenarios"]["shared_session"] = run(sink, lambda: send_all(sink, burst, smtp_session))
+            results["scenarios"]["notification_queue"] = run(sink, lambda: queue_all(sink, burst))
+        with SMTPSink(refuse_data=2) as sink, session(sink, backoff_seconds=0.05) as smtp_session:
+            results["scenarios"]["retried"] = run(sink, lambda: send_all(sink, burst, smtp_session))
+
+    print(f"{len(burst)} notifications")
+    print(f"{'scenario':>24} {'time (ms)':>10} {'connections':>12} {'emails':>7}")
+    for name, scenario in results["scenarios"].items():
+        print(f"{name:>24} {scenario['duration_ms']:>10.1f} {scenario['connections']:>12} {scenario['emails']:>7}")
+    if results["scenarios"]["retried"]["emails"] != len(burst):
+        raise AssertionError(f"{len(burst)} emails expected after the retries, got {results['scenarios']['retried']['emails']}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
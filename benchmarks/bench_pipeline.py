@@ -0,0 +1,205 @@
+"""
+End to end benchmark of the PMIX summary comparison on synthetic reports.
+
+For every store count, synthetic portal and GPT reports are written (see fixtures.py) and the
+stages are timed: read_files, compare_columns and evaluate_overall_checks over the overall checks,
+store_level_summary, save_reports with both Excel engines, and the full generate_validation_report,
+which sends its email, with the report attached, to a local SMTP sink. The stage breakdown of the
+end to end run (its StageMetrics) is kept as well. The results are written to
+``benchmarks/results/pipeline.json`` so that they are tracked with the code, and compared with the
+results already in that file.
+
+The reports are written to a temporary local directory by default. With ``--root memory://bench/``
+they are kept in the in-memory storage backend, and with ``--root s3://bucket/prefix`` they are
+written to S3, or to an S3 stand-in such as a moto server or MinIO when AWS_ENDPOINT_URL points at it.
+
+Usage
+-----
+    python benchmarks/bench_pipeline.py [--stores 1000 15000] [--mismatch-rate 0.01]
+        [--missing-rate 0.001] [--repeat 3] [--root memory://bench/ | s3://bucket/prefix]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+from fixtures import PATH_PREFIXES, REPO_DIR, SHEET_NAMES, SMTPSink, write_fixtures
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_DATE = "20240101"
+SECRET_NAME = "benchmark-email-secret"
+REGION_NAME = "local"
+
+
+def timed(function, repeat):
+    """
+    Run a function repeat times, with its prints silenced.
+
+    Returns
+    -------
+    tuple:
+        - median_ms : float
+            The median wall time in milliseconds.
+        - result :
+            The result of the last run.
+    """
+    durations = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function()
+            durations.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(durations), 1), result
+
+
+def run_scenario(root, n_stores, mismatch_rate, missing_rate, repeat, sink):
+    """
+    Write the reports of one store count and time the stages of the comparison.
+    """
+    from summary_comp.metrics import StageMetrics
+    from summary_comp.process_function import (
+        SMTPSession,
+        compare_columns,
+        evaluate_overall_checks,
+        generate_validation_report,
+        load_checks,
+        read_files,
+        save_reports,
+        store_level_summary,
+    )
+
+    paths = write_fixtures(root, REPORT_DATE, n_stores, mismatch_rate, missing_rate)
+    checks = load_checks()
+    results = {}
+
+    results["read_files"], read = timed(lambda: read_files(
+        paths["portal_report_path"], paths["GPT_report_path"], SHEET_NAMES, PATH_PREFIXES, checks, "openpyxl_stream",
+    ), repeat)
+    portal_overall, portal_stores, GPT_overall, GPT_stores = read[:4]
+
+    results["compare_columns"], _ = timed(lambda: [
+        compare_columns(check["gpt_column"], check["portal_column"], GPT_overall, portal_overall)
+        for check in checks if check["level"] == "overall"
+    ], repeat)
+    results["store_level_summary"], store_summary = timed(lambda: store_level_summary(GPT_stores, portal_stores, checks), repeat)
+    results["evaluate_overall_checks"], overall_summary = timed(lambda: evaluate_overall_checks(GPT_overall, portal_overall, checks), repeat)
+    for excel_engine in ("openpyxl", "xlsxwriter"):
+        results[f"save_reports_{excel_engine}"], _ = timed(lambda: save_reports(
+            paths["summary_report_path"] + f"PMIX_Validation_{excel_engine}.xlsx", overall_summary, store_summary, excel_engine,
+        ), repeat)
+
+    metrics = StageMetrics()
+    emails_before = len(sink.messages)
+
+    def end_to_end():
+        with SMTPSession(SECRET_NAME, REGION_NAME, sink.port, use_ssl=False) as smtp_session:
+            return generate_validation_report(
+                env = "benchmark",
+                market = "bench",
+                portal_report_path = paths["portal_report_path"],
+                GPT_report_path = paths["GPT_report_path"],
+                summary_report_path = paths["summary_report_path"],
+                portal_excel_sheet_names = SHEET_NAMES,
+                path_prefixes = PATH_PREFIXES,
+                secret_name = SECRET_NAME,
+                region_name = REGION_NAME,
+                email_port = sink.port,
+                receiver_email = ["receiver@example.com"],
+                cc_recipients = [],
+                checks = checks,
+                portal_reader = "openpyxl_stream",
+                smtp_session = smtp_session,
+                output_formats = ["xlsx"],
+                excel_engine = "xlsxwriter",
+                metrics = metrics,
+            )
+
+    results["generate_validation_report"], message_dict = timed(end_to_end, repeat)
+    if len(sink.messages) - emails_before != repeat:
+        raise AssertionError(f"{repeat} emails expected in the SMTP sink, got {len(sink.messages) - emails_before}")
+    return {
+        "median_ms": results,
+        # summed over the repeats by StageMetrics
+        "end_to_end_stages_ms": {
+            stage: round(values["duration_ms"] / repeat, 1) for stage, values in metrics.stages.items() if "duration_ms" in values
+        },
+        "report_bytes": metrics.stages.get("save_reports", {}).get("bytes_written", 0) // repeat,
+        "email_bytes": sink.messages[-1],
+        "store summary status": message_dict["store summary status"],
+        "stores only in GPT": message_dict["stores only in GPT"],
+        "stores only in portal": message_dict["stores only in portal"],
+    }
+
+
+def git_commit():
+    """
+    Get the commit the benchmark runs on, None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results, previous):
+    """
+    Print the median times with their ratio to the previous results of the same store count.
+    """
+    print(f"{'stores':>8} {'stage':>28} {'time (ms)':>10} {'previous':>10} {'ratio':>6}")
+    for n_stores, scenario in results["scenarios"].items():
+        previous_times = previous.get("scenarios", {}).get(n_stores, {}).get("median_ms", {})
+        for stage, median_ms in scenario["median_ms"].items():
+            previous_ms = previous_times.get(stage)
+            ratio = f"{median_ms / previous_ms:>6.2f}" if previous_ms else f"{'-':>6}"
+            previous_text = f"{previous_ms:>10.1f}" if previous_ms else f"{'-':>10}"
+            print(f"{n_stores:>8} {stage:>28} {median_ms:>10.1f} {previous_text} {ratio}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stores", type=int, nargs="+", default=[1000, 15000])
+    parser.add_argument("--mismatch-rate", type=float, default=0.01)
+    parser.add_argument("--missing-rate", type=float, default=0.001)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--root", help="directory the reports are written to, default is a temporary local directory")
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "results", "pipeline.json"))
+    args = parser.parse_args()
+
+    from summary_comp.runtime import get_runtime_context
+
+    previous = {}
+    if os.path.exists(args.output):
+        with open(args.output) as f:
+            previous = json.load(f)
+
+    results = {
+        "python": platform.python_version(),
+        "commit": git_commit(),
+        "repeat": args.repeat,
+        "mismatch_rate": args.mismatch_rate,
+        "missing_rate": args.missing_rate,
+        "scenarios": {},
+    }
+    with SMTPSink() as sink, tempfile.TemporaryDirectory() as directory:
+        get_runtime_context().put_secret(SECRET_NAME, REGION_NAME, {
+            "EMAIL_HOST": "127.0.0.1", "EMAIL_HOST_USER": "benchmark@example.com", "EMAIL_HOST_PASSWORD": "benchmark",
+        })
+        for n_stores in args.stores:
+            root = (args.root or directory).rstrip("/") + f"/{n_stores}/"
+            results["scenarios"][str(n_stores)] = run_scenario(root, n_stores, args.mismatch_rate, args.missing_rate, args.repeat, sink)
+
+    print_comparison(results, previous)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
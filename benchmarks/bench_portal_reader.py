@@ -0,0 +1,91 @@
+"""
+Benchmark of the portal report readers.
+
+Writes a synthetic portal workbook and reads it with every reader of ``read_portal_report``
+in a fresh subprocess, reporting the wall time and the peak RSS of the subprocess.
+
+The results are written to ``benchmarks/results/portal_reader.json``.
+
+Usage
+-----
+    python benchmarks/bench_portal_reader.py [--stores 15000 50000] [--extra-columns 30]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from fixtures import REPO_DIR, SHEET_NAMES, write_portal_workbook
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_reader(path, portal_reader):
+    """
+    Read the workbook with one reader and print the timing and peak RSS as JSON.
+    """
+    sys.path.insert(0, REPO_DIR)
+    from summary_comp.metrics import peak_rss_mb
+    from summary_comp.process_function import read_portal_report
+
+    start = time.perf_counter()
+    overall, per_store = read_portal_report(path, SHEET_NAMES, portal_reader=portal_reader)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "reader": portal_reader,
+        "seconds": round(elapsed, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "rows": len(per_store),
+        "checksum": float(per_store["sum_net_Sales"].sum()),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stores", type=int, nargs="+", default=[15000, 50000])
+    parser.add_argument("--extra-columns", type=int, default=30)
+    parser.add_argument("--readers", nargs="+", default=["pandas", "openpyxl_stream", "calamine"])
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "results", "portal_reader.json"))
+    args = parser.parse_args()
+
+    if args.run:
+        run_reader(args.path, args.run)
+        return
+
+    results = {"python": platform.python_version(), "extra_columns": args.extra_columns, "stores": {}}
+    print(f"{'stores':>8} {'reader':>16} {'time (s)':>9} {'peak RSS (MB)':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_stores in args.stores:
+            results["stores"][n_stores] = {}
+            path = os.path.join(tmp, f"Daily_Dlry_Pmix_{n_stores}.xlsx")
+            write_portal_workbook(path, n_stores, args.extra_columns)
+            checksums = set()
+            for portal_reader in args.readers:
+                completed = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--run", portal_reader, "--path", path],
+                    capture_output=True, text=True,
+                )
+                if completed.returncode != 0:
+                    print(f"{n_stores:>8} {portal_reader:>16} {'skipped: ' + completed.stderr.strip().splitlines()[-1]}")
+                    results["stores"][n_stores][portal_reader] = {"skipped": completed.stderr.strip().splitlines()[-1]}
+                    continue
+                result = json.loads(completed.stdout.strip().splitlines()[-1])
+                checksums.add(round(result["checksum"], 2))
+                results["stores"][n_stores][portal_reader] = {key: result[key] for key in ("seconds", "peak_rss_mb", "rows")}
+                print(f"{n_stores:>8} {portal_reader:>16} {result['seconds']:>9.2f} {result['peak_rss_mb']:>14.0f}")
+            if len(checksums) > 1:
+                raise AssertionError(f"readers disagree on the store sheet at {n_stores} stores: {checksums}")
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Cold start benchmark of the Lambda entry point, based on ``python -X importtime``.
+
+Every scenario runs in a fresh interpreter (as a cold Lambda container does) and the
+import time of everything it loads is summed up. The results are written to
+``benchmarks/results/startup_importtime.json`` so that they are tracked with the code.
+
+Usage
+-----
+    python benchmarks/bench_startup.py [--lambda-dir US_summary_comp] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+UNKNOWN_MARKET_EVENT = {"Records": [{"s3": {"bucket": {"name": "unknown-bucket"}, "object": {"key": "Daily_Pmix_20240101.xlsx"}}}]}
+
+SCENARIOS = {
+    # what every cold start paid before the imports were made lazy
+    "eager_imports": "import json, smtplib, email.message, boto3, numpy, openpyxl, pandas, s3fs",
+    "import_handler": "import lambda_function",
+    "unknown_market_event": f"import lambda_function; lambda_function.lambda_handler({UNKNOWN_MARKET_EVENT!r}, None)",
+    "validation_path": "import lambda_function, summary_comp.process_function, boto3, s3fs, openpyxl, smtplib",
+}
+
+
+def import_times(code, lambda_dir):
+    """
+    Run the code in a fresh interpreter with -X importtime.
+
+    Returns
+    -------
+    dict:
+        The self import time in microseconds of every module imported by the code.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=lambda_dir, capture_output=True, text=True, check=True,
+        # the Lambda bundle has the summary_comp package next to lambda_function.py
+        env=dict(os.environ, PYTHONPATH=REPO_DIR),
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, module = line[len("import time:"):].split("|")
+        times[module.strip()] = times.get(module.strip(), 0) + int(self_us)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lambda-dir", default=os.path.join(BENCHMARKS_DIR, "..", "US_summary_comp"))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "results", "startup_importtime.json"))
+    args = parser.parse_args()
+
+    results = {"python": platform.python_version(), "repeat": args.repeat, "scenarios": {}}
+    print(f"{'scenario':>22} {'import time (ms)':>17} {'modules':>8}")
+    for name, code in SCENARIOS.items():
+        runs = [import_times(code, args.lambda_dir) for _ in range(args.repeat)]
+        totals = [sum(run.values()) / 1000 for run in runs]
+        slowest = sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)[:10]
+        results["scenarios"][name] = {
+            "median_ms": round(statistics.median(totals), 1),
+            "modules": len(runs[-1]),
+            "slowest_modules_ms": {module: round(us / 1000, 1) for module, us in slowest},
+        }
+        print(f"{name:>22} {statistics.median(totals):>17.1f} {len(runs[-1]):>8}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark of the store level status engine.
+
+Compares the previous row-wise ``summary_store.apply(update_status, axis=1)`` against the
+vectorized ``update_status`` of ``process_function`` on synthetic store summaries.
+
+The reference compares floats, so the vectorized engine is run with FLOAT_CHECKS, the store checks
+without decimals: with the fixed point comparison of DEFAULT_CHECKS, the statuses of the values
+close to the tolerance differ from the float ones.
+
+The results are written to ``benchmarks/results/status_engine.json``.
+
+Usage
+-----
+    python benchmarks/bench_status_engine.py [--stores 15000 50000 500000] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+
+from summary_comp.process_function import update_status  # noqa: E402
+
+STATUS_COLUMNS = ["Number of Unique Days Status (abs(0.05%))", "Total Net Sales Status (abs(0.05%))", "Total Alacarte Units Status (abs(0.05%))"]
+CHECKS = [
+    ("Deviation in Number of Unique Days", "Number of Unique Days (GPT)"),
+    ("Deviation in Total Net Sales", "Total Net Sales (GPT)"),
+    ("Deviation in Total Alacarte Units", "Total Alacarte Units (GPT)"),
+]
+# the store checks of the reference, compared in floats (no decimals) with the default tolerance
+FLOAT_CHECKS = [
+    {"name": "Number of Unique Days", "gpt_column": "unique_days", "portal_column": "number_of_days_got_data", "level": "store"},
+    {"name": "Total Net Sales", "gpt_column": "total_net_sales", "portal_column": "sum_net_Sales", "level": "store"},
+    {"name": "Total Alacarte Units", "gpt_column": "total_units", "portal_column": "sum_alacarte_units", "level": "store"},
+]
+
+
+def row_wise_update_status(row):
+    """
+    The row-wise status function used before the vectorized engine, kept as the reference.
+    """
+    statuses = []
+    for deviation_column, GPT_column in CHECKS:
+        if pd.notnull(row[deviation_column]):
+            if abs(row[deviation_column]) > 0.0005 * row[GPT_column]:
+                statuses.append("FAIL")
+            else:
+                statuses.append("PASS")
+        else:
+            statuses.append("")
+    return pd.Series(statuses, index=STATUS_COLUMNS)
+
+
+def synthetic_summary_store(n_stores, seed=0):
+    """
+    Build a merged store summary with deviations, ~1% one-sided stores and ~5% mismatches.
+    """
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        "Global_Store_Id": np.arange(n_stores, dtype="float64"),
+        "Number of Unique Days (GPT)": rng.integers(1, 8, n_stores).astype("float64"),
+        "Total Net Sales (GPT)": rng.uniform(1e3, 1e5, n_stores).round(2),
+        "Total Alacarte Units (GPT)": rng.integers(100, 20000, n_stores).astype("float64"),
+    })
+    for name in ["Number of Unique Days", "Total Net Sales", "Total Alacarte Units"]:
+        GPT_value = frame[f"{name} (GPT)"]
+        mismatch = rng.random(n_stores) < 0.05
+        frame[f"{name} (Portal)"] = np.where(mismatch, GPT_value * 0.99, GPT_value)
+    one_sided = rng.random(n_stores) < 0.01
+    frame.loc[one_sided, [c for c in frame.columns if c.endswith("(Portal)")]] = np.nan
+    for name in ["Number of Unique Days", "Total Net Sales", "Total Alacarte Units"]:
+        frame[f"Deviation in {name}"] = frame[f"{name} (GPT)"] - frame[f"{name} (Portal)"]
+    return frame
+
+
+def best_of(function, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stores", type=int, nargs="+", default=[15000, 50000, 500000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "results", "status_engine.json"))
+    args = parser.parse_args()
+
+    results = {"python": platform.python_version(), "repeat": args.repeat, "stores": {}}
+    print(f"{'stores':>8} {'row-wise (s)':>13} {'vectorized (s)':>15} {'speedup':>8}")
+    for n_stores in args.stores:
+        summary_store = synthetic_summary_store(n_stores)
+        row_wise_time, expected = best_of(lambda: summary_store.apply(row_wise_update_status, axis=1), 1 if n_stores > 100000 else args.repeat)
+        vectorized_time, actual = best_of(lambda: update_status(summary_store, FLOAT_CHECKS), args.repeat)
+        if not expected.equals(actual[STATUS_COLUMNS].astype(expected.dtypes.iloc[0])):
+            raise AssertionError(f"vectorized statuses differ from the row-wise reference at {n_stores} stores")
+        print(f"{n_stores:>8} {row_wise_time:>13.3f} {vectorized_time:>15.4f} {row_wise_time / vectorized_time:>7.0f}x")
+        results["stores"][n_stores] = {
+            "row_wise_seconds": round(row_wise_time, 4),
+            "vectorized_seconds": round(vectorized_time, 5),
+            "speedup": round(row_wise_time / vectorized_time, 1),
+        }
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark of the storage backends (see summary_comp.storage), offline: the local filesystem and
+the in-memory store.
+
+For every backend and block size, a file of --megabytes is written and timed:
+
+- blocks: reading it whole with Storage.blocks, as the email attachments and the fingerprints do
+- read_range: reading --ranges random ranges of 64 KiB, as with the ranged GET requests on S3
+- validation: generate_validation_report on synthetic reports of --stores stores (see fixtures.py),
+  with the xlsx and parquet outputs, the result cache and the history, without email
+
+The S3 backend takes the same settings (block_size, cache_type and max_pool_connections, the
+"storage" constants of lambda_config.json) but needs a bucket, so it is not measured here.
+
+The results are written to ``benchmarks/results/storage.json``.
+
+Usage
+-----
+    python benchmarks/bench_storage.py [--megabytes 64] [--ranges 200] [--stores 15000] [--repeat 3]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+
+from fixtures import PATH_PREFIXES, SHEET_NAMES, write_fixtures
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_DATE = "20240101"
+BLOCK_SIZES = [64 * 1024, 1024 * 1024, 8 * 1024 * 1024]
+RANGE_BYTES = 64 * 1024
+
+
+def timed(function, repeat):
+    """
+    Run a function repeat times, with its prints silenced.
+
+    Returns
+    -------
+    float:
+        The median wall time in ms.
+    """
+    durations = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            durations.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(durations), 1)
+
+
+def measure(root, block_size, args):
+    """
+    Time the reads of a file and a validation under a root, with the storage settings of a block size.
+    """
+    from summary_comp.process_function import generate_validation_report
+    from summary_comp.runtime import get_runtime_context, get_storage, open_file
+
+    get_runtime_context().configure_storage(block_size=block_size)
+    storage = get_storage(root)
+    path = f"{root}file-{block_size}.bin"
+    size = args.megabytes * 1024 * 1024
+    with open_file(path, "wb") as f:
+        f.write(os.urandom(size))
+    rng = random.Random(0)
+    starts = [rng.randrange(0, size - RANGE_BYTES) for _ in range(args.ranges)]
+
+    def read_blocks():
+        if sum(len(block) for block in storage.blocks(path)) != size:
+            raise AssertionError(f"{path} not read whole")
+
+    def read_ranges():
+        for start in starts:
+            if len(storage.read_range(path, start, RANGE_BYTES)) != RANGE_BYTES:
+                raise AssertionError(f"short range read of {path}")
+
+    paths = write_fixtures(f"{root}{block_size}/", REPORT_DATE, args.stores)
+
+    def validation():
+        generate_validation_report(
+            "benchmark", "benchmark", paths["portal_report_path"], paths["GPT_report_path"], paths["summary_report_path"],
+            SHEET_NAMES, PATH_PREFIXES, "unused", "unused", 0, [], send_notification=False,
+            output_formats=["xlsx", "parquet"], excel_engine="xlsxwriter", portal_reader="openpyxl_stream",
+            history_path=paths["summary_report_path"] + "history/",
+        )
+
+    return {
+        "blocks_ms": timed(read_blocks, args.repeat),
+        "read_range_ms": timed(read_ranges, args.repeat),
+        "validation_ms": timed(validation, args.repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megabytes", type=int, default=64)
+    parser.add_argument("--ranges", type=int, default=200)
+    parser.add_argument("--stores", type=int, default=15000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "results", "storage.json"))
+    args = parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "megabytes": args.megabytes,
+        "ranges": args.ranges,
+        "range_bytes": RANGE_BYTES,
+        "stores": args.stores,
+        "backends": {"local": {}, "memory": {}},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for backend, root in (("local", directory + "/"), ("memory", "memory://benchmark/")):
+            for block_size in BLOCK_SIZES:
+                results["backends"][backend][str(block_size)] = measure(root, block_size, args)
+
+    print(f"{'backend':>8} {'block size':>11} {'blocks (ms)':>12} {'read_range (ms)':>16} {'validation (ms)':>16}")
+    for backend, block_sizes in results["backends"].items():
+        for block_size, result in block_sizes.items():
+            print(f"{backend:>8} {block_size:>11} {result['blocks_ms']:>12.1f} {result['read_range_ms']:>16.1f} {result['validation_ms']:>16.1f}")
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
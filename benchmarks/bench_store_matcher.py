@@ -0,0 +1,82 @@
+"""
+Benchmark of the store matcher.
+
+Compares the outer ``pd.merge`` previously used by ``store_level_summary`` against
+``match_stores`` on synthetic store ids, with int ids on GPT's side and float ids with
+missing values on portal's side as they come out of the two reports.
+
+The results are written to ``benchmarks/results/store_matcher.json``.
+
+Usage
+-----
+    python benchmarks/bench_store_matcher.py [--stores 50000 200000 1000000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+
+from summary_comp.process_function import match_stores  # noqa: E402
+
+
+def synthetic_store_ids(n_stores, seed=0):
+    """
+    Build shuffled GPT and portal store ids overlapping on ~98% of the stores.
+    """
+    rng = np.random.default_rng(seed)
+    GPT_ids = pd.Series(rng.permutation(np.arange(n_stores, dtype="int64") + 1000000), name="mcd_gbal_lcat_id_nu")
+    portal_ids = rng.permutation(np.arange(n_stores, dtype="int64") + 1000000 + n_stores // 100).astype("float64")
+    portal_ids[rng.random(n_stores) < 0.001] = np.nan
+    return GPT_ids, pd.Series(portal_ids, name="global_store_id")
+
+
+def best_of(function, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stores", type=int, nargs="+", default=[50000, 200000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "results", "store_matcher.json"))
+    args = parser.parse_args()
+
+    results = {"python": platform.python_version(), "repeat": args.repeat, "stores": {}}
+    print(f"{'stores':>8} {'pd.merge (s)':>13} {'match_stores (s)':>17} {'speedup':>8}")
+    for n_stores in args.stores:
+        GPT_ids, portal_ids = synthetic_store_ids(n_stores)
+        merge_time, merged = best_of(
+            lambda: pd.merge(GPT_ids.to_frame(), portal_ids.to_frame(), left_on="mcd_gbal_lcat_id_nu", right_on="global_store_id", how="outer"),
+            args.repeat,
+        )
+        match_time, match = best_of(lambda: match_stores(GPT_ids, portal_ids), args.repeat)
+        if len(merged) != len(match["store_ids"]):
+            raise AssertionError(f"match_stores returned {len(match['store_ids'])} rows, pd.merge {len(merged)} at {n_stores} stores")
+        print(f"{n_stores:>8} {merge_time:>13.4f} {match_time:>17.4f} {merge_time / match_time:>7.1f}x")
+        results["stores"][n_stores] = {
+            "merge_seconds": round(merge_time, 5),
+            "match_stores_seconds": round(match_time, 5),
+            "speedup": round(merge_time / match_time, 2),
+        }
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
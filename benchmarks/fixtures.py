@@ -0,0 +1,24 @@
+"""
+The synthetic inputs of the PMIX summary comparison and the local SMTP sink of the benchmarks,
+shared with the tests: they are defined in tests/conftest.py, which is imported from here.
+"""
+import os
+import sys
+
+TESTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests")
+if TESTS_DIR not in sys.path:
+    sys.path.insert(0, TESTS_DIR)
+
+from conftest import (  # noqa: E402, F401
+    GPT_OVERALL_FILE_COLUMNS,
+    ITEM_CHECKS,
+    PATH_PREFIXES,
+    REPO_DIR,
+    SHEET_NAMES,
+    SMTPSink,
+    draw_cents,
+    synthetic_reports,
+    write_fixtures,
+    write_item_extracts,
+    write_portal_workbook,
+)
@@ -0,0 +1,20 @@
+"""
+PMIX summary comparison of GPT's and portal's reports, shared by the Lambdas of all the markets.
+
+Modules
+-------
+handler : the Lambda handler, routing the S3 events to their market
+markets : the market registry built from the "paths" section of lambda_config.json
+gpt_index : the discovery of GPT's report files by report date, from one shared listing
+process_function : reading, comparing and saving the reports, and sending the emails
+items : the item level comparison of the item by store extracts, streamed in chunks
+history : the history of the summaries over the report dates, and its trend queries
+mail : the emails, streamed with their attachments, their SMTP session and the notification queue
+metrics : the stage metrics emitted as a CloudWatch EMF log line, and the optional profiling
+runtime : the state reused by the invocations of a warm container, and the file access
+storage : the storage backends of the file access: S3, the local filesystem and an in-memory store
+backfill : the command line backfill of a date range
+build : the command line build of the deployment bundles of the Lambdas, and their upload
+
+The modules are not imported here, so that importing the handler stays cheap on a cold start.
+"""
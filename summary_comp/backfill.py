@@ -0,0 +1,251 @@
+"""
+Backfill of the PMIX summary comparison over a date range and several markets.
+
+For every market, the portal reports (``<portal_path_prefix><date>.xlsx``) of the date range
+are discovered, and the ones with both GPT files (``Daily_Pmix_Summary_<date>.txt.gz`` and
+``Daily_Pmix_TotXStore_<date>.txt.gz``, found by date in one listing of GPT's directory, see
+summary_comp.gpt_index) are validated in a process pool. The workers reuse that listing. Each validation
+writes its report as usual, and a single digest email is sent at the end instead of one
+email per report.
+
+With ``--root``, every s3:// path of the config is read from and written to the same
+bucket/key under a local directory, so the backfill can be run offline.
+
+The markets are the ones of the config of a Lambda, e.g. the markets of the IR Lambda with
+``--config IR_summary_comp/lambda_config.json``.
+
+Usage
+-----
+    python -m summary_comp.backfill --start-date 2024-01-01 --end-date 2024-01-31 \\
+        --config US_summary_comp/lambda_config.json \\
+        --portal-path us=s3://us-prod-report-source-data/<portal prefix>/ \\
+        [--markets us] [--root /data/s3] [--workers 4] [--no-email] [--no-cache]
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from .gpt_index import GPT_file_index, register_GPT_file_index
+from .process_function import (
+    generate_validation_report,
+    get_runtime_context,
+    get_storage,
+    parse_report_date,
+    send_email_from_secret,
+)
+
+
+def local_path(path, root):
+    """
+    Map an s3:// path to the same bucket/key under a local directory, if root is given.
+    """
+    if root is None or not path.startswith("s3://"):
+        return path
+    return os.path.join(root, path[len("s3://"):])
+
+
+def list_files(directory, pattern):
+    """
+    List the files of a local, s3:// or memory:// directory matching a glob pattern.
+
+    Returns
+    -------
+    list:
+        The full paths of the files, with the s3:// or memory:// protocol kept.
+    """
+    return get_storage(directory).glob(directory, pattern)
+
+
+def discover_reports(market, portal_path, GPT_report_path, path_prefixes, start_date, end_date):
+    """
+    Discover the portal reports of a market in a date range and check that the GPT files exist.
+
+    Returns
+    -------
+    tuple:
+        - jobs : list
+            One (market, portal_report_path) pair per portal report with both GPT files.
+        - missing : dict
+            The report dates (of portal reports in the range) with missing GPT files, and the missing file names.
+    """
+    GPT_files = GPT_file_index(GPT_report_path, path_prefixes)
+    jobs = []
+    missing = {}
+    for portal_report_path in list_files(portal_path, path_prefixes["portal_path_prefix"] + "*.xlsx"):
+        report_date = portal_report_path.split("/")[-1].split(".xlsx")[0].split(path_prefixes["portal_path_prefix"])[-1]
+        parsed_date = parse_report_date(report_date)
+        if parsed_date is None or not start_date <= parsed_date <= end_date:
+            continue
+        needed = [
+            path_prefixes["GPT_overall_summary_path_prefix"] + report_date + ".txt.gz",
+            path_prefixes["GPT_summary_per_store_path_prefix"] + report_date + ".txt.gz",
+        ]
+        # the listing is not repeated for every missing date
+        listed_paths = GPT_files.lookup(parsed_date, relist_after=None)
+        not_found = [name for name, path in zip(needed, listed_paths) if path is None]
+        if not_found:
+            missing[f"{market} {report_date}"] = ", ".join(not_found)
+        else:
+            jobs.append((market, portal_report_path))
+    return jobs, missing
+
+
+def share_GPT_listings(listings):
+    """
+    Register the listings of GPT's directories made by the parent process. Runs in every worker process.
+    """
+    for GPT_report_path, path_prefixes, listing in listings:
+        register_GPT_file_index(GPT_report_path, path_prefixes, listing)
+
+
+def run_job(cfg, market, market_paths, portal_report_path, root, result_cache=True):
+    """
+    Validate one portal report without sending an email. Runs in a worker process.
+    With result_cache, a report whose inputs did not change since its last validation is not generated again.
+    The summaries are added to the history of the market, if the config keeps one.
+    """
+    get_runtime_context().configure_storage(**cfg["constants"].get("storage", {}))
+    summary_report_path = local_path(market_paths["output_s3_path"], root)
+    if root is not None:
+        os.makedirs(summary_report_path, exist_ok=True)
+    history_path = None
+    if cfg["constants"].get("history", False):
+        history_path = local_path(cfg["constants"].get("history_path") or market_paths["output_s3_path"] + "history/", root)
+    try:
+        return generate_validation_report(
+            env = cfg["ENV"],
+            market = market,
+            portal_report_path = portal_report_path,
+            GPT_report_path = local_path(market_paths["GPT_file_path"], root),
+            summary_report_path = summary_report_path,
+            portal_excel_sheet_names = cfg["constants"]["portal_excel_sheet_names"],
+            path_prefixes = cfg["constants"]["path_prefixes"],
+            secret_name = cfg["secret_name"],
+            region_name = cfg["region_name"],
+            email_port = cfg["email_port"],
+            receiver_email = cfg["receiver_email"],
+            cc_recipients = cfg["cc_recipients"],
+            checks = cfg["constants"].get("checks"),
+            portal_reader = cfg["constants"].get("portal_reader", "pandas"),
+            store_chunksize = cfg["constants"].get("store_chunksize"),
+            send_notification = False,
+            output_formats = cfg["constants"].get("output_formats", ["xlsx"]),
+            excel_engine = cfg["constants"].get("excel_engine", "openpyxl"),
+            result_cache = result_cache and cfg["constants"].get("result_cache", False),
+            profile = cfg["constants"].get("profile", False),
+            history_path = history_path,
+            item_chunksize = cfg["constants"].get("item_chunksize"),
+            top_items = cfg["constants"].get("top_items"),
+        )
+    except Exception as e:
+        print(f"Error: validation of {portal_report_path} failed: {e}")
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+def digest_message(cfg, start_date, end_date, results, missing):
+    """
+    Build the message_dict of the digest email of a backfill.
+    """
+    failed = sum(1 for message in results.values() if "error" in message or "FAIL" in message.values())
+    message_dict = {
+        "subject": f"PMIX Summary Comparison Backfill {start_date} to {end_date}",
+        "environment": f"{cfg['ENV']}",
+        "reports validated": f"{len(results)}",
+        "reports failed": f"{failed}",
+        "reports with missing GPT files": f"{len(missing)}",
+        "reports reused from the result cache": f"{sum(1 for message in results.values() if message.get('result cache') == 'HIT')}",
+    }
+    for name, message in sorted(results.items()):
+        if "error" in message:
+            message_dict[name] = f"ERROR {message['error']}"
+        else:
+            message_dict[name] = (
+                f"overall summary {message['overall summary status']}, store summary {message['store summary status']}, "
+                f"report {message['report path']}"
+                + (" (unchanged inputs, not validated again)" if message.get("result cache") == "HIT" else "")
+            )
+    for name, not_found in sorted(missing.items()):
+        message_dict[name] = f"GPT files not found: {not_found}"
+    return message_dict
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill of the PMIX summary comparison over a date range and several markets.")
+    parser.add_argument("--start-date", required=True, type=lambda value: datetime.strptime(value, "%Y-%m-%d").date(), help="first report date, YYYY-MM-DD")
+    parser.add_argument("--end-date", required=True, type=lambda value: datetime.strptime(value, "%Y-%m-%d").date(), help="last report date, YYYY-MM-DD")
+    parser.add_argument("--markets", nargs="+", help="markets of the config, default is all of them")
+    parser.add_argument("--portal-path", action="append", default=[], metavar="MARKET=PATH",
+                        help="directory of the portal reports of a market, default is the market's portal_file_path in the config")
+    parser.add_argument("--config", default="lambda_config.json", help="lambda_config.json of the Lambda of the markets")
+    parser.add_argument("--root", help="local directory holding the buckets, to run without S3")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--no-email", action="store_true", help="print the digest instead of emailing it")
+    parser.add_argument("--no-cache", action="store_true", help="validate every report again, even if its inputs did not change")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    runtime_context = get_runtime_context(args.config)
+    cfg = runtime_context.config
+    runtime_context.configure_storage(**cfg["constants"].get("storage", {}))
+    registry = runtime_context.markets
+    markets = args.markets or list(registry)
+    unknown = [market for market in markets if market not in registry]
+    if unknown:
+        raise SystemExit(f"Unknown market(s) {', '.join(unknown)}, the config has {', '.join(registry)}")
+    portal_paths = {market: registry[market].get("portal_file_path") for market in markets}
+    portal_paths.update(dict(value.split("=", 1) for value in args.portal_path))
+    path_prefixes = cfg["constants"]["path_prefixes"]
+
+    jobs = []
+    missing = {}
+    for market in markets:
+        if not portal_paths.get(market):
+            raise SystemExit(f"No portal path for market '{market}', pass --portal-path {market}=PATH")
+        market_jobs, market_missing = discover_reports(
+            market,
+            local_path(portal_paths[market], args.root),
+            local_path(registry[market]["GPT_file_path"], args.root),
+            path_prefixes, args.start_date, args.end_date,
+        )
+        print(f"{market}: {len(market_jobs)} report(s) to validate, {len(market_missing)} with missing GPT files")
+        jobs.extend(market_jobs)
+        missing.update(market_missing)
+
+    results = {}
+    GPT_listings = [
+        (GPT_report_path, path_prefixes, GPT_file_index(GPT_report_path, path_prefixes).listing)
+        for GPT_report_path in {local_path(registry[market]["GPT_file_path"], args.root) for market in markets}
+    ]
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(args.workers, len(jobs) or 1)), initializer=share_GPT_listings, initargs=(GPT_listings,),
+    ) as executor:
+        futures = {
+            (market, portal_report_path): executor.submit(run_job, cfg, market, registry[market], portal_report_path, args.root, not args.no_cache)
+            for market, portal_report_path in jobs
+        }
+        for (market, portal_report_path), future in futures.items():
+            report_date = portal_report_path.split("/")[-1].split(".xlsx")[0].split(path_prefixes["portal_path_prefix"])[-1]
+            results[f"{market} {report_date}"] = future.result()
+
+    message_dict = digest_message(cfg, args.start_date, args.end_date, results, missing)
+    for key, value in message_dict.items():
+        print(f"{key}: {value}")
+    if not args.no_email:
+        send_email_from_secret(
+            secret_name = cfg["secret_name"],
+            region_name = cfg["region_name"],
+            receiver_email = cfg["receiver_email"],
+            cc_recipients = cfg["cc_recipients"],
+            port = cfg["email_port"],
+            message_dict = message_dict,
+            attachment_paths = [],
+        )
+        print("digest email sent successfully")
+    return message_dict
+
+
+if __name__ == "__main__":
+    main()
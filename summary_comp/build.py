@@ -0,0 +1,172 @@
+"""
+Build of the deployment bundles of the Lambdas, and their optional upload.
+
+A Lambda is a directory of the repository with a lambda_function.py and a lambda_config.json
+(US_summary_comp, IR_summary_comp). Its bundle, ``<output>/<Lambda directory>.zip``, holds both
+files at the root of the zip next to the summary_comp package, the layout the handler
+``lambda_function.lambda_handler`` is imported from. The config is checked before it is packaged:
+it must be valid JSON and its markets must build a MarketRegistry. pandas, numpy, openpyxl,
+pyarrow, s3fs and boto3 are not bundled, they come from the layers of the Lambda.
+
+The files are written with a fixed timestamp and in a sorted order, so the same code gives the
+same zip (and the same CodeSha256 on AWS).
+
+With ``--deploy LAMBDA=FUNCTION``, the bundle of a Lambda directory is uploaded as the code of a
+Lambda function with UpdateFunctionCode (boto3 is only imported then).
+
+Usage
+-----
+    python -m summary_comp.build [--lambdas US_summary_comp IR_summary_comp] [--output dist] \\
+        [--deploy US_summary_comp=<function name>] [--region eu-west-1]
+"""
+import argparse
+import json
+import os
+import zipfile
+
+from .markets import MarketRegistry
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(PACKAGE_DIR)
+# the files of a Lambda directory put at the root of its bundle
+LAMBDA_FILES = ("lambda_function.py", "lambda_config.json")
+# the timestamp of every file of a bundle, so that a bundle only changes with its content
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def find_lambdas(repo_dir=REPO_DIR):
+    """
+    List the Lambda directories of the repository, the ones with all the LAMBDA_FILES.
+    """
+    return sorted(
+        entry.name for entry in os.scandir(repo_dir)
+        if entry.is_dir() and all(os.path.isfile(os.path.join(entry.path, name)) for name in LAMBDA_FILES)
+    )
+
+
+def check_config(config_path):
+    """
+    Check that a lambda_config.json can be deployed.
+
+    Raises
+    ------
+    ValueError
+        If the config is not valid JSON, misses a section the handler reads, or if its markets do not
+        build a MarketRegistry.
+    """
+    with open(config_path) as f:
+        try:
+            cfg = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{config_path} is not valid JSON: {e}") from e
+    missing = [name for name in ("paths", "constants", "secret_name", "region_name", "receiver_email") if name not in cfg]
+    if missing:
+        raise ValueError(f"{config_path} has no {', '.join(missing)}")
+    try:
+        registry = MarketRegistry.from_config(cfg)
+    except ValueError as e:
+        raise ValueError(f"{config_path}: {e}") from e
+    if not len(registry):
+        raise ValueError(f"{config_path} has no market")
+    return registry
+
+
+def package_files(package_dir=PACKAGE_DIR):
+    """
+    List the (path, name in the bundle) of the modules of the summary_comp package.
+    """
+    return sorted(
+        (os.path.join(package_dir, name), "summary_comp/" + name)
+        for name in os.listdir(package_dir) if name.endswith(".py")
+    )
+
+
+def build_bundle(lambda_dir, output_dir, package_dir=PACKAGE_DIR):
+    """
+    Write the bundle of a Lambda directory.
+
+    Parameters
+    ----------
+    lambda_dir : str
+        The Lambda directory, with its lambda_function.py and lambda_config.json.
+    output_dir : str
+        The directory the bundle is written to, created if needed.
+    package_dir : str, optional
+        The summary_comp package bundled, default is the one of this file.
+
+    Returns
+    -------
+    str:
+        The path of the bundle, <output_dir>/<name of the Lambda directory>.zip.
+
+    Raises
+    ------
+    ValueError
+        If the config of the Lambda cannot be deployed, see check_config.
+    """
+    check_config(os.path.join(lambda_dir, "lambda_config.json"))
+    os.makedirs(output_dir, exist_ok=True)
+    bundle_path = os.path.join(output_dir, os.path.basename(os.path.normpath(lambda_dir)) + ".zip")
+    files = [(os.path.join(lambda_dir, name), name) for name in LAMBDA_FILES] + package_files(package_dir)
+    with zipfile.ZipFile(bundle_path, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+        for path, name in files:
+            info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            with open(path, "rb") as f:
+                bundle.writestr(info, f.read())
+    return bundle_path
+
+
+def deploy_bundle(bundle_path, function_name, region_name=None):
+    """
+    Upload a bundle as the code of a Lambda function, and wait for the update to be done.
+
+    Returns
+    -------
+    str:
+        The CodeSha256 of the new code of the function.
+    """
+    import boto3
+
+    client = boto3.session.Session().client("lambda", region_name=region_name)
+    with open(bundle_path, "rb") as f:
+        response = client.update_function_code(FunctionName=function_name, ZipFile=f.read(), Publish=True)
+    client.get_waiter("function_updated").wait(FunctionName=function_name)
+    return response["CodeSha256"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build of the deployment bundles of the Lambdas, and their optional upload.")
+    parser.add_argument("--lambdas", nargs="+", help="Lambda directories of the repository, default is all of them")
+    parser.add_argument("--output", default=os.path.join(REPO_DIR, "dist"), help="directory of the bundles")
+    parser.add_argument("--deploy", action="append", default=[], metavar="LAMBDA=FUNCTION",
+                        help="upload the bundle of a Lambda directory as the code of a Lambda function")
+    parser.add_argument("--region", help="region of the Lambda functions, default is the one of the AWS config")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    lambdas = args.lambdas or find_lambdas()
+    deployments = dict(value.split("=", 1) for value in args.deploy)
+    unknown = [name for name in deployments if name not in lambdas]
+    if unknown:
+        raise SystemExit(f"Cannot deploy {', '.join(unknown)}, the Lambdas built are {', '.join(lambdas)}")
+
+    bundles = {}
+    for name in lambdas:
+        try:
+            bundles[name] = build_bundle(os.path.join(REPO_DIR, name), args.output)
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"Error: the bundle of {name} was not built: {e}")
+        print(f"{name}: {bundles[name]} ({os.path.getsize(bundles[name])} bytes)")
+
+    for name, function_name in deployments.items():
+        code_sha256 = deploy_bundle(bundles[name], function_name, args.region)
+        print(f"{name}: deployed to {function_name}, CodeSha256 {code_sha256}")
+    return bundles
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Discovery of GPT's report files by report date, from one listing of their directory.
+
+GPT writes ``<GPT_overall_summary_path_prefix><date>.txt.gz`` and
+``<GPT_summary_per_store_path_prefix><date>.txt.gz`` to ``gdw_summary_reports/``. The date may be
+in any of REPORT_DATE_FORMATS and followed by a suffix (e.g. ``_0215`` for a re-delivery), so the
+files are indexed by the parsed date instead of being looked up by name.
+
+The listing of a directory is shared by the validations of a warm container, and by all the
+dates of a backfill, instead of one request per file. Only the standard library is imported here.
+"""
+import re
+import threading
+import time
+from datetime import datetime
+
+from .runtime import list_directory
+
+REPORT_DATE_FORMATS = ("%Y%m%d", "%Y-%m-%d", "%Y_%m_%d", "%d%m%Y", "%d-%m-%Y", "%d_%m_%Y")
+# a listing is reused for this long before the directory is listed again
+LISTING_MAX_AGE_SECONDS = 300
+# a date missing from a listing older than this lists the directory again, for files landing late
+RELIST_AFTER_SECONDS = 5
+# the interval of the listings while waiting for the GPT files of a date, see GPTFileIndex.wait
+GPT_POLL_SECONDS = 15
+# the date of a file name, in one of REPORT_DATE_FORMATS, then an optional suffix and the extension
+GPT_FILE_NAME_PATTERN = r"(?P<date>\d{4}[-_]?\d{2}[-_]?\d{2}|\d{2}[-_]?\d{2}[-_]?\d{4})(?:[-_.T][0-9A-Za-z_-]*)?\.txt(?:\.gz)?"
+
+
+def parse_report_date(report_date):
+    """
+    Parse the report date of a file name.
+
+    Parameters
+    ----------
+    report_date : str
+        The date part of a report file name, e.g. "20240131" or "2024-01-31".
+
+    Returns
+    -------
+    date or None:
+        The parsed date, None if the string is not in one of REPORT_DATE_FORMATS.
+    """
+    for date_format in REPORT_DATE_FORMATS:
+        try:
+            return datetime.strptime(report_date, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+class GPTFileIndex:
+    """
+    The GPT files of one directory by report date.
+
+    Parameters
+    ----------
+    GPT_report_path : str
+        The local or s3:// directory of GPT's reports.
+    path_prefixes : dict
+        The path prefixes of lambda_config.json, with GPT_overall_summary_path_prefix and
+        GPT_summary_per_store_path_prefix.
+    listing : list, optional
+        The (path, modified time) of the files of the directory, e.g. listed by another process.
+        Default is None, the directory is listed on the first lookup.
+
+    Attributes
+    ----------
+    listing : list
+        The (path, modified time) of the files of the last listing.
+    listed_at : float
+        The time.monotonic() of the last listing, None before the first one.
+    """
+
+    def __init__(self, GPT_report_path, path_prefixes, listing=None):
+        self.GPT_report_path = GPT_report_path
+        self.patterns = {
+            kind: re.compile(re.escape(path_prefixes[prefix]) + GPT_FILE_NAME_PATTERN)
+            for kind, prefix in (("overall", "GPT_overall_summary_path_prefix"), ("store", "GPT_summary_per_store_path_prefix"))
+        }
+        self.listing = []
+        self.listed_at = None
+        self._files = {}
+        self._lock = threading.Lock()
+        if listing is not None:
+            self._build(listing)
+
+    def _build(self, listing):
+        files = {}
+        for path, modified in listing:
+            name = path.split("/")[-1]
+            for kind, pattern in self.patterns.items():
+                match = pattern.fullmatch(name)
+                report_date = parse_report_date(match.group("date")) if match else None
+                if report_date is None:
+                    continue
+                # of several deliveries of the same date, the latest one is used
+                current = files.setdefault(report_date, {}).get(kind)
+                if current is None or (modified, path) > current:
+                    files[report_date][kind] = (modified, path)
+        with self._lock:
+            self.listing = list(listing)
+            self.listed_at = time.monotonic()
+            self._files = files
+
+    def refresh(self):
+        """
+        List the directory again.
+        """
+        self._build(list_directory(self.GPT_report_path))
+
+    def age(self):
+        """
+        The seconds since the last listing, None before the first one.
+        """
+        return None if self.listed_at is None else time.monotonic() - self.listed_at
+
+    def _paths(self, report_date):
+        with self._lock:
+            files = self._files.get(report_date, {})
+        return tuple(files[kind][1] if kind in files else None for kind in ("overall", "store"))
+
+    def dates(self):
+        """
+        The report dates with both GPT files.
+        """
+        with self._lock:
+            return sorted(report_date for report_date, files in self._files.items() if len(files) == 2)
+
+    def lookup(self, report_date, relist_after=RELIST_AFTER_SECONDS):
+        """
+        Get the GPT files of a report date.
+
+        Parameters
+        ----------
+        report_date : date
+            The report date, see parse_report_date.
+        relist_after : float, optional
+            If a file is missing and the listing is older than this, the directory is listed again.
+            Default is RELIST_AFTER_SECONDS, None never lists again.
+
+        Returns
+        -------
+        tuple:
+            The paths of the overall summary and of the TotXStore file, None for a missing file.
+        """
+        if self.listed_at is None:
+            self.refresh()
+        paths = self._paths(report_date)
+        if None in paths and relist_after is not None and self.age() > relist_after:
+            self.refresh()
+            paths = self._paths(report_date)
+        return paths
+
+    def wait(self, report_date, timeout, poll_seconds=GPT_POLL_SECONDS):
+        """
+        Wait until both GPT files of a report date are listed, for at most timeout seconds.
+
+        Returns
+        -------
+        tuple:
+            See lookup, with None for the files still missing after the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        paths = self.lookup(report_date)
+        while None in paths:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"GPT files of {report_date} still missing after {timeout} s")
+                break
+            print(f"waiting for the GPT files of {report_date} in {self.GPT_report_path}, {remaining:.0f} s left")
+            time.sleep(min(poll_seconds, remaining))
+            self.refresh()
+            paths = self._paths(report_date)
+        return paths
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _index_key(GPT_report_path, path_prefixes):
+    return (GPT_report_path, path_prefixes["GPT_overall_summary_path_prefix"], path_prefixes["GPT_summary_per_store_path_prefix"])
+
+
+def GPT_file_index(GPT_report_path, path_prefixes, max_age=LISTING_MAX_AGE_SECONDS):
+    """
+    Get the shared GPTFileIndex of a directory, listed again if its listing is older than max_age seconds.
+    """
+    key = _index_key(GPT_report_path, path_prefixes)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = GPTFileIndex(GPT_report_path, path_prefixes)
+    if index.listed_at is None or index.age() > max_age:
+        index.refresh()
+    return index
+
+
+def register_GPT_file_index(GPT_report_path, path_prefixes, listing):
+    """
+    Share a listing made elsewhere, e.g. by the parent process of the backfill workers.
+    """
+    with _indexes_lock:
+        _indexes[_index_key(GPT_report_path, path_prefixes)] = GPTFileIndex(GPT_report_path, path_prefixes, listing)
@@ -0,0 +1,210 @@
+"""
+The Lambda handler shared by the markets. The markets a Lambda validates are the ones of the
+"paths" section of the lambda_config.json it is deployed with, see summary_comp.markets.
+
+Nothing heavy is imported at module level: pandas, boto3 and openpyxl are only loaded once an
+event with a known market is received.
+"""
+MAX_CONCURRENT_RECORDS = 4
+
+
+def s3_records(event):
+    """
+    Get the S3 records of an event, including the S3 events wrapped in SQS messages.
+    """
+    for record in event.get("Records", []):
+        if "s3" in record:
+            yield record
+        elif "body" in record:
+            import json
+
+            yield from s3_records(json.loads(record["body"]))
+
+
+def validate_record(input_bucketName, input_fileName, market, cfg, smtp_session, notification_queue=None):
+    """
+    Run the validation of the portal report of one S3 record.
+    """
+    from .gpt_index import GPT_POLL_SECONDS
+    from .mail import MAX_ATTACHMENT_BYTES
+    from .process_function import generate_validation_report
+    from .runtime import get_runtime_context
+
+    market_paths = get_runtime_context().markets[market]
+    receiver_email = cfg['receiver_email']
+    secret_name = cfg['secret_name']
+    region_name = cfg['region_name']
+    email_port = cfg['email_port']
+    ENV = cfg["ENV"]
+    portal_report_path = "s3://" + input_bucketName + "/" + input_fileName
+    GPT_report_path = market_paths['GPT_file_path']
+    summary_report_path = market_paths['output_s3_path']
+    cc_recipients = cfg['cc_recipients']
+    portal_excel_sheet_names = cfg['constants']['portal_excel_sheet_names']
+    path_prefixes = cfg['constants']['path_prefixes']
+    checks = cfg['constants'].get('checks')
+    portal_reader = cfg['constants'].get('portal_reader', 'pandas')
+    store_chunksize = cfg['constants'].get('store_chunksize')
+    output_formats = cfg['constants'].get('output_formats', ['xlsx'])
+    excel_engine = cfg['constants'].get('excel_engine', 'openpyxl')
+    result_cache = cfg['constants'].get('result_cache', False)
+    email_on_cache_hit = cfg['constants'].get('email_on_cache_hit', False)
+    incremental = cfg['constants'].get('incremental', False)
+    profile = cfg['constants'].get('profile', False)
+    max_attachment_bytes = cfg['constants'].get('max_attachment_bytes', MAX_ATTACHMENT_BYTES)
+    GPT_wait_seconds = cfg['constants'].get('GPT_wait_seconds', 0)
+    GPT_poll_seconds = cfg['constants'].get('GPT_poll_seconds', GPT_POLL_SECONDS)
+    # the history of the market is kept next to its reports, unless the config names a shared one
+    history_path = (cfg['constants'].get('history_path') or summary_report_path + "history/") if cfg['constants'].get('history', False) else None
+    chronic_failures = cfg['constants'].get('chronic_failures')
+    item_chunksize = cfg['constants'].get('item_chunksize')
+    top_items = cfg['constants'].get('top_items')
+
+    print(f"receiver_email: {receiver_email}")
+    print(f"ENV : {ENV}")
+    print(f"portal_report_path: {portal_report_path}")
+    print(f"GPT_report_path: {GPT_report_path}")
+    print(f"summary_report_path: {summary_report_path}")
+    print(f"cc_recipients: {cc_recipients}")
+    print(f"portal_excel_sheet_names: {portal_excel_sheet_names}")
+    print(f"path_prefixes: {path_prefixes}")
+
+    message_dict = generate_validation_report(
+        env = ENV,
+        market = market,
+        portal_report_path = portal_report_path,
+        GPT_report_path = GPT_report_path,
+        summary_report_path = summary_report_path,
+        portal_excel_sheet_names = portal_excel_sheet_names,
+        path_prefixes = path_prefixes,
+        secret_name = secret_name,
+        region_name = region_name,
+        email_port = email_port,
+        receiver_email = receiver_email,
+        cc_recipients = cc_recipients,
+        checks = checks,
+        portal_reader = portal_reader,
+        store_chunksize = store_chunksize,
+        smtp_session = smtp_session,
+        output_formats = output_formats,
+        excel_engine = excel_engine,
+        result_cache = result_cache,
+        email_on_cache_hit = email_on_cache_hit,
+        incremental = incremental,
+        profile = profile,
+        max_attachment_bytes = max_attachment_bytes,
+        notification_queue = notification_queue,
+        GPT_wait_seconds = GPT_wait_seconds,
+        GPT_poll_seconds = GPT_poll_seconds,
+        history_path = history_path,
+        chronic_failures = chronic_failures,
+        item_chunksize = item_chunksize,
+        top_items = top_items
+    )
+    return {
+        "statusCode": 200,
+        "file": portal_report_path,
+        "market": market,
+        "body": message_dict,
+    }
+
+
+def lambda_handler(event, context):
+
+    records = list(s3_records(event))
+    if not records:
+        return {
+            "statusCode": 400,
+            "body": "ERROR: the event has no S3 records",
+        }
+    print(f"S3 event received with {len(records)} record(s)")
+
+    # the config and its market registry are loaded once per container; reading them only
+    # needs json, so events without a known market still do not load pandas, boto3 and openpyxl
+    from .runtime import get_runtime_context
+
+    markets = get_runtime_context().markets
+    results = [None] * len(records)
+    identified = []
+    for i, record in enumerate(records):
+        input_bucketName = record["s3"]["bucket"]["name"]
+        input_fileName = record["s3"]["object"]["key"]
+        market = markets.market_for_bucket(input_bucketName)
+        if market:
+            identified.append((i, input_bucketName, input_fileName, market))
+        else:
+            results[i] = {
+                "statusCode": 400,
+                "file": "s3://" + input_bucketName + "/" + input_fileName,
+                "body": "ERROR: EMR cluster cannot be started as market is not identified",
+            }
+
+    if identified:
+        from concurrent.futures import ThreadPoolExecutor
+
+        from .mail import MAX_ATTACHMENT_BYTES, SMTP_BACKOFF_SECONDS, SMTP_RETRIES, NotificationQueue, SMTPSession
+        from .metrics import StageMetrics
+
+        cfg = get_runtime_context().config
+        constants = cfg['constants']
+        # the storage settings of the config, the S3 filesystem and client of a warm container are kept
+        get_runtime_context().configure_storage(**constants.get('storage', {}))
+        # one SMTP connection for all the records of the event, the secret is looked up by the first
+        # validation and cached (a failed lookup fails each record on its own); the emails to the
+        # same recipients within the notification window are sent as one when the queue is closed
+        smtp_session = SMTPSession(
+            cfg['secret_name'], cfg['region_name'], cfg['email_port'],
+            retries = constants.get('smtp_retries', SMTP_RETRIES),
+            backoff_seconds = constants.get('smtp_backoff_seconds', SMTP_BACKOFF_SECONDS),
+        )
+        # the queue sends the emails of all the records, some after the metrics of their validation are
+        # emitted, so its send_email stage is emitted on a line of its own once the queue is closed
+        notification_metrics = StageMetrics()
+        notification_queue = NotificationQueue(
+            smtp_session,
+            window_seconds = constants.get('notification_window_seconds', 0),
+            max_attachment_bytes = constants.get('max_attachment_bytes', MAX_ATTACHMENT_BYTES),
+            metrics = notification_metrics,
+        )
+        with smtp_session, notification_queue, \
+                ThreadPoolExecutor(max_workers=min(len(identified), MAX_CONCURRENT_RECORDS)) as executor:
+            futures = {
+                i: executor.submit(validate_record, input_bucketName, input_fileName, market, cfg, smtp_session, notification_queue)
+                for i, input_bucketName, input_fileName, market in identified
+            }
+            for i, future in futures.items():
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    print(f"Error: validation of {records[i]['s3']['object']['key']} failed: {e}")
+                    results[i] = {
+                        "statusCode": 500,
+                        "file": "s3://" + records[i]["s3"]["bucket"]["name"] + "/" + records[i]["s3"]["object"]["key"],
+                        "body": f"ERROR: {e}",
+                    }
+        # the queue is flushed at the end of the with block, so the failed emails are only known here
+        notification_metrics.set_property(records=len(identified), emails_sent=notification_queue.sent, emails_failed=len(notification_queue.failed))
+        notification_metrics.emit()
+        failed_emails = {id(message_dict): e for message_dict, e in notification_queue.failed}
+        for i, result in enumerate(results):
+            if result["statusCode"] == 200 and id(result["body"]) in failed_emails:
+                results[i] = dict(result, statusCode=500, error=f"ERROR: email not sent: {failed_emails[id(result['body'])]}")
+
+    status_codes = {result["statusCode"] for result in results}
+    if status_codes == {200}:
+        return {
+            "statusCode": 200,
+            "body": f"validation successfully",
+            "results": results,
+        }
+    if status_codes == {400}:
+        return {
+            "statusCode": 400,
+            "body": "ERROR: EMR cluster cannot be started as market is not identified",
+            "results": results,
+        }
+    return {
+        "statusCode": 500 if 500 in status_codes else 207,
+        "body": "ERROR: validation failed for some of the records",
+        "results": results,
+    }
@@ -0,0 +1,355 @@
+"""
+History of the validations: an append-only Parquet dataset of the store and overall summaries of
+every market and report date, for trend queries over many days.
+
+Layout, under the history path (local or s3://)::
+
+    store_history/market=<market>/report_date=<YYYY-MM-DD>/part-<written at>.parquet
+    overall_history/market=<market>/report_date=<YYYY-MM-DD>/part-<written at>.parquet
+
+The store summaries are kept in long form, one row per store and store check (Global_Store_Id,
+Check, GPT, Portal, Deviation, Status, Store Match), so that the checks can change over time.
+A validation run again writes a new part instead of replacing the old one; the index (one listing
+of the dataset, see HistoryStore.index) keeps the latest part of every market and date. No file
+is ever rewritten, so the Lambdas of several markets and the backfill workers can write at the
+same time.
+
+Usage
+-----
+    python -m summary_comp.history --path s3://bucket/history/ chronic [--check "Total Net Sales"] [--days 14] [--min-failures 3]
+    python -m summary_comp.history --path s3://bucket/history/ trend --market france [--check total_net_sales] [--days 90]
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .gpt_index import parse_report_date
+from .runtime import list_directory, open_file
+
+STORE_HISTORY = "store_history"
+OVERALL_HISTORY = "overall_history"
+# the defaults of the chronic failures query and of the email section
+CHRONIC_FAILURE_DAYS = 14
+CHRONIC_FAILURE_MIN = 3
+# the stores listed in the chronic failures section of the email, the most failing first
+CHRONIC_FAILURES_IN_EMAIL = 20
+HISTORY_READ_THREADS = 16
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("The history store needs pyarrow, install it or disable the history") from e
+    return pa, pq
+
+
+def store_history_frame(store_summary, checks):
+    """
+    Convert a store level summary to the long form of the history, one row per store and store check.
+
+    Parameters
+    ----------
+    store_summary : DataFrame
+        The store level summary, see store_level_summary.
+    checks : list
+        The store checks of the registry, with their report columns from store_check_columns.
+
+    Returns
+    -------
+    DataFrame:
+        Global_Store_Id, Check, GPT, Portal, Deviation, Status and Store Match, the text columns as categoricals.
+    """
+    from .process_function import store_check_columns
+
+    columns = [store_check_columns(check) for check in checks]
+    n_stores = len(store_summary)
+    # the n_stores x n_checks blocks are transposed, so the rows are grouped by check
+    values = {
+        name: store_summary[[column[key] for column in columns]].to_numpy(dtype="float64", na_value=np.nan).T.ravel()
+        for name, key in (("GPT", "GPT"), ("Portal", "portal"), ("Deviation", "deviation"))
+    }
+    statuses = store_summary[[column["status"] for column in columns]].to_numpy(dtype=object).T.ravel()
+    return pd.DataFrame({
+        "Global_Store_Id": pd.concat([store_summary["Global_Store_Id"].astype("Int64")] * len(checks), ignore_index=True),
+        "Check": pd.Categorical.from_codes(np.repeat(np.arange(len(checks)), n_stores), categories=[check["name"] for check in checks]),
+        **values,
+        "Status": pd.Categorical(statuses),
+        "Store Match": pd.Categorical(np.tile(store_summary["Store Match"].to_numpy(dtype=object), len(checks))),
+    })
+
+
+class HistoryStore:
+    """
+    The history dataset under one path.
+
+    Parameters
+    ----------
+    path : str
+        The local or s3:// directory of the history, with a trailing "/".
+    """
+
+    def __init__(self, path):
+        self.path = path if path.endswith("/") else path + "/"
+
+    def _part_path(self, dataset, market, report_date, written_at):
+        return f"{self.path}{dataset}/market={market}/report_date={report_date.isoformat()}/part-{written_at}.parquet"
+
+    def append(self, market, report_date, store_summary, overall_summary, checks):
+        """
+        Add the summaries of one validation to the history.
+
+        Parameters
+        ----------
+        market : str
+            The name of the market.
+        report_date : str
+            The report date, in one of REPORT_DATE_FORMATS.
+        store_summary : DataFrame or StoreSummaryChunks
+            The store level summary, see store_level_summary, or the chunks of a streamed one,
+            converted and written one at a time.
+        overall_summary : DataFrame
+            The overall summary, see evaluate_overall_checks.
+        checks : list
+            The check registry the summaries were built with.
+
+        Returns
+        -------
+        dict:
+            The path of the part written to each dataset.
+        """
+        from .process_function import write_parquet_chunks
+
+        _pyarrow()
+        parsed_date = parse_report_date(report_date)
+        if parsed_date is None:
+            raise ValueError(f"Report date '{report_date}' is not in one of the report date formats")
+        written_at = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        # the values are saved as float64, the overall summary has int64 columns only on the dates without missing values
+        overall_frame = overall_summary.rename(columns={overall_summary.columns[-1]: "Status"}).astype(
+            {"Check": "category", "GPT": "float64", "Portal": "float64", "Difference": "float64", "Status": "category"},
+        )
+        store_checks = [check for check in checks if check["level"] == "store"]
+        store_chunks = [store_summary] if isinstance(store_summary, pd.DataFrame) else store_summary
+        frames = {
+            STORE_HISTORY: (store_history_frame(chunk, store_checks) for chunk in store_chunks),
+            OVERALL_HISTORY: [overall_frame],
+        }
+        paths = {}
+        for dataset, frame_chunks in frames.items():
+            path = self._part_path(dataset, market, parsed_date, written_at)
+            with open_file(path, "wb") as f:
+                write_parquet_chunks(f, frame_chunks)
+            paths[dataset] = path
+        return paths
+
+    def index(self, dataset=STORE_HISTORY):
+        """
+        List the parts of a dataset, from one listing.
+
+        Returns
+        -------
+        DataFrame:
+            market, report_date (datetime64) and path of the latest part of every market and date,
+            sorted by market and date.
+        """
+        rows = []
+        for path, _ in list_directory(f"{self.path}{dataset}/", recursive=True):
+            parts = path.split("/")
+            if len(parts) < 3 or not parts[-1].startswith("part-") or not parts[-1].endswith(".parquet"):
+                continue
+            market, report_date = parts[-3].partition("market=")[2], parts[-2].partition("report_date=")[2]
+            if market and report_date:
+                rows.append((market, report_date, parts[-1], path))
+        index = pd.DataFrame(rows, columns=["market", "report_date", "part", "path"])
+        index["report_date"] = pd.to_datetime(index["report_date"], format="%Y-%m-%d")
+        # the part names start with the time they were written at, so the last one is the latest
+        index = index.sort_values(["market", "report_date", "part"]).drop_duplicates(["market", "report_date"], keep="last")
+        return index.drop(columns="part").reset_index(drop=True)
+
+    def read(self, dataset=STORE_HISTORY, markets=None, days=None, end_date=None, columns=None, filters=None):
+        """
+        Read the latest parts of a dataset in a date window.
+
+        Parameters
+        ----------
+        dataset : str, optional
+            STORE_HISTORY (default) or OVERALL_HISTORY.
+        markets : list, optional
+            The markets to read, default is None, all of them.
+        days : int, optional
+            The number of days up to end_date to read, default is None, all of them.
+        end_date : str or date, optional
+            The last report date read, default is None, the latest date of the history.
+        columns : list, optional
+            The columns read from the parts, default is None, all of them.
+        filters : list, optional
+            pyarrow filters applied while reading, e.g. [("Status", "==", "FAIL")]. Default is None.
+
+        Returns
+        -------
+        DataFrame:
+            The rows of the parts, with their market and report_date.
+        """
+        pa, pq = _pyarrow()
+        index = self.index(dataset)
+        if markets is not None:
+            index = index[index["market"].isin(markets)]
+        if end_date is not None:
+            end_date = pd.Timestamp(parse_report_date(end_date) if isinstance(end_date, str) else end_date)
+            index = index[index["report_date"] <= end_date]
+        if days is not None and len(index):
+            window_end = end_date if end_date is not None else index["report_date"].max()
+            index = index[index["report_date"] > window_end - timedelta(days=days)]
+
+        def read_part(path):
+            # the file of the storage backend, only the footer and the column chunks needed are read
+            with open_file(path) as f:
+                return pq.read_table(f, columns=columns, filters=filters)
+
+        if not len(index):
+            return pd.DataFrame(columns=["market", "report_date"] + list(columns or []))
+        with ThreadPoolExecutor(max_workers=min(HISTORY_READ_THREADS, len(index))) as executor:
+            tables = list(executor.map(read_part, index["path"]))
+        lengths = np.array([table.num_rows for table in tables])
+        # the dictionaries of the parts differ, they are unified by the concatenation
+        table = pa.concat_tables(tables, promote_options="permissive")
+        frame = table.to_pandas()
+        frame.insert(0, "market", pd.Categorical(np.repeat(index["market"].to_numpy(), lengths)))
+        frame.insert(1, "report_date", np.repeat(index["report_date"].to_numpy(), lengths))
+        return frame
+
+    def chronic_failures(self, checks=None, min_failures=CHRONIC_FAILURE_MIN, days=CHRONIC_FAILURE_DAYS, end_date=None, markets=None):
+        """
+        Find the stores failing a check on many of the last report dates, e.g. the stores failing
+        on net sales on 3 or more of the last 14 days.
+
+        Parameters
+        ----------
+        checks : list, optional
+            The names of the store checks, default is None, all of them.
+        min_failures : int, optional
+            The least number of failing report dates, default is CHRONIC_FAILURE_MIN.
+        days : int, optional
+            The number of days up to end_date looked at, default is CHRONIC_FAILURE_DAYS.
+        end_date, markets :
+            See read.
+
+        Returns
+        -------
+        DataFrame:
+            market, Global_Store_Id, Check, Failures (the failing report dates), Last Failure and
+            Mean Deviation (over the failures), the most failing first.
+        """
+        filters = [("Status", "==", "FAIL")]
+        if checks is not None:
+            filters.append(("Check", "in", list(checks)))
+        failures = self.read(
+            STORE_HISTORY, markets, days, end_date, columns=["Global_Store_Id", "Check", "Deviation", "Status"], filters=filters,
+        )
+        columns = ["market", "Global_Store_Id", "Check", "Failures", "Last Failure", "Mean Deviation"]
+        if not len(failures):
+            return pd.DataFrame(columns=columns)
+        failures["Check"] = failures["Check"].astype(str)
+        summary = failures.groupby(["market", "Global_Store_Id", "Check"], observed=True, sort=False).agg(
+            **{"Failures": ("report_date", "nunique"), "Last Failure": ("report_date", "max"), "Mean Deviation": ("Deviation", "mean")},
+        ).reset_index()
+        summary = summary[summary["Failures"] >= min_failures]
+        return summary.sort_values(["Failures", "Last Failure", "market", "Global_Store_Id"], ascending=[False, False, True, True])[columns].reset_index(drop=True)
+
+    def overall_trend(self, markets=None, checks=None, days=None, end_date=None):
+        """
+        Get the overall checks of the report dates, e.g. the deviation trend of france.
+
+        Parameters
+        ----------
+        markets : list, optional
+            The markets, default is None, all of them.
+        checks : list, optional
+            The names of the overall checks, default is None, all of them.
+        days, end_date :
+            See read.
+
+        Returns
+        -------
+        DataFrame:
+            market, report_date, Check, GPT, Portal, Difference and Status, sorted by market, check and date.
+        """
+        filters = [("Check", "in", list(checks))] if checks is not None else None
+        trend = self.read(OVERALL_HISTORY, markets, days, end_date, filters=filters)
+        if not len(trend):
+            return trend
+        trend["Check"] = trend["Check"].astype(str)
+        return trend.sort_values(["market", "Check", "report_date"]).reset_index(drop=True)
+
+
+def chronic_failures_message(history, market, report_date, chronic_failures=None):
+    """
+    Build the chronic failures section of the email of a validation.
+
+    Parameters
+    ----------
+    history : HistoryStore
+        The history the validation was added to.
+    market : str
+        The market of the validation.
+    report_date : str
+        The report date of the validation, the end of the window.
+    chronic_failures : dict, optional
+        The "checks", "min_failures" and "days" of the query, see HistoryStore.chronic_failures.
+        Default is None, the defaults of the query.
+
+    Returns
+    -------
+    str:
+        The number of stores failing a check chronically and the most failing ones, with their checks.
+    """
+    options = dict(chronic_failures or {})
+    min_failures = options.get("min_failures", CHRONIC_FAILURE_MIN)
+    days = options.get("days", CHRONIC_FAILURE_DAYS)
+    failures = history.chronic_failures(options.get("checks"), min_failures, days, report_date, [market])
+    if not len(failures):
+        return f"no store failed a check on {min_failures} or more of the last {days} days"
+    # the rows are store and check pairs, the section counts and lists the stores, each with its failing checks
+    stores = {}
+    for store_id, check, count in failures[["Global_Store_Id", "Check", "Failures"]].itertuples(index=False):
+        stores.setdefault(store_id, []).append(f"{check} {count}/{days} days")
+    listed = ", ".join(
+        f"store {store_id} ({'; '.join(store_checks)})" for store_id, store_checks in list(stores.items())[:CHRONIC_FAILURES_IN_EMAIL]
+    )
+    more = f" and {len(stores) - CHRONIC_FAILURES_IN_EMAIL} more" if len(stores) > CHRONIC_FAILURES_IN_EMAIL else ""
+    return f"{len(stores)} store(s) failed a check on {min_failures} or more of the last {days} days: {listed}{more}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--path", required=True, help="the local or s3:// path of the history")
+    subparsers = parser.add_subparsers(dest="query", required=True)
+    chronic = subparsers.add_parser("chronic", help="stores failing a check on many of the last report dates")
+    chronic.add_argument("--check", action="append", dest="checks")
+    chronic.add_argument("--market", action="append", dest="markets")
+    chronic.add_argument("--days", type=int, default=CHRONIC_FAILURE_DAYS)
+    chronic.add_argument("--min-failures", type=int, default=CHRONIC_FAILURE_MIN)
+    chronic.add_argument("--end-date")
+    trend = subparsers.add_parser("trend", help="the overall checks of the report dates")
+    trend.add_argument("--market", action="append", dest="markets")
+    trend.add_argument("--check", action="append", dest="checks")
+    trend.add_argument("--days", type=int)
+    trend.add_argument("--end-date")
+    args = parser.parse_args()
+
+    history = HistoryStore(args.path)
+    if args.query == "chronic":
+        result = history.chronic_failures(args.checks, args.min_failures, args.days, args.end_date, args.markets)
+    else:
+        result = history.overall_trend(args.markets, args.checks, args.days, args.end_date)
+    with pd.option_context("display.max_rows", 200, "display.max_columns", None, "display.width", 200):
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Item level comparison of GPT's and portal's item by store detail extracts, the drill-down of the
+failing stores.
+
+GPT writes ``<GPT_item_per_store_path_prefix><date>.txt.gz`` (a gzip TSV, like the TotXStore file)
+to its report directory, and the portal exports ``<portal_item_per_store_path_prefix><date>.parquet``
+(or ``.csv``) next to its report. Both have the store id, the item id and the columns of the
+"item" level checks of the registry, with one or more rows (e.g. one per day) per store and item.
+
+The extracts can have tens of millions of rows, so they are never loaded: they are read in chunks
+of ITEM_CHUNKSIZE rows, the store and item ids of every chunk are converted to integer codes shared
+by both extracts (see IdCodes), and the values are summed per (store, item) code with a grouped
+reduction. Only the sums per store and item are kept in memory.
+"""
+import numpy as np
+import pandas as pd
+
+from .process_function import (
+    GPT_STORE_KEY, PORTAL_STORE_KEY, MISSING_STORE_ID, STATUS_CATEGORIES, STORE_MATCH_CATEGORIES, check_deviations, check_status_codes, check_thresholds,
+    compact_store_ids, compact_values, file_exists, load_checks, normalize_store_ids, read_csv_file, store_check_columns,
+)
+from .runtime import open_file
+
+GPT_ITEM_KEY = "mcd_gbal_item_id"
+PORTAL_ITEM_KEY = "item_id"
+# the prefixes of the extracts when the "path_prefixes" of lambda_config.json do not name them
+ITEM_PATH_PREFIXES = {
+    "GPT_item_per_store_path_prefix": "Daily_Pmix_ItemXStore_",
+    "portal_item_per_store_path_prefix": "Daily_Pmix_ItemXStore_",
+}
+ITEM_CHUNKSIZE = 500_000
+# the partial sums of this many chunks are reduced together, bounding the memory of the reduction
+ITEM_REDUCE_CHUNKS = 8
+TOP_ITEMS = 10
+
+
+class IdCodes:
+    """
+    Integer codes of ids, in the order the ids are first seen, shared by the chunks of both extracts.
+
+    Attributes
+    ----------
+    ids : Index
+        The id of every code.
+    """
+
+    def __init__(self):
+        self.ids = None
+
+    def encode(self, values):
+        """
+        Get the codes of ids, adding the new ones.
+
+        Parameters
+        ----------
+        values : array-like
+            The ids of a chunk, all of the same type.
+
+        Returns
+        -------
+        ndarray:
+            The int64 code of every id, -1 for a missing id.
+        """
+        # the ids of a chunk are factorized once, then only their distinct values are looked up
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        uniques = pd.Index(uniques)
+        if self.ids is None:
+            self.ids = uniques[:0]
+        unique_codes = self.ids.get_indexer(uniques)
+        new = unique_codes < 0
+        if new.any():
+            unique_codes[new] = np.arange(len(self.ids), len(self.ids) + new.sum())
+            self.ids = self.ids.append(uniques[new])
+        return np.where(codes < 0, -1, unique_codes[codes]).astype("int64")
+
+    def decode(self, codes):
+        """
+        Get the ids of codes.
+        """
+        if self.ids is None:
+            return np.array([], dtype=object)
+        return self.ids.take(codes).to_numpy()
+
+    def __len__(self):
+        return 0 if self.ids is None else len(self.ids)
+
+
+def item_extract_paths(portal_report_path, GPT_report_path, path_prefixes, report_date):
+    """
+    Get the paths of the item extracts of a report date.
+
+    Returns
+    -------
+    tuple:
+        The paths of GPT's and of the portal's extract. The portal's is the .parquet file if it exists,
+        else the .csv file.
+    """
+    prefixes = {**ITEM_PATH_PREFIXES, **path_prefixes}
+    GPT_path = GPT_report_path + prefixes["GPT_item_per_store_path_prefix"] + report_date + ".txt.gz"
+    portal_directory = portal_report_path.rsplit("/", 1)[0] + "/"
+    portal_path = portal_directory + prefixes["portal_item_per_store_path_prefix"] + report_date + ".parquet"
+    if not file_exists(portal_path):
+        portal_path = portal_path[:-len(".parquet")] + ".csv"
+    return GPT_path, portal_path
+
+
+def read_item_chunks(path, columns, id_columns, chunksize=ITEM_CHUNKSIZE):
+    """
+    Read an item extract in chunks.
+
+    Parameters
+    ----------
+    path : str
+        The local, s3:// or memory:// path of a .parquet, .csv or gzip TSV (.txt.gz) extract.
+    columns : list
+        The lowercase names of the columns to read, the column names of the file are matched case-insensitively.
+    id_columns : list
+        The columns read as strings, so that the item ids keep their leading zeros.
+    chunksize : int, optional
+        The rows of a chunk, default is ITEM_CHUNKSIZE.
+
+    Yields
+    ------
+    DataFrame:
+        A chunk with the lowercase column names.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the extract does not exist.
+    ValueError
+        If one of the columns is missing.
+    """
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Reading a parquet item extract needs pyarrow, install it or export the items as csv") from e
+        with open_file(path) as f:
+            parquet_file = pq.ParquetFile(f)
+            names = {name.lower(): name for name in parquet_file.schema_arrow.names}
+            missing = [column for column in columns if column not in names]
+            if missing:
+                raise ValueError(f"Columns {missing} not found in the item extract {path}")
+            # one row group is decoded at a time
+            for batch in parquet_file.iter_batches(batch_size=chunksize, columns=[names[column] for column in columns]):
+                chunk = batch.to_pandas().rename(columns=str.lower)
+                for column in id_columns:
+                    chunk[column] = chunk[column].astype("string")
+                yield chunk
+        return
+    sep = "," if path.endswith((".csv", ".csv.gz")) else "\t"
+    names = {name.lower(): name for name in read_csv_file(path, sep=sep, nrows=0).columns}
+    missing = [column for column in columns if column not in names]
+    if missing:
+        raise ValueError(f"Columns {missing} not found in the item extract {path}")
+    for chunk in read_csv_file(
+        path, sep=sep, chunksize=chunksize, usecols=[names[column] for column in columns],
+        dtype={names[column]: "string" for column in id_columns},
+    ):
+        yield chunk.rename(columns=str.lower)
+
+
+def _reduce_sums(partials):
+    """
+    Sum the partial sums of several chunks per key, keeping NaN for the keys without any value.
+    """
+    if len(partials) == 1:
+        return partials[0]
+    return pd.concat(partials).groupby(level=0, sort=False).sum(min_count=1)
+
+
+def aggregate_items(chunks, store_column, item_column, value_columns, store_codes, item_codes):
+    """
+    Sum the values of an item extract per store and item.
+
+    Parameters
+    ----------
+    chunks : iterable of DataFrame
+        The chunks of the extract, see read_item_chunks.
+    store_column, item_column : str
+        The store id and item id columns.
+    value_columns : list
+        The columns summed.
+    store_codes, item_codes : IdCodes
+        The codes of the store and item ids, shared with the other extract.
+
+    Returns
+    -------
+    tuple:
+        - sums : DataFrame
+            The sums of value_columns indexed by the int64 key store_code << 32 | item_code.
+        - rows : int
+            The rows read, including the ones without store or item id, which are not summed.
+    """
+    partials = []
+    rows = 0
+    skipped = 0
+    for chunk in chunks:
+        rows += len(chunk)
+        store_ids = normalize_store_ids(chunk[store_column])
+        store_code = store_codes.encode(pd.arrays.IntegerArray(store_ids, store_ids == MISSING_STORE_ID))
+        item_code = item_codes.encode(chunk[item_column].astype("string").str.strip())
+        valid = (store_code >= 0) & (item_code >= 0)
+        skipped += int((~valid).sum())
+        keys = (store_code[valid] << 32) | item_code[valid]
+        values = chunk[value_columns].to_numpy(dtype="float64", na_value=np.nan)[valid]
+        partials.append(pd.DataFrame(values, columns=value_columns).groupby(keys, sort=False).sum(min_count=1))
+        if len(partials) >= ITEM_REDUCE_CHUNKS:
+            partials = [_reduce_sums(partials)]
+    if skipped:
+        print(f"{skipped} item row(s) without store or item id skipped")
+    if not partials:
+        return pd.DataFrame(columns=value_columns, index=pd.Index([], dtype="int64"), dtype="float64"), rows
+    return _reduce_sums(partials), rows
+
+
+def item_level_summary(GPT_chunks, portal_chunks, checks=None, top_items=TOP_ITEMS):
+    """
+    Compare the item extracts of GPT and the portal, store by store and item by item.
+
+    Parameters
+    ----------
+    GPT_chunks : iterable of DataFrame
+        The chunks of GPT's extract (with lowercase column names), with the GPT_STORE_KEY, GPT_ITEM_KEY and the gpt_column of the item checks.
+    portal_chunks : iterable of DataFrame
+        The chunks of the portal's extract (with lowercase column names), with the PORTAL_STORE_KEY, PORTAL_ITEM_KEY and the portal_column of the item checks.
+    checks : list, optional
+        The check registry, its "item" level checks are run. Default is load_checks().
+    top_items : int, optional
+        The offending items listed per failing store, default is TOP_ITEMS.
+
+    Returns
+    -------
+    dict:
+        - top_items : DataFrame
+            The most offending items of every store with a failing item: Global_Store_Id, Item_Id, the
+            GPT, portal, deviation and status columns of every item check (see store_check_columns),
+            "Item Match", "Tolerance Multiple" (the largest deviation of the item, in multiples of the
+            tolerance of its check, a missing side counted as 0; empty for a deviation over a zero
+            tolerance, which ranks first) and "Rank" (1 for the most offending item of the store).
+        - stores : DataFrame
+            Global_Store_Id, "Items", "Failing Items", "Items only in GPT" and "Items only in portal" of
+            the stores with a failing item, the most failing first.
+        - items : int
+            The number of (store, item) pairs compared.
+        - rows : dict
+            The rows read from the "GPT" and the "portal" extract.
+
+    Notes
+    -----
+    An item fails if one of its checks fails or if it is only in one of the extracts.
+    """
+    checks = [check for check in load_checks(checks) if check["level"] == "item"]
+    if not checks:
+        raise ValueError('The check registry has no "item" level check')
+    store_codes, item_codes = IdCodes(), IdCodes()
+    GPT_sums, GPT_rows = aggregate_items(GPT_chunks, GPT_STORE_KEY, GPT_ITEM_KEY, [check["gpt_column"].lower() for check in checks], store_codes, item_codes)
+    portal_sums, portal_rows = aggregate_items(portal_chunks, PORTAL_STORE_KEY, PORTAL_ITEM_KEY, [check["portal_column"].lower() for check in checks], store_codes, item_codes)
+
+    # the keys are sorted, so the items of a store are next to each other
+    keys = GPT_sums.index.union(portal_sums.index)
+    GPT_rows_of_keys = GPT_sums.index.get_indexer(keys)
+    portal_rows_of_keys = portal_sums.index.get_indexer(keys)
+    GPT_values = np.full((len(keys), len(checks)), np.nan)
+    portal_values = np.full((len(keys), len(checks)), np.nan)
+    GPT_values[GPT_rows_of_keys >= 0] = GPT_sums.to_numpy(dtype="float64")[GPT_rows_of_keys[GPT_rows_of_keys >= 0]]
+    portal_values[portal_rows_of_keys >= 0] = portal_sums.to_numpy(dtype="float64")[portal_rows_of_keys[portal_rows_of_keys >= 0]]
+    deviation = check_deviations(checks, GPT_values, portal_values)
+    status_codes = check_status_codes(checks, GPT_values, deviation)
+    check_failed = status_codes == 1
+    GPT_only = portal_rows_of_keys < 0
+    portal_only = GPT_rows_of_keys < 0
+    failing = check_failed.any(axis=1) | GPT_only | portal_only
+
+    key_values = keys.to_numpy(dtype="int64")
+    store_code = key_values >> 32
+    item_code = key_values & 0xFFFFFFFF
+    failing_stores = np.unique(store_code[failing])
+    offending = np.flatnonzero(failing)
+
+    # the deviations of an item in multiples of the tolerance of their check, a missing side counting as 0
+    filled_deviation = np.abs(np.nan_to_num(GPT_values[offending]) - np.nan_to_num(portal_values[offending]))
+    filled_thresholds = np.abs(check_thresholds(checks, np.nan_to_num(GPT_values[offending])))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        multiples = np.where(filled_thresholds > 0, filled_deviation / filled_thresholds, np.where(filled_deviation > 0, np.inf, 0))
+    severity = multiples.max(axis=1)
+    order = np.lexsort((-severity, store_code[offending]))
+    offending, severity = offending[order], severity[order]
+    offending_stores = store_code[offending]
+    group_starts = np.flatnonzero(np.r_[True, offending_stores[1:] != offending_stores[:-1]]) if len(offending) else np.array([], dtype="int64")
+    rank = np.arange(len(offending)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(offending)]))
+    kept = rank < top_items
+    top, severity, rank = offending[kept], severity[kept], rank[kept]
+
+    columns = [store_check_columns(check) for check in checks]
+    # the same compact types as the store level summary, see _store_summary_frame
+    status_codes = status_codes[top]
+    match_codes = np.select([portal_only[top], GPT_only[top]], [np.int8(2), np.int8(1)], default=np.int8(0)).astype("int8")
+    top_frame = {
+        "Global_Store_Id": compact_store_ids(store_codes.decode(store_code[top]).astype("int64")),
+        "Item_Id": item_codes.decode(item_code[top]).astype(object),
+    }
+    for key, values in (("GPT", GPT_values[top]), ("portal", portal_values[top]), ("deviation", deviation[top])):
+        for i, column in enumerate(columns):
+            top_frame[column[key]] = compact_values(values[:, i])
+    for i, column in enumerate(columns):
+        top_frame[column["status"]] = pd.Categorical.from_codes(status_codes[:, i], STATUS_CATEGORIES)
+    top_frame = pd.DataFrame(top_frame)
+    top_frame["Item Match"] = pd.Categorical.from_codes(match_codes, STORE_MATCH_CATEGORIES)
+    top_frame["Tolerance Multiple"] = np.where(np.isinf(severity), np.nan, severity)
+    top_frame["Rank"] = rank + 1
+
+    # the items of the failing stores, counted with one bincount per count
+    n_stores = len(store_codes)
+    counts = {
+        "Items": np.bincount(store_code, minlength=n_stores),
+        "Failing Items": np.bincount(store_code, weights=failing, minlength=n_stores),
+        "Items only in GPT": np.bincount(store_code, weights=GPT_only, minlength=n_stores),
+        "Items only in portal": np.bincount(store_code, weights=portal_only, minlength=n_stores),
+    }
+    stores_frame = pd.DataFrame({
+        "Global_Store_Id": store_codes.decode(failing_stores).astype("int64"),
+        **{name: count[failing_stores].astype("int64") for name, count in counts.items()},
+    }).sort_values(["Failing Items", "Global_Store_Id"], ascending=[False, True], ignore_index=True)
+    return {
+        "top_items": top_frame,
+        "stores": stores_frame,
+        "items": len(keys),
+        "rows": {"GPT": GPT_rows, "portal": portal_rows},
+    }
+
+
+def compare_item_extracts(portal_report_path, GPT_report_path, path_prefixes, report_date, checks=None, chunksize=ITEM_CHUNKSIZE, top_items=TOP_ITEMS):
+    """
+    Compare the item extracts of a report date, see item_extract_paths and item_level_summary.
+
+    Returns
+    -------
+    dict:
+        The result of item_level_summary, with the "paths" of both extracts.
+    """
+    checks = [check for check in load_checks(checks) if check["level"] == "item"]
+    GPT_path, portal_path = item_extract_paths(portal_report_path, GPT_report_path, path_prefixes, report_date)
+    print(f"item extracts: {GPT_path}, {portal_path}")
+    GPT_chunks = read_item_chunks(GPT_path, [GPT_STORE_KEY, GPT_ITEM_KEY] + [check["gpt_column"].lower() for check in checks], [GPT_ITEM_KEY], chunksize)
+    portal_chunks = read_item_chunks(portal_path, [PORTAL_STORE_KEY, PORTAL_ITEM_KEY] + [check["portal_column"].lower() for check in checks], [PORTAL_ITEM_KEY], chunksize)
+    result = item_level_summary(GPT_chunks, portal_chunks, checks, top_items)
+    result["paths"] = {"GPT": GPT_path, "portal": portal_path}
+    return result
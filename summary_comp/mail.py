@@ -0,0 +1,756 @@
+"""
+Streaming assembly and sending of the validation emails.
+
+The MIME message is generated in chunks while it is sent, and every attachment is read (and
+base64 encoded) block by block from its local file or, with ranged GET requests, from S3, so an
+attachment is never held in memory as a whole.
+
+The emails are sent over an SMTPSession, one authenticated connection retried with backoff, and
+can be coalesced per recipient list by a NotificationQueue.
+"""
+import base64
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from email.header import Header
+
+from .metrics import StageMetrics
+from .runtime import file_size, get_storage, key_vault
+from .storage import storage_scheme
+
+# the number of bytes read from an attachment at a time, a multiple of 57 (one line of base64)
+ATTACHMENT_BLOCK_SIZE = 57 * 16 * 1024
+# above this total size the attachments are replaced by links, the limit of most SMTP servers is 20-25 MB
+# after the base64 encoding, which adds a third
+MAX_ATTACHMENT_BYTES = 10 * 1024 * 1024
+# the longest validity of a presigned URL signed with SigV4
+ATTACHMENT_LINK_EXPIRY_SECONDS = 7 * 24 * 3600
+# a failed email is sent again up to SMTP_RETRIES times, after SMTP_BACKOFF_SECONDS, then twice as long every time
+SMTP_RETRIES = 3
+SMTP_BACKOFF_SECONDS = 2.0
+
+
+class Attachment:
+    """
+    A file attached to an email.
+
+    Parameters
+    ----------
+    path : str
+        The local, s3:// or memory:// path the file is read from.
+    filename : str, optional
+        The name of the attachment, default is the name of the file.
+    link_path : str, optional
+        The s3:// path of the same file, linked instead of attached if the email is too large.
+        Default is path when it is an s3:// path.
+    """
+
+    def __init__(self, path, filename=None, link_path=None):
+        self.path = path
+        self.filename = filename or path.split("/")[-1]
+        self.link_path = link_path or (path if path.startswith("s3://") else None)
+        self._size = None
+
+    @property
+    def size(self):
+        """
+        The size of the file in bytes.
+        """
+        if self._size is None:
+            self._size = file_size(self.path)
+        return self._size
+
+    def blocks(self, block_size=ATTACHMENT_BLOCK_SIZE):
+        """
+        Read the file block by block with its storage backend, with one ranged GET request per
+        block for an s3:// file.
+        """
+        yield from get_storage(self.path).blocks(self.path, block_size)
+
+    def link(self, expires_in=ATTACHMENT_LINK_EXPIRY_SECONDS):
+        """
+        Get a presigned URL of the file, None if it is not on S3.
+
+        Notes
+        -----
+        A URL signed with the temporary credentials of a Lambda role stops working when
+        the credentials expire, before expires_in if that is shorter.
+        """
+        if self.link_path is None:
+            return None
+        return get_storage(self.link_path).link(self.link_path, expires_in)
+
+
+def as_attachments(attachment_paths):
+    """
+    Convert a list of paths and Attachment objects to Attachment objects.
+    """
+    return [path if isinstance(path, Attachment) else Attachment(path) for path in attachment_paths]
+
+
+def limit_attachments(attachments, message_dict, max_attachment_bytes=MAX_ATTACHMENT_BYTES):
+    """
+    Replace the attachments by links (or by their path) if their total size is above the cap.
+
+    Parameters
+    ----------
+    attachments : list
+        The Attachment objects of the email.
+    message_dict : dict
+        The content of the email, not modified.
+    max_attachment_bytes : int, optional
+        The largest total size of the attachments that is attached, default is MAX_ATTACHMENT_BYTES.
+        None means no cap.
+
+    Returns
+    -------
+    tuple:
+        - attachments : list
+            The attachments to send, empty if they are above the cap.
+        - message_dict : dict
+            The content of the email, with a presigned link (or the path) of every attachment
+            that was replaced.
+    """
+    total_size = sum(attachment.size for attachment in attachments)
+    if max_attachment_bytes is None or total_size <= max_attachment_bytes:
+        return attachments, message_dict
+    print(f"attachments of {total_size} bytes above the cap of {max_attachment_bytes} bytes, sending links instead")
+    message_dict = dict(message_dict)
+    for attachment in attachments:
+        try:
+            link = attachment.link()
+        except Exception as e:
+            print(f"Error: no presigned link for {attachment.link_path}: {e}")
+            link = None
+        if link is not None:
+            message_dict[f"{attachment.filename} (too large to attach, link valid for {ATTACHMENT_LINK_EXPIRY_SECONDS // 86400} days)"] = f'<a href="{link}">{attachment.filename}</a>'
+        else:
+            message_dict[f"{attachment.filename} (too large to attach)"] = attachment.link_path or attachment.path
+    return [], message_dict
+
+
+def html_paragraphs(message_dict):
+    """
+    Build one html paragraph per item of message_dict other than the subject.
+    """
+    return "".join(f'<p><b>{key.capitalize()}:</b> {value}</p>' for key, value in message_dict.items() if key != "subject")
+
+
+def html_body(message_dict):
+    """
+    Build the html body of an email, one paragraph per item of message_dict other than the subject.
+    """
+    html_content = '''
+        <html>
+        <body>
+        '''
+    html_content += html_paragraphs(message_dict)
+    html_content += '''
+        </body>
+        </html>
+    '''
+    return html_content
+
+
+def digest_message(message_dicts):
+    """
+    Merge the contents of several emails into the content of one email.
+
+    Parameters
+    ----------
+    message_dicts : list
+        The contents of the emails, each with a "subject".
+
+    Returns
+    -------
+    tuple:
+        - subject : str
+            "PMIX Summary Comparisons (<count>): " followed by the subjects, with the errors first.
+        - html_content : str
+            The html body, one section titled with its subject per email.
+    """
+    message_dicts = sorted(message_dicts, key=lambda message_dict: not message_dict["subject"].startswith("Error"))
+    subject = f"PMIX Summary Comparisons ({len(message_dicts)}): " + "; ".join(message_dict["subject"] for message_dict in message_dicts)
+    html_content = '''
+        <html>
+        <body>
+        '''
+    for message_dict in message_dicts:
+        html_content += f'<h3>{message_dict["subject"]}</h3>' + html_paragraphs(message_dict)
+    html_content += '''
+        </body>
+        </html>
+    '''
+    return subject, html_content
+
+
+def _base64_lines(blocks):
+    """
+    Encode blocks of bytes as base64 lines of 76 characters, the blocks being multiples of 57 bytes
+    except the last one.
+    """
+    for block in blocks:
+        encoded = base64.b64encode(block)
+        yield b"\r\n".join(encoded[i:i + 76] for i in range(0, len(encoded), 76)) + b"\r\n"
+
+
+def mime_chunks(sender_email, receiver_email, cc_recipients, subject, html_content, attachments):
+    """
+    Generate a multipart/mixed MIME message with an html body and attachments, in chunks.
+
+    The attachments are read while the message is generated, so they are only read as the chunks
+    are consumed. Every line ends with CRLF and no line starts with a dot, so the chunks can be sent
+    as they are after the SMTP DATA command.
+
+    Returns
+    -------
+    generator:
+        The bytes of the message.
+    """
+    boundary = f"=============={uuid.uuid4().hex}=="
+    encoded_subject = Header(subject, "utf-8").encode(linesep="\r\n")
+    headers = [
+        f"From: {sender_email}",
+        f"To: {', '.join(receiver_email)}",
+    ]
+    if cc_recipients:
+        headers.append(f"CC: {', '.join(cc_recipients)}")
+    headers += [
+        f"Subject: {encoded_subject}",
+        "MIME-Version: 1.0",
+        f'Content-Type: multipart/mixed; boundary="{boundary}"',
+        "",
+        f"--{boundary}",
+        'Content-Type: text/html; charset="utf-8"',
+        "Content-Transfer-Encoding: base64",
+        "",
+        "",
+    ]
+    yield "\r\n".join(headers).encode()
+    yield from _base64_lines([html_content.encode("utf-8")])
+    for attachment in attachments:
+        yield "\r\n".join([
+            f"--{boundary}",
+            "Content-Type: application/octet-stream",
+            f'Content-Disposition: attachment; filename="{attachment.filename}"',
+            "Content-Transfer-Encoding: base64",
+            "",
+            "",
+        ]).encode()
+        yield from _base64_lines(attachment.blocks())
+    yield f"--{boundary}--\r\n".encode()
+
+
+def send_mime(server, sender_email, recipients, chunks):
+    """
+    Send a message generated in chunks over a connected (and logged in) smtplib server.
+
+    Returns
+    -------
+    int:
+        The number of bytes of the message.
+
+    Raises
+    ------
+    smtplib.SMTPException
+        As smtplib's sendmail does, if the sender, all the recipients or the message are refused.
+    """
+    import smtplib
+
+    server.ehlo_or_helo_if_needed()
+    code, response = server.mail(sender_email)
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPSenderRefused(code, response, sender_email)
+    refused = {}
+    for recipient in recipients:
+        code, response = server.rcpt(recipient)
+        if code not in (250, 251):
+            refused[recipient] = (code, response)
+    if len(refused) == len(recipients):
+        server.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+    code, response = server.docmd("data")
+    if code != 354:
+        server.rset()
+        raise smtplib.SMTPDataError(code, response)
+    # the small chunks (headers, boundaries) are sent with the next ones, a write per chunk stalls on delayed ACKs
+    size = 0
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        size += len(chunk)
+        if len(buffer) >= ATTACHMENT_BLOCK_SIZE:
+            server.send(bytes(buffer))
+            buffer.clear()
+    server.send(bytes(buffer) + b".\r\n")
+    code, response = server.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, response)
+    for recipient, (code, response) in refused.items():
+        print(f"Error: recipient {recipient} refused: {code} {response}")
+    return size
+
+
+def send_email(sender_email, receiver_email, password, cc_recipients, host, port, message_dict, attachment_paths, smtp_session=None, metrics=None, max_attachment_bytes=MAX_ATTACHMENT_BYTES, html_content=None):
+    """
+    Sends an email with attachments using SMTP and Gmail.
+
+    Parameters
+    ----------
+    sender_email : str
+        The email address of the sender.
+    receiver_email : str
+        The email address of the receiver.
+    password : str
+        The app password for the sender's email account.
+    cc_recipients : list 
+        A list of email addresses to be included as CC recipients.
+    message_dict : dict 
+        A dictionary containing the message content.
+        - The dictionary should have the "subject" key for the email subject
+        - Other key-value pairs for additional message details
+    attachment_paths : list
+        A list of attachments, local or s3:// paths or Attachment objects (e.g. the local copy of
+        a report that was just saved to S3, which is then not downloaded again).
+
+    smtp_session : SMTPSession, optional
+        An open SMTP session to send the email with. If None, a new connection is opened
+        and logged in with host, port and password for this email only.
+    metrics : StageMetrics, optional
+        The metrics the sending of the email is recorded in, as the send_email stage. Default is None.
+    max_attachment_bytes : int, optional
+        The largest total size of the attachments. Larger attachments are replaced by presigned
+        links (or their path) in the body, see limit_attachments. Default is MAX_ATTACHMENT_BYTES,
+        None means no cap.
+    html_content : str, optional
+        The html body of the email, e.g. of a digest (see digest_message). Default is None, the body
+        is built from message_dict with html_body.
+
+    Returns
+    -------
+        None
+
+    Notes
+    -----
+    The message is generated while it is sent (see mime_chunks), so the attachments are read
+    block by block and never held in memory as a whole.
+    """
+    import smtplib
+
+    metrics = metrics if metrics is not None else StageMetrics()
+    subject = message_dict["subject"]
+    cc_recipients = list(cc_recipients or [])
+
+    attachments = []
+    for attachment in as_attachments(attachment_paths):
+        try:
+            print(f"attachment {attachment.path}: {attachment.size} bytes")
+            attachments.append(attachment)
+        except Exception as e:
+            print(f"Error retrieving attachment from {attachment.path}: {e}")
+    attachments, limited_message_dict = limit_attachments(attachments, message_dict, max_attachment_bytes)
+    if html_content is None:
+        html_content = html_body(limited_message_dict)
+    elif limited_message_dict is not message_dict:
+        # the links replacing the attachments go after the given body
+        links = {key: value for key, value in limited_message_dict.items() if key not in message_dict}
+        html_content = html_content.replace("</body>", html_paragraphs(links) + "</body>", 1)
+
+    def chunks():
+        return mime_chunks(sender_email, receiver_email, cc_recipients, subject, html_content, attachments)
+
+    # Send the email
+    with metrics.stage("send_email") as stage:
+        stage["attachments"] = len(attachments)
+        if smtp_session is not None:
+            stage["bytes_sent"] = smtp_session.send_stream(sender_email, receiver_email + cc_recipients, chunks)
+            return
+        with smtplib.SMTP_SSL(host, port) as server:
+            server.login(sender_email, password)
+            stage["bytes_sent"] = send_mime(server, sender_email, receiver_email + cc_recipients, chunks())
+            server.quit()
+        
+
+
+def transient_smtp_error(error):
+    """
+    Tell whether sending an email again may succeed after an error: a dropped or refused connection,
+    a timeout, or a temporary (4xx) reply of the server, e.g. a rate limit.
+    """
+    import smtplib
+
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+class SMTPSession:
+    """
+    One authenticated SMTP connection shared by several emails, possibly sent from several threads.
+
+    The connection is opened and logged in with the email secret on the first email, and closed
+    when the session is closed (or at the end of the with block). An email failing with a transient
+    error (see transient_smtp_error) is sent again on a new connection, after a growing delay.
+
+    Parameters
+    ----------
+    secret_name : str
+        The name of the secret containing the email details.
+    region_name : str
+        The AWS region where the secret manager is located.
+    port : int
+        The port of the SMTP server.
+    use_ssl : bool, optional
+        If False, the connection is plain SMTP instead of SMTP over SSL, e.g. to a local SMTP sink.
+        Default is True.
+    retries : int, optional
+        The number of times a failed email is sent again, default is SMTP_RETRIES.
+    backoff_seconds : float, optional
+        The delay before the first retry, doubled for every other retry. Default is SMTP_BACKOFF_SECONDS.
+    """
+
+    def __init__(self, secret_name, region_name, port, use_ssl=True, retries=SMTP_RETRIES, backoff_seconds=SMTP_BACKOFF_SECONDS):
+        self.secret_name = secret_name
+        self.region_name = region_name
+        self.port = port
+        self.use_ssl = use_ssl
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.connections = 0
+        self._server = None
+        self._lock = threading.Lock()
+
+    @property
+    def sender_email(self):
+        """
+        The sender of the emails, the user of the email secret.
+        """
+        return key_vault(secret_name = self.secret_name, region_name = self.region_name)['EMAIL_HOST_USER']
+
+    def _connect(self):
+        import smtplib
+
+        for refresh in (False, True):
+            secret_string_json = key_vault(secret_name = self.secret_name, region_name = self.region_name, refresh = refresh)
+            server = (smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP)(secret_string_json['EMAIL_HOST'], self.port)
+            self.connections += 1
+            try:
+                server.login(secret_string_json['EMAIL_HOST_USER'], secret_string_json['EMAIL_HOST_PASSWORD'])
+                return server
+            except smtplib.SMTPAuthenticationError:
+                server.close()
+                if refresh:
+                    raise
+                print("Error: SMTP authentication failed with the cached secret, fetching it again.")
+
+    def _discard(self):
+        """
+        Drop the connection after an error, without waiting for the server.
+        """
+        if self._server is not None:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+            self._server = None
+
+    def send_stream(self, sender_email, recipients, chunks):
+        """
+        Send one email generated in chunks over the shared connection, retrying transient errors with backoff.
+
+        Parameters
+        ----------
+        chunks : callable
+            Returns a new generator of the bytes of the message, see mime_chunks. It is called
+            again if the message has to be sent again.
+
+        Returns
+        -------
+        int:
+            The number of bytes of the message.
+        """
+        import smtplib
+
+        with self._lock:
+            for attempt in range(self.retries + 1):
+                try:
+                    if self._server is None:
+                        self._server = self._connect()
+                    return send_mime(self._server, sender_email, recipients, chunks())
+                except Exception as e:
+                    self._discard()
+                    if attempt == self.retries or not transient_smtp_error(e):
+                        raise
+                    # a connection dropped while idle is opened again at once
+                    delay = 0 if attempt == 0 and isinstance(e, smtplib.SMTPServerDisconnected) else self.backoff_seconds * 2 ** attempt
+                    print(f"Error sending the email ({type(e).__name__}: {e}), retrying in {delay:.1f} s")
+                    time.sleep(delay)
+
+    def close(self):
+        """
+        Close the connection, if it was opened.
+        """
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except Exception as e:
+                    print(f"Error closing the SMTP session: {e}")
+                self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def send_email_from_secret(secret_name, region_name, receiver_email, cc_recipients, port, message_dict, attachment_paths, smtp_session=None, metrics=None, max_attachment_bytes=MAX_ATTACHMENT_BYTES):
+    """
+    Sends an email with send_email, using the sender details of the email secret.
+
+    Parameters
+    ----------
+    secret_name : str
+        The name of the secret containing the email details.
+    region_name : str
+        The AWS region where the secret manager is located.
+    receiver_email, cc_recipients, port, message_dict, attachment_paths, smtp_session, metrics, max_attachment_bytes :
+        See send_email.
+
+    Notes
+    -----
+    Without smtp_session, an SMTPSession is opened for this email only, so the email is retried
+    the same way, and the secret is fetched again if the SMTP server rejects the cached credentials.
+    """
+    if smtp_session is None:
+        with SMTPSession(secret_name, region_name, port) as smtp_session:
+            return send_email_from_secret(
+                secret_name, region_name, receiver_email, cc_recipients, port, message_dict, attachment_paths,
+                smtp_session, metrics, max_attachment_bytes,
+            )
+    send_email(
+        sender_email = smtp_session.sender_email,
+        receiver_email = receiver_email,
+        password = None,
+        cc_recipients = cc_recipients,
+        host = None,
+        port = port,
+        message_dict = message_dict,
+        attachment_paths = attachment_paths,
+        smtp_session = smtp_session,
+        metrics = metrics,
+        max_attachment_bytes = max_attachment_bytes
+    )
+
+
+class NotificationQueue:
+    """
+    Coalesces the emails sent to the same recipients within a time window into one digest email.
+
+    The first email to a recipient list opens its window; the emails queued for the same list
+    before the window closes are sent with it, as one email with a section (and the attachments)
+    of each. A single email is sent as it is. Whatever is still queued is sent when the queue is
+    flushed or closed (or at the end of the with block).
+
+    Parameters
+    ----------
+    smtp_session : SMTPSession
+        The session the emails are sent over.
+    window_seconds : float, optional
+        The time the first email to a recipient list waits for others, default is 0, every
+        email is sent when it is queued.
+    max_attachment_bytes : int, optional
+        The cap of the attachments of one (digest) email, see send_email. Default is MAX_ATTACHMENT_BYTES.
+    metrics : StageMetrics, optional
+        The metrics the emails are recorded in, as the send_email stage. Default is None.
+
+    Attributes
+    ----------
+    sent : int
+        The number of emails sent.
+    failed : list
+        The (message_dict, exception) of every queued email whose sending failed.
+    """
+
+    def __init__(self, smtp_session, window_seconds=0, max_attachment_bytes=MAX_ATTACHMENT_BYTES, metrics=None):
+        self.smtp_session = smtp_session
+        self.window_seconds = window_seconds
+        self.max_attachment_bytes = max_attachment_bytes
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        self.sent = 0
+        self.failed = []
+        self._pending = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+        # held while a recipient list is sent, so that close waits for the sending of a window
+        self._sending = threading.Lock()
+        self._directory = tempfile.TemporaryDirectory(prefix="pmix_mail_")
+        self._copies = 0
+
+    def _keep(self, attachment):
+        """
+        Link (or copy) a local attachment into the queue's directory, as the file of the caller
+        may be deleted before the email is sent.
+        """
+        if storage_scheme(attachment.path) != "local":
+            return attachment
+        with self._lock:
+            self._copies += 1
+            directory = os.path.join(self._directory.name, str(self._copies))
+        os.makedirs(directory)
+        path = os.path.join(directory, attachment.filename)
+        try:
+            os.link(attachment.path, path)
+        except OSError:
+            shutil.copyfile(attachment.path, path)
+        return Attachment(path, attachment.filename, attachment.link_path)
+
+    def put(self, receiver_email, cc_recipients, message_dict, attachment_paths=(), on_sent=None):
+        """
+        Queue an email, see send_email for the parameters.
+
+        on_sent is called without arguments once the email (or the digest it is part of) is sent,
+        it is not called if the sending fails.
+        """
+        attachments = []
+        for attachment in as_attachments(attachment_paths):
+            try:
+                attachments.append(self._keep(attachment))
+            except OSError as e:
+                print(f"Error retrieving attachment from {attachment.path}: {e}")
+        key = (tuple(receiver_email), tuple(cc_recipients or []))
+        with self._lock:
+            self._pending.setdefault(key, []).append((message_dict, attachments, on_sent))
+            if self.window_seconds > 0 and key not in self._timers:
+                timer = threading.Timer(self.window_seconds, self._send, args=(key,))
+                timer.daemon = True
+                self._timers[key] = timer
+                timer.start()
+        if self.window_seconds <= 0:
+            self._send(key)
+
+    def _send(self, key):
+        """
+        Send the emails queued for one recipient list, as one email.
+        """
+        with self._sending:
+            self._send_queued(key)
+
+    def _send_queued(self, key):
+        with self._lock:
+            timer = self._timers.pop(key, None)
+            queued = self._pending.pop(key, [])
+        if timer is not None:
+            timer.cancel()
+        if not queued:
+            return
+        receiver_email, cc_recipients = list(key[0]), list(key[1])
+        message_dicts = [message_dict for message_dict, _, _ in queued]
+        attachments = []
+        for message_dict, message_attachments, _ in queued:
+            for attachment in message_attachments:
+                if len(queued) > 1 and message_dict.get("market"):
+                    # the reports of two markets have the same file name
+                    attachment = Attachment(attachment.path, f"{message_dict['market']}_{attachment.filename}", attachment.link_path)
+                attachments.append(attachment)
+        if len(queued) == 1:
+            message_dict, html_content = message_dicts[0], None
+        else:
+            subject, html_content = digest_message(message_dicts)
+            message_dict = {"subject": subject}
+        try:
+            send_email(
+                sender_email = self.smtp_session.sender_email,
+                receiver_email = receiver_email,
+                password = None,
+                cc_recipients = cc_recipients,
+                host = None,
+                port = self.smtp_session.port,
+                message_dict = message_dict,
+                attachment_paths = attachments,
+                smtp_session = self.smtp_session,
+                metrics = self.metrics,
+                max_attachment_bytes = self.max_attachment_bytes,
+                html_content = html_content
+            )
+            with self._lock:
+                self.sent += 1
+            print(f"email with {len(queued)} notification(s) sent to {', '.join(receiver_email)}")
+        except Exception as e:
+            print(f"Error: email with {len(queued)} notification(s) to {', '.join(receiver_email)} not sent: {e}")
+            with self._lock:
+                self.failed.extend((message_dict, e) for message_dict in message_dicts)
+            return
+        for _, _, on_sent in queued:
+            if on_sent is not None:
+                on_sent()
+
+    def flush(self):
+        """
+        Send everything that is queued, without waiting for the windows to close.
+        """
+        with self._lock:
+            keys = list(self._pending)
+        for key in keys:
+            self._send(key)
+
+    def close(self):
+        """
+        Flush the queue and delete its copies of the attachments.
+        """
+        self.flush()
+        with self._sending:
+            self._directory.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def notify(notification_queue, secret_name, region_name, receiver_email, cc_recipients, port, message_dict, attachment_paths, smtp_session=None, metrics=None, max_attachment_bytes=MAX_ATTACHMENT_BYTES, on_sent=None):
+    """
+    Queue an email in notification_queue, or send it at once with send_email_from_secret if it is None.
+
+    Parameters
+    ----------
+    notification_queue : NotificationQueue
+        The queue of the email, or None.
+    secret_name, region_name, receiver_email, cc_recipients, port, message_dict, attachment_paths, smtp_session, metrics, max_attachment_bytes :
+        See send_email_from_secret, only receiver_email, cc_recipients, message_dict and attachment_paths are
+        used with a queue.
+    on_sent : callable, optional
+        Called without arguments once the email is sent, i.e. when the queue sends it with a queue.
+        It is not called if the sending fails. Default is None.
+    """
+    if notification_queue is not None:
+        notification_queue.put(receiver_email, cc_recipients, message_dict, attachment_paths, on_sent)
+        if metrics is not None:
+            metrics.set_property(notification="queued")
+        return
+    send_email_from_secret(
+        secret_name = secret_name,
+        region_name = region_name,
+        receiver_email = receiver_email,
+        cc_recipients = cc_recipients,
+        port = port,
+        message_dict = message_dict,
+        attachment_paths = attachment_paths,
+        smtp_session = smtp_session,
+        metrics = metrics,
+        max_attachment_bytes = max_attachment_bytes
+    )
+    if on_sent is not None:
+        on_sent()
@@ -0,0 +1,69 @@
+"""
+Registry of the markets validated by a Lambda, built from the "paths" section of its lambda_config.json.
+
+Every market of the section (apart from "common") has:
+- source_bucket : the bucket its portal reports land in, which routes an S3 event to the market
+- GPT_file_path : the directory of GPT's reports
+- output_s3_path : the directory the validation reports are saved in
+- portal_file_path (optional) : the directory of the portal reports, used by the backfill
+"""
+
+REQUIRED_MARKET_PATHS = ("source_bucket", "GPT_file_path", "output_s3_path")
+
+
+class MarketRegistry:
+    """
+    The markets of a config and the bucket -> market lookup table of the S3 events.
+
+    Parameters
+    ----------
+    paths : dict
+        The "paths" section of lambda_config.json, one entry per market plus "common".
+
+    Raises
+    ------
+    ValueError
+        If a market misses one of REQUIRED_MARKET_PATHS, or if two markets have the same source bucket.
+    """
+
+    def __init__(self, paths):
+        self.markets = {}
+        self.buckets = {}
+        for market, market_paths in paths.items():
+            if market == "common":
+                continue
+            missing = [name for name in REQUIRED_MARKET_PATHS if not market_paths.get(name)]
+            if missing:
+                raise ValueError(f"Market '{market}' of the config has no {', '.join(missing)}")
+            if market_paths["source_bucket"] in self.buckets:
+                raise ValueError(
+                    f"Markets '{self.buckets[market_paths['source_bucket']]}' and '{market}' have the same source bucket "
+                    f"'{market_paths['source_bucket']}'"
+                )
+            self.markets[market] = market_paths
+            self.buckets[market_paths["source_bucket"]] = market
+
+    @classmethod
+    def from_config(cls, cfg):
+        """
+        Build the registry of a parsed lambda_config.json.
+        """
+        return cls(cfg["paths"])
+
+    def market_for_bucket(self, bucket_name):
+        """
+        Get the market of a portal report from the name of its bucket, None if it is not known.
+        """
+        return self.buckets.get(bucket_name)
+
+    def __getitem__(self, market):
+        return self.markets[market]
+
+    def __contains__(self, market):
+        return market in self.markets
+
+    def __iter__(self):
+        return iter(self.markets)
+
+    def __len__(self):
+        return len(self.markets)
@@ -0,0 +1,193 @@
+"""
+Timing, size and memory metrics of the stages of a validation, emitted as one CloudWatch
+Embedded Metric Format (EMF) JSON line, and the optional cProfile dump of a validation.
+
+Only the standard library is imported here.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_NAMESPACE = "PMIXSummaryComparison"
+# the CloudWatch unit of every value a stage can record
+METRIC_UNITS = {
+    "duration_ms": "Milliseconds",
+    "bytes_read": "Bytes",
+    "bytes_written": "Bytes",
+    "bytes_sent": "Bytes",
+    "rows": "Count",
+    "attachments": "Count",
+    "peak_rss_mb": "Megabytes",
+}
+
+
+def peak_rss_mb():
+    """
+    Get the peak resident set size of the process in MB, None where the resource module is not available.
+
+    Notes
+    -----
+    - The peak is the high-water mark of the process, so in a warm Lambda container it also
+        covers the earlier invocations.
+    - On Linux it is read from VmHWM in /proc/self/status: the ru_maxrss of getrusage is kept
+        across exec, so a process started by a larger one (e.g. a benchmark run by pytest) would
+        report the peak of its parent.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class StageMetrics:
+    """
+    Collects the metrics of the stages of one validation. Stages can be recorded from several threads.
+
+    Parameters
+    ----------
+    namespace : str, optional
+        The CloudWatch namespace of the metrics, default is METRICS_NAMESPACE.
+    **dimensions
+        The CloudWatch dimensions of the metrics, e.g. Market="us".
+    """
+
+    def __init__(self, namespace=METRICS_NAMESPACE, **dimensions):
+        self.namespace = namespace
+        self.dimensions = {name: str(value) for name, value in dimensions.items()}
+        self.stages = {}
+        self.properties = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Record the wall time and the peak RSS of a stage. The yielded dict takes the other
+        values of the stage (see METRIC_UNITS), e.g. stage["rows"] = len(frame).
+
+        A stage recorded more than once, e.g. the email of a retried send, adds up its values.
+        """
+        values = {}
+        start = time.perf_counter()
+        try:
+            yield values
+        finally:
+            values["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            values["peak_rss_mb"] = peak_rss_mb()
+            self.add(name, **values)
+
+    def add(self, name, **values):
+        """
+        Add values to the metrics of a stage.
+        """
+        with self._lock:
+            stage = self.stages.setdefault(name, {})
+            for key, value in values.items():
+                if value is None:
+                    continue
+                if key == "peak_rss_mb":
+                    stage[key] = max(stage.get(key, 0), value)
+                else:
+                    stage[key] = stage.get(key, 0) + value
+
+    def set_property(self, **properties):
+        """
+        Set values logged with the metrics but not sent to CloudWatch as metrics, e.g. the report date.
+        """
+        with self._lock:
+            self.properties.update(properties)
+
+    def emf(self):
+        """
+        Build the CloudWatch Embedded Metric Format document of the metrics.
+
+        Returns
+        -------
+        dict:
+            The "_aws" metadata, the dimensions, the properties and one "<stage>.<value>" member per metric.
+        """
+        with self._lock:
+            document = {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [{
+                        "Namespace": self.namespace,
+                        "Dimensions": [list(self.dimensions)],
+                        "Metrics": [
+                            {"Name": f"{stage}.{key}", "Unit": METRIC_UNITS.get(key, "None")}
+                            for stage, values in self.stages.items() for key in values
+                        ],
+                    }],
+                },
+                **self.dimensions,
+                **self.properties,
+            }
+            for stage, values in self.stages.items():
+                for key, value in values.items():
+                    document[f"{stage}.{key}"] = value
+        return document
+
+    def emit(self):
+        """
+        Print the metrics as one JSON line, which CloudWatch Logs turns into metrics.
+        """
+        print(json.dumps(self.emf(), default=str))
+
+
+@contextmanager
+def profiled(enabled, output_path, top=25):
+    """
+    Profile the code of the with block with cProfile, if enabled.
+
+    Parameters
+    ----------
+    enabled : bool
+        If False, the block runs without the profiler.
+    output_path : str
+        The local or s3:// path the stats are dumped to (readable with pstats or snakeviz).
+    top : int, optional
+        The number of functions with the highest cumulative time printed to the log, default is 25.
+
+    Notes
+    -----
+    cProfile only sees the thread it is enabled in, so the time spent in the reader and
+    secret lookup threads shows up as waiting on their futures.
+    """
+    if not enabled:
+        yield
+        return
+    import cProfile
+    import io
+    import pstats
+
+    from .runtime import open_file
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        log = io.StringIO()
+        pstats.Stats(profiler, stream=log).sort_stats("cumulative").print_stats(top)
+        print(log.getvalue())
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                local_path = os.path.join(directory, "profile.prof")
+                profiler.dump_stats(local_path)
+                with open(local_path, "rb") as source, open_file(output_path, "wb") as destination:
+                    shutil.copyfileobj(source, destination)
+            print(f"profile saved at: {output_path}")
+        except Exception as e:
+            print(f"Error: profile not saved: {e}")
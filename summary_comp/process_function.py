@@ -0,0 +1,2027 @@
+import asyncio
+import functools
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+
+from .gpt_index import GPT_POLL_SECONDS, REPORT_DATE_FORMATS, GPT_file_index, parse_report_date  # noqa: F401
+from .history import HistoryStore, chronic_failures_message
+from .mail import MAX_ATTACHMENT_BYTES, Attachment, NotificationQueue, SMTPSession, notify, send_email, send_email_from_secret  # noqa: F401
+from .metrics import StageMetrics, profiled
+from .runtime import RuntimeContext, file_size, get_runtime_context, get_storage, key_vault, open_file  # noqa: F401
+from .storage import storage_scheme
+
+# boto3, s3fs, openpyxl, xlsxwriter, pyarrow and smtplib are imported by the functions that use them, so that
+# importing this module (and the Lambda cold start) only pays for numpy and pandas
+
+GPT_STORE_KEY = "mcd_gbal_lcat_id_nu"
+PORTAL_STORE_KEY = "global_store_id"
+MISSING_STORE_ID = np.iinfo("int64").min
+# the compression of a csv file by its extension, read_csv_file opens the file itself so pandas cannot infer it
+CSV_COMPRESSIONS = {"gz": "gzip", "bz2": "bz2", "zip": "zip", "xz": "xz", "zst": "zstd"}
+PORTAL_READERS = ("pandas", "openpyxl_stream", "calamine")
+OUTPUT_FORMATS = ("xlsx", "parquet")
+EXCEL_ENGINES = ("openpyxl", "xlsxwriter")
+# bump when a change of the pipeline makes the cached results of earlier runs stale
+RESULT_CACHE_VERSION = 4
+# the columns of the overall summary sheet, one row per overall check
+OVERALL_SUMMARY_COLUMNS = ["Check", "GPT", "Portal", "Difference", "Status (abs(0.05%)"]
+# the changes of a store since the previous report date, in the order of the delta sheet
+STORE_CHANGES = ["Newly failing", "Newly passing", "Appeared", "Disappeared", "Deviation changed"]
+# the categories of the status and "Store Match" columns of the store level summary, see _store_summary_frame
+STATUS_CATEGORIES = ["PASS", "FAIL", ""]
+STORE_MATCH_CATEGORIES = ["Both", "GPT only", "Portal only"]
+# the largest magnitude, in units, of a value of a fixed point check (every integer up to it is a float64 exactly)
+FIXED_POINT_MAX_UNITS = 2 ** 53
+
+# the checks run by default when lambda_config.json has no "checks" section
+DEFAULT_CHECKS = [
+    {"name": "unique_stores", "gpt_column": "unique_stores", "portal_column": "#distinct_stores", "level": "overall"},
+    {"name": "unique_days", "gpt_column": "unique_days", "portal_column": "#unique_days_loaded", "level": "overall"},
+    {"name": "total_net_sales", "gpt_column": "total_net_sales", "portal_column": "Overall_Net_Sales", "level": "overall", "decimals": 2},
+    {"name": "total_rows", "gpt_column": "total_rows", "portal_column": "#total_rows", "level": "overall"},
+    {"name": "unique_items", "gpt_column": "unique_items", "portal_column": "#unique_items", "level": "overall"},
+    {"name": "total_alacarte_units", "gpt_column": "total_alacarte_units", "portal_column": "#total_alacarte_units", "level": "overall"},
+    {"name": "days_removed", "gpt_column": "days_removed", "portal_column": "days_truncated", "level": "overall"},
+    {"name": "Number of Unique Days", "gpt_column": "unique_days", "portal_column": "number_of_days_got_data", "level": "store"},
+    {"name": "Total Net Sales", "gpt_column": "total_net_sales", "portal_column": "sum_net_Sales", "level": "store", "decimals": 2},
+    {"name": "Total Alacarte Units", "gpt_column": "total_units", "portal_column": "sum_alacarte_units", "level": "store"},
+]
+
+
+def previous_report_date(report_date, days=1):
+    """
+    Get the report date a number of days before another one, written in the same format.
+
+    Parameters
+    ----------
+    report_date : str
+        The date part of a report file name, in one of REPORT_DATE_FORMATS.
+    days : int, optional
+        The number of days to go back, default is 1.
+
+    Returns
+    -------
+    str or None:
+        The earlier report date, None if report_date cannot be parsed.
+    """
+    if parse_report_date(report_date) is None:
+        return None
+    for date_format in REPORT_DATE_FORMATS:
+        try:
+            parsed_date = datetime.strptime(report_date, date_format)
+        except ValueError:
+            continue
+        return (parsed_date - timedelta(days=days)).strftime(date_format)
+
+# read the portal report
+def portal_columns(checks=None):
+    """
+    Get the portal columns used by the comparison.
+
+    Parameters
+    ----------
+    checks : list, optional
+        The check registry, default is load_checks().
+
+    Returns
+    -------
+    dict:
+        The column names needed from the "portal_overall_summary" and "portal_summary_per_store" sheets.
+    """
+    checks = load_checks(checks)
+    columns = {"portal_overall_summary": [], "portal_summary_per_store": [PORTAL_STORE_KEY]}
+    for check in checks:
+        if check["level"] == "item":
+            continue
+        sheet = "portal_overall_summary" if check["level"] == "overall" else "portal_summary_per_store"
+        if check["portal_column"] != "NA" and check["portal_column"] not in columns[sheet]:
+            columns[sheet].append(check["portal_column"])
+    return columns
+
+def read_portal_report(portal_report_path, portal_excel_sheet_names, checks=None, portal_reader="pandas"):
+    """
+    Read the overall summary and the summary per store sheets of the portal report.
+
+    Parameters
+    ----------
+    portal_report_path : str
+        The path to the portal report file.
+    portal_excel_sheet_names : dict
+        The dictionary containing the names of the excel sheets.
+    checks : list, optional
+        The check registry, default is load_checks(). Only used by the streaming readers.
+    portal_reader : str, optional
+        The reader to use, default is "pandas".
+        - "pandas" : pd.read_excel with openpyxl, parses every column of both sheets.
+        - "openpyxl_stream" : openpyxl read_only/values_only iteration over the needed columns only.
+        - "calamine" : pd.read_excel with the calamine engine (python-calamine) over the needed columns only.
+
+    Returns
+    -------
+    tuple:
+        - portal_overall_summary : DataFrame
+            The Dataframe containing the overall summary.
+        - portal_summary_per_store : DataFrame
+            The Dataframe containing the summary per store.
+
+    Notes
+    -----
+    With the streaming readers, the needed columns are parsed as float64 and columns missing from
+    the sheet are left out, so they are reported the same way as with the "pandas" reader.
+    """
+    if portal_reader not in PORTAL_READERS:
+        raise ValueError(f"Unknown portal reader '{portal_reader}', expected one of {PORTAL_READERS}")
+    if portal_reader == "pandas":
+        with open_file(portal_report_path, "rb") as f, pd.ExcelFile(f) as xls:
+            portal_overall_summary = pd.read_excel(xls, portal_excel_sheet_names['portal_overall_summary'])
+            portal_summary_per_store = pd.read_excel(xls, portal_excel_sheet_names['portal_summary_per_store'])
+        return portal_overall_summary, portal_summary_per_store
+
+    import openpyxl
+
+    needed_columns = portal_columns(checks)
+    sheets = {}
+    with open_file(portal_report_path, "rb") as f:
+        if portal_reader == "calamine":
+            for key, columns in needed_columns.items():
+                sheets[key] = pd.read_excel(f, portal_excel_sheet_names[key], engine="calamine", usecols=lambda column: column in columns)
+        else:
+            workbook = openpyxl.load_workbook(f, read_only=True, data_only=True)
+            try:
+                for key, columns in needed_columns.items():
+                    worksheet = workbook[portal_excel_sheet_names[key]]
+                    header = next(worksheet.iter_rows(max_row=1, values_only=True), ())
+                    positions = {column: header.index(column) for column in columns if column in header}
+                    values = {column: [] for column in positions}
+                    last_column = max(positions.values(), default=0) + 1
+                    for row in worksheet.iter_rows(min_row=2, max_col=last_column, values_only=True):
+                        if not any(cell is not None for cell in row):
+                            continue
+                        for column, position in positions.items():
+                            values[column].append(row[position] if position < len(row) else None)
+                    sheets[key] = pd.DataFrame(values)
+            finally:
+                workbook.close()
+    for key, frame in sheets.items():
+        sheets[key] = frame.apply(pd.to_numeric, errors="coerce").astype("float64")
+    return sheets["portal_overall_summary"], sheets["portal_summary_per_store"]
+
+# read the files 
+def read_csv_file(path, **kwargs):
+    """
+    Read a local, s3:// or memory:// csv file with pd.read_csv, through its storage backend.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file. Its compression is inferred from the extension, e.g. ".gz".
+    **kwargs
+        The arguments of pd.read_csv. With a chunksize, an iterator over the chunks is returned,
+        and the file is closed once the iterator is exhausted.
+
+    Returns
+    -------
+    DataFrame or iterator of DataFrame
+
+    Raises
+    ------
+    FileNotFoundError
+        If the file does not exist, when the function is called even with a chunksize.
+    """
+    compression = CSV_COMPRESSIONS.get(path.rsplit(".", 1)[-1])
+    f = open_file(path, "rb")
+    try:
+        reader = pd.read_csv(f, compression=compression, **kwargs)
+    except BaseException:
+        f.close()
+        raise
+    if kwargs.get("chunksize") is None:
+        f.close()
+        return reader
+    return _csv_chunks(f, reader)
+
+def _csv_chunks(f, reader):
+    """
+    Yield the chunks of a pd.read_csv reader, closing its file at the end.
+    """
+    with f, reader:
+        yield from reader
+
+def report_paths(portal_report_path, GPT_report_path, path_prefixes, wait_seconds=0, poll_seconds=GPT_POLL_SECONDS):
+    """
+    Get the report date of a portal report and the paths of the matching GPT files.
+
+    The GPT files are found in the shared listing of GPT_report_path (see GPT_file_index), so their
+    date may be written in another format than the portal's, or followed by a suffix.
+
+    Parameters
+    ----------
+    portal_report_path : str
+        The path to the portal report file.
+    GPT_report_path : str
+        The path to the GPT report directory.
+    path_prefixes : dict
+        The dictionary containing the prefixes for the report paths.
+    wait_seconds : float, optional
+        If a GPT file is missing, the directory is listed again every poll_seconds until both
+        files are there, for at most wait_seconds. Default is 0, no wait.
+    poll_seconds : float, optional
+        The interval of the listings while waiting, default is GPT_POLL_SECONDS.
+
+    Returns
+    -------
+    tuple:
+        - report_date : str
+            Date extracted from the portal report filename.
+        - GPT_overall_summary_path : str
+        - GPT_summary_per_store_path : str
+            <prefix><report_date>.txt.gz if the file is not listed, so that its read reports it missing.
+    """
+    report_date = portal_report_path.split("/")[-1].split(".xlsx")[0].split(path_prefixes['portal_path_prefix'])[-1]
+    GPT_overall_summary_path = GPT_report_path + path_prefixes['GPT_overall_summary_path_prefix'] + report_date + ".txt.gz"
+    GPT_summary_per_store_path = GPT_report_path + path_prefixes['GPT_summary_per_store_path_prefix'] + report_date + ".txt.gz"
+    parsed_date = parse_report_date(report_date)
+    if parsed_date is None:
+        return report_date, GPT_overall_summary_path, GPT_summary_per_store_path
+    try:
+        index = GPT_file_index(GPT_report_path, path_prefixes)
+        listed_paths = index.wait(parsed_date, wait_seconds, poll_seconds) if wait_seconds > 0 else index.lookup(parsed_date)
+    except Exception as e:
+        # e.g. a role without s3:ListBucket, the files are then read by their default names
+        print(f"Error: GPT report directory {GPT_report_path} not listed: {e}")
+        listed_paths = (None, None)
+    return report_date, listed_paths[0] or GPT_overall_summary_path, listed_paths[1] or GPT_summary_per_store_path
+
+def _timed_read(metrics, stage_name, path, reader, *args, **kwargs):
+    """
+    Run a reader of read_files as a stage of the metrics, with the size of the file and the rows read.
+    """
+    with metrics.stage(stage_name) as stage:
+        result = reader(*args, **kwargs)
+        stage["bytes_read"] = file_size(path)
+        frames = result if isinstance(result, tuple) else (result,)
+        stage["rows"] = sum(len(frame) for frame in frames if isinstance(frame, pd.DataFrame))
+    return result
+
+def read_files(portal_report_path, GPT_report_path, portal_excel_sheet_names, path_prefixes, checks=None, portal_reader="pandas", store_chunksize=None, metrics=None):
+    """
+    Read files from the specified paths and return the dataframes and report date.
+
+    Parameters
+    ----------
+    portal_report_path : str 
+        The path to the portal report file.
+    GPT_report_path : str
+        The path to the GPT report directory.
+    portal_excel_sheet_names : dict
+        The dictionary containing the names of the excel sheets.
+    path_prefixes : dict
+        The dictionary containing the prefixes for the  report paths.
+    checks : list, optional
+        The check registry, default is load_checks().
+    portal_reader : str, optional
+        The reader used for the portal report, see read_portal_report. Default is "pandas".
+    store_chunksize : int, optional
+        If given, the TotXStore file of GPT's report is not loaded but returned as an iterator
+        over chunks of this many rows, to be compared with iter_store_level_summary. Default is None.
+    metrics : StageMetrics, optional
+        The metrics the read of each file is recorded in, as the read_portal_report,
+        read_GPT_overall_summary and read_GPT_summary_per_store stages. Default is None.
+
+    Returns
+    -------
+    tuple: 
+        - portal_overall_summary : DataFrame 
+            The Dataframe containing the overall summary.
+        - portal_summary_per_store : DataFrame
+            The Dataframe containing the summary per store.
+        - GPT_overall_summary : Dataframe 
+            The DataFrame containing the PMIX summary from GPT report.
+        - GPT_summary_per_store : Dataframe 
+            The DataFrame containing the TotXStores summary from GPT report, or an iterator
+            over its chunks if store_chunksize is given.
+        - report_date : str
+            Date extracted from the portal report filename.
+
+    """
+    metrics = metrics if metrics is not None else StageMetrics()
+    Status = "True"
+    message_dict = {}
+    report_date, GPT_overall_summary_path, GPT_summary_per_store_path = report_paths(portal_report_path, GPT_report_path, path_prefixes)
+
+    # the three inputs are independent, so they are downloaded and parsed concurrently
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        portal_future = executor.submit(
+            _timed_read, metrics, "read_portal_report", portal_report_path,
+            read_portal_report, portal_report_path, portal_excel_sheet_names, checks, portal_reader,
+        )
+        GPT_overall_summary_future = executor.submit(
+            _timed_read, metrics, "read_GPT_overall_summary", GPT_overall_summary_path,
+            read_csv_file, GPT_overall_summary_path, sep="\t",
+        )
+        # only the columns of the store checks are parsed, the other columns of the file are skipped
+        GPT_store_columns = {GPT_STORE_KEY} | {check["gpt_column"] for check in load_checks(checks) if check["level"] == "store"}
+        if store_chunksize is None:
+            GPT_summary_per_store_future = executor.submit(
+                _timed_read, metrics, "read_GPT_summary_per_store", GPT_summary_per_store_path,
+                read_csv_file, GPT_summary_per_store_path, sep="\t",
+                usecols=lambda column: column.lower() in GPT_store_columns,
+            )
+        else:
+            GPT_summary_per_store_future = executor.submit(
+                _timed_read, metrics, "read_GPT_summary_per_store", GPT_summary_per_store_path,
+                read_csv_file, GPT_summary_per_store_path, sep="\t", chunksize=store_chunksize,
+                usecols=lambda column: column.lower() in GPT_store_columns,
+            )
+
+        portal_overall_summary, portal_summary_per_store = portal_future.result()
+        print(f"portal Path: {portal_report_path}")
+        print(f"Path: {GPT_overall_summary_path}")
+        print(f"Path: {GPT_summary_per_store_path}")
+
+        GPT_overall_summary = pd.DataFrame()
+        GPT_summary_per_store = pd.DataFrame()
+        try:
+            GPT_overall_summary = GPT_overall_summary_future.result()
+            GPT_overall_summary = GPT_overall_summary.rename(columns={"total_units" : "total_alacarte_units"})
+        except FileNotFoundError:
+            Status = "False"
+            print(f"Error: File '{GPT_overall_summary_path}' not found.")
+            message_dict["error"] = f"File not found in the path : {GPT_overall_summary_path}"
+        try:
+            GPT_summary_per_store = GPT_summary_per_store_future.result()
+            if store_chunksize is None:
+                GPT_summary_per_store = GPT_summary_per_store.rename(columns=lambda x: x.lower())
+        except FileNotFoundError:
+            Status = "False"
+            print(f"Error: File '{GPT_summary_per_store_path}' not found.")
+            message_dict["error"] = f"File not found in the path : {GPT_summary_per_store_path}"
+    return (portal_overall_summary, portal_summary_per_store, GPT_overall_summary, GPT_summary_per_store, report_date, message_dict, Status)
+
+# check registry
+def load_checks(checks=None):
+    """
+    Build the check registry used for the overall and store level comparisons.
+
+    Parameters
+    ----------
+    checks : list, optional
+        The list of check definitions, usually the "checks" section of lambda_config.json.
+        Each check is a dictionary with the keys:
+        - name : The name of the check, used as the row label or the column name in the report.
+        - gpt_column : The name of the column in the GPT's report.
+        - portal_column : The name of the column in the portal's report, "NA" if the portal has no such column.
+        - level : "overall", "store" or "item" (the item by store extracts, see summary_comp.items).
+        - tolerance : The allowed deviation, default is 0.0005.
+        - mode : "relative" (tolerance is a fraction of the GPT value) or "absolute", default is "relative".
+        - decimals : The decimals of a monetary check, e.g. 2 for cents. The values are then compared in
+            fixed point, as int64 counts of 10**-decimals units, see check_deviations and check_status_codes.
+            Default is None, the values are compared in float64.
+        If None, DEFAULT_CHECKS is used.
+
+    Returns
+    -------
+    registry : list
+        The list of checks with all the keys filled in.
+
+    Raises
+    ------
+    ValueError
+        If a check is missing a required key or has an unknown level or mode, or if its decimals are not
+        a non-negative integer.
+    """
+    registry = []
+    for check in (DEFAULT_CHECKS if checks is None else checks):
+        missing_keys = {"name", "gpt_column", "portal_column", "level"} - set(check)
+        if missing_keys:
+            raise ValueError(f"Check {check} is missing the keys {sorted(missing_keys)}")
+        check = {"tolerance": 0.0005, "mode": "relative", "decimals": None, **check}
+        if check["level"] not in ("overall", "store", "item"):
+            raise ValueError(f"Unknown level '{check['level']}' for check '{check['name']}'")
+        if check["mode"] not in ("relative", "absolute"):
+            raise ValueError(f"Unknown mode '{check['mode']}' for check '{check['name']}'")
+        if check["decimals"] is not None and (isinstance(check["decimals"], bool) or not isinstance(check["decimals"], int) or check["decimals"] < 0):
+            raise ValueError(f"The decimals of check '{check['name']}' must be a non-negative integer, got {check['decimals']!r}")
+        registry.append(check)
+    return registry
+
+def store_check_columns(check):
+    """
+    Get the names of the report columns of a store level check.
+
+    Parameters
+    ----------
+    check : dict
+        A store level check from the registry.
+
+    Returns
+    -------
+    dict:
+        The names of the "GPT", "portal", "deviation" and "status" columns of the check.
+    """
+    if check["mode"] == "relative":
+        tolerance_label = f"abs({check['tolerance'] * 100:g}%)"
+    else:
+        tolerance_label = f"abs({check['tolerance']:g})"
+    return {
+        "GPT": f"{check['name']} (GPT)",
+        "portal": f"{check['name']} (Portal)",
+        "deviation": f"Deviation in {check['name']}",
+        "status": f"{check['name']} Status ({tolerance_label})",
+    }
+
+def check_thresholds(checks, GPT_values):
+    """
+    Get the allowed absolute deviation of every check, broadcast against the GPT values.
+
+    Parameters
+    ----------
+    checks : list
+        The checks, from load_checks.
+    GPT_values : ndarray
+        The GPT values, column i being check i.
+
+    Returns
+    -------
+    ndarray:
+        The tolerance times the GPT value for the relative checks, the tolerance for the absolute ones.
+    """
+    tolerance = np.array([check["tolerance"] for check in checks], dtype="float64")
+    relative = np.array([check["mode"] == "relative" for check in checks])
+    return np.where(relative, tolerance * GPT_values, tolerance)
+
+# fixed point arithmetic of the monetary checks
+def to_fixed_point(values, decimals):
+    """
+    Convert float values to int64 counts of 10**-decimals units, e.g. cents for 2 decimals.
+
+    Parameters
+    ----------
+    values : ndarray
+        The float values, NaN where missing.
+    decimals : int
+        The decimals kept, the values are rounded to the nearest unit.
+
+    Returns
+    -------
+    units : ndarray
+        The int64 units, 0 where the value is missing.
+
+    Raises
+    ------
+    ValueError
+        If a value is more than FIXED_POINT_MAX_UNITS units.
+    """
+    scaled = np.rint(values * 10 ** decimals)
+    np.nan_to_num(scaled, copy=False, nan=0.0, posinf=np.inf, neginf=-np.inf)
+    if len(scaled) and max(scaled.max(), -scaled.min()) > FIXED_POINT_MAX_UNITS:
+        raise ValueError(f"Values of more than {FIXED_POINT_MAX_UNITS} units of 10**-{decimals} cannot be compared in fixed point")
+    return scaled.astype("int64")
+
+def check_deviations(checks, GPT_values, portal_values):
+    """
+    Get the GPT minus portal values of the checks, column i of the values being check i, NaN where a
+    side is missing.
+
+    The deviation of a check with decimals is the difference of the values rounded to its units,
+    computed in int64, so it is the float64 nearest to the exact decimal difference, e.g. 0.01
+    instead of 0.00999999999999801 for 1234.57 - 1234.56.
+
+    Parameters
+    ----------
+    checks : list
+        The checks, from load_checks.
+    GPT_values, portal_values : ndarray
+        The float64 values of both reports, one row per store (or item) and one column per check.
+
+    Returns
+    -------
+    ndarray:
+        The float64 deviations.
+    """
+    deviation = GPT_values - portal_values
+    for i, check in enumerate(checks):
+        if check["decimals"] is not None:
+            units = to_fixed_point(GPT_values[:, i], check["decimals"]) - to_fixed_point(portal_values[:, i], check["decimals"])
+            deviation[:, i] = np.where(np.isnan(deviation[:, i]), np.nan, units / 10 ** check["decimals"])
+    return deviation
+
+def _exceeds_tolerance(check, GPT_units, deviation_units):
+    """
+    Tell, in int64, whether the deviations of a fixed point check are over its tolerance.
+
+    The tolerance is taken as the decimal written in the registry (0.0005 is 1/2000), so that
+    abs(deviation) > tolerance * GPT is abs(deviation) * 2000 > GPT, with no rounding.
+    """
+    tolerance = Fraction(str(check["tolerance"]))
+    bound = GPT_units if check["mode"] == "relative" else np.int64(10 ** check["decimals"])
+    largest = max(int(np.abs(deviation_units).max(initial=0)), int(np.abs(bound).max(initial=0)))
+    if largest * max(tolerance.numerator, tolerance.denominator) > np.iinfo("int64").max:
+        raise ValueError(f"The values of check '{check['name']}' are too large to be compared in fixed point with a tolerance of {check['tolerance']}")
+    return np.abs(deviation_units) * tolerance.denominator > tolerance.numerator * bound
+
+def evaluate_overall_checks(GPT_df, portal_df, checks=None):
+    """
+    Run all the overall level checks of the registry in one pass.
+
+    Parameters
+    ----------
+    GPT_df : DataFrame
+        The DataFrame containing the summary for GPT's report.
+    portal_df : DataFrame
+        The DataFrame containing the summary for portal's report.
+    checks : list, optional
+        The check registry, default is load_checks().
+
+    Returns
+    -------
+    overall_summary : DataFrame
+        One row per overall check with the columns of OVERALL_SUMMARY_COLUMNS. The values are
+        truncated to integers as in compare_columns, except those of the checks with decimals,
+        which are rounded to them and compared in fixed point. A value, difference or status is
+        missing when the column is not available in one of the reports.
+    """
+    checks = [check for check in load_checks(checks) if check["level"] == "overall"]
+
+    def first_values(df, column_names):
+        values = np.full(len(column_names), np.nan)
+        for i, column_name in enumerate(column_names):
+            if column_name != "NA" and column_name in df.columns and len(df):
+                values[i] = df[column_name].iloc[0]
+        return np.array([np.trunc(value) if check["decimals"] is None else np.round(value, check["decimals"]) for check, value in zip(checks, values)])
+
+    GPT_values = first_values(GPT_df, [check["gpt_column"] for check in checks])
+    portal_values = first_values(portal_df, [check["portal_column"] for check in checks])
+    diff = check_deviations(checks, GPT_values[np.newaxis], portal_values[np.newaxis])[0]
+    status = np.array(STATUS_CATEGORIES, dtype=object)[check_status_codes(checks, GPT_values[np.newaxis], diff[np.newaxis])[0]]
+    status[np.isnan(diff)] = None
+
+    overall_summary = pd.DataFrame({
+        OVERALL_SUMMARY_COLUMNS[0]: [check["name"] for check in checks],
+        OVERALL_SUMMARY_COLUMNS[1]: GPT_values,
+        OVERALL_SUMMARY_COLUMNS[2]: portal_values,
+        OVERALL_SUMMARY_COLUMNS[3]: diff,
+        OVERALL_SUMMARY_COLUMNS[4]: status,
+    })
+    for column_name in OVERALL_SUMMARY_COLUMNS[1:4]:
+        values = overall_summary[column_name]
+        if values.notna().all() and (values == np.trunc(values)).all():
+            overall_summary[column_name] = values.astype("int64")
+    return overall_summary
+
+# creating the overall summary
+def compare_columns(GPT_column_name, portal_column_name, GPT_df, portal_df, decimals=None):
+    """
+    Compare the values of two columns between two DataFrames.
+
+    Parameters
+    ----------
+    GPT_column_name : str
+        The name of the column in the GPT's report for overall summary.
+    portal_column_name : str
+        The name of the column in the portal report for overall summary.
+    GPT_df : DataFrame 
+        The DataFrame containing the summary for GPT's report.
+    portal_df : DataFrame 
+        The DataFrame containing the summary for portal's report.
+    decimals : int, optional
+        The decimals of a monetary column. The values are then rounded to them instead of truncated
+        to integers, and compared in fixed point (see check_status_codes). Default is None.
+
+    Returns
+    -------
+    tuple: A tuple containing the following elements:
+        - GPT_column_name : str
+            The name of the column from GPT's report.
+        - GPT_value : int 
+            The value of the column from GPT's report.
+        - portal_value : int 
+            The value of the column from portal's report. If the column is not available, then the value is None.
+        - status : bool
+            True if the values in portal's column and GPT's columns are equal, False otherwise.
+        - diff : int
+            The difference between GPT's value and portal's value. If the column is not available, then the value is None.
+    """
+    def first_value(df, column_name):
+        value = df[column_name].iloc[0]
+        return int(value) if decimals is None else round(float(value), decimals)
+
+    if GPT_column_name not in GPT_df.columns:
+        portal_value = first_value(portal_df, portal_column_name)
+        return (GPT_column_name, None, portal_value, None, None)
+    GPT_value = first_value(GPT_df, GPT_column_name)
+    if portal_column_name == "NA" :
+        return (GPT_column_name, GPT_value, None, None, None)
+    portal_value = first_value(portal_df, portal_column_name)
+    if decimals is None:
+        diff = GPT_value - portal_value
+        status = np.where(abs(diff) > 0.0005 * GPT_value, "FAIL", "PASS")
+        return (GPT_column_name, GPT_value, portal_value, diff, status)
+    check = {"name": GPT_column_name, "tolerance": 0.0005, "mode": "relative", "decimals": decimals}
+    GPT_values, portal_values = np.array([[GPT_value]]), np.array([[portal_value]])
+    diff = check_deviations([check], GPT_values, portal_values)
+    status = np.array(STATUS_CATEGORIES)[check_status_codes([check], GPT_values, diff)[0, 0]]
+    return (GPT_column_name, GPT_value, portal_value, float(diff[0, 0]), status)
+
+def update_status(summary_store, checks=None):
+    """
+    Update the status columns based on deviation values and their respective GPT values.
+
+    Parameters
+    ----------
+    summary_store : DataFrame
+        The DataFrame containing the GPT values and the deviation values of every store.
+    checks : list, optional
+        The check registry, default is load_checks().
+
+    Returns
+    -------
+    DataFrame:
+        A DataFrame containing the status values based on deviation conditions, as categoricals
+        of STATUS_CATEGORIES.
+
+    Notes
+    -----
+    - If the deviation value is null, the corresponding status will be set as an empty string.
+    - If the deviation value is not null, the status will be "FAIL" if the absolute deviation
+        is greater than the tolerance of the check (0.05% of the corresponding value by default);
+        otherwise, the status will be "PASS".
+    - The checks with decimals are compared in fixed point, see check_status_codes.
+    - The statuses of all the stores and checks are computed at once with NumPy masks instead of row by row.
+    """
+    checks = [check for check in load_checks(checks) if check["level"] == "store"]
+    columns = [store_check_columns(check) for check in checks]
+    deviation = summary_store[[column["deviation"] for column in columns]].to_numpy(dtype="float64", na_value=np.nan)
+    GPT_values = summary_store[[column["GPT"] for column in columns]].to_numpy(dtype="float64", na_value=np.nan)
+    status_codes = check_status_codes(checks, GPT_values, deviation)
+    return pd.DataFrame(
+        {column["status"]: pd.Categorical.from_codes(status_codes[:, i], STATUS_CATEGORIES) for i, column in enumerate(columns)},
+        index=summary_store.index,
+    )
+
+def check_status_codes(checks, GPT_values, deviation):
+    """
+    Get the int8 codes in STATUS_CATEGORIES of the statuses of the checks, see update_status.
+
+    The checks with decimals compare their GPT values and deviations rounded to their units with
+    _exceeds_tolerance, the others compare them in float64.
+
+    Parameters
+    ----------
+    checks : list
+        The checks, from load_checks.
+    GPT_values : ndarray
+        The float64 GPT values, column i being check i.
+    deviation : ndarray
+        The deviations of the checks, see check_deviations.
+
+    Returns
+    -------
+    ndarray:
+        The int8 codes, 0 for "PASS", 1 for "FAIL" and 2 for "" (a missing deviation).
+    """
+    status_codes = np.select(
+        [np.isnan(deviation), np.abs(deviation) > check_thresholds(checks, GPT_values)],
+        [np.int8(2), np.int8(1)],
+        default=np.int8(0),
+    ).astype("int8")
+    for i, check in enumerate(checks):
+        if check["decimals"] is not None:
+            failed = _exceeds_tolerance(check, to_fixed_point(GPT_values[:, i], check["decimals"]), to_fixed_point(deviation[:, i], check["decimals"]))
+            status_codes[:, i] = np.where(np.isnan(deviation[:, i]), np.int8(2), failed.astype("int8"))
+    return status_codes
+
+def compact_values(values):
+    """
+    Downcast a float64 column to float32 if every value of it is a float32 exactly, e.g. the day
+    counts and the units. Amounts with cents are not, so they stay float64.
+    """
+    compact = values.astype("float32")
+    if np.array_equal(compact, values, equal_nan=True):
+        return compact
+    return values
+
+def compact_store_ids(store_ids):
+    """
+    Convert the int64 store ids of normalize_store_ids to a nullable Int32 array (Int64 if they do
+    not fit), with MISSING_STORE_ID as missing.
+    """
+    missing = store_ids == MISSING_STORE_ID
+    valid_ids = store_ids[~missing]
+    if not len(valid_ids) or (valid_ids.min() >= np.iinfo("int32").min and valid_ids.max() <= np.iinfo("int32").max):
+        return pd.arrays.IntegerArray(np.where(missing, 0, store_ids).astype("int32"), missing)
+    return pd.arrays.IntegerArray(store_ids, missing)
+
+# matching the stores of both reports
+def normalize_store_ids(store_ids):
+    """
+    Convert store ids read as int, float (with NaN) or str to one int64 array.
+
+    Parameters
+    ----------
+    store_ids : array-like
+        The store ids of one of the reports.
+
+    Returns
+    -------
+    ndarray:
+        The store ids as int64. Ids that are missing or are not whole numbers are set to MISSING_STORE_ID.
+    """
+    store_ids = pd.Series(store_ids, copy=False)
+    if pd.api.types.is_integer_dtype(store_ids.dtype) and not store_ids.hasnans:
+        return store_ids.to_numpy(dtype="int64")
+    if not pd.api.types.is_numeric_dtype(store_ids.dtype):
+        store_ids = pd.to_numeric(store_ids.astype("string").str.strip(), errors="coerce")
+    values = store_ids.to_numpy(dtype="float64", na_value=np.nan)
+    valid = np.isfinite(values) & (values == np.round(values))
+    normalized_ids = np.where(valid, values, 0).astype("int64")
+    normalized_ids[~valid] = MISSING_STORE_ID
+    return normalized_ids
+
+def build_store_index(store_ids):
+    """
+    Build a lookup index over normalized store ids.
+
+    Parameters
+    ----------
+    store_ids : ndarray
+        The int64 store ids returned by normalize_store_ids.
+
+    Returns
+    -------
+    dict:
+        The index to pass to probe_store_index. When the ids span a compact range (the usual case
+        for store ids) it is a direct-address table from id to row, otherwise a hash index.
+        A repeated id is indexed to its first row.
+    """
+    rows = np.flatnonzero(store_ids != MISSING_STORE_ID)
+    valid_ids = store_ids[rows]
+    if not len(valid_ids):
+        return {"offset": 0, "table": np.full(0, -1)}
+    offset = valid_ids.min()
+    span = int(valid_ids.max()) - int(offset) + 1
+    if span <= 8 * len(valid_ids) + 65536:
+        positions = valid_ids - offset
+        table = np.full(span, -1)
+        table[positions] = rows
+        # with repeated ids any of their rows may have been written, keep the first one
+        overwritten = table[positions] != rows
+        np.minimum.at(table, positions[overwritten], rows[overwritten])
+        return {"offset": offset, "table": table}
+    first = ~pd.Index(valid_ids).duplicated()
+    return {"hash": pd.Index(valid_ids[first]), "rows": rows[first]}
+
+def probe_store_index(store_index, store_ids):
+    """
+    Look up normalized store ids in an index from build_store_index.
+
+    Returns
+    -------
+    ndarray:
+        The row of every store id in the indexed report, -1 if the store is not there.
+    """
+    if "hash" in store_index:
+        positions = store_index["hash"].get_indexer(store_ids)
+        return np.where(positions >= 0, store_index["rows"][positions], -1)
+    table = store_index["table"]
+    positions = store_ids - store_index["offset"]
+    in_range = (store_ids != MISSING_STORE_ID) & (positions >= 0) & (positions < len(table))
+    rows = np.full(len(store_ids), -1)
+    rows[in_range] = table[positions[in_range]]
+    return rows
+
+def match_stores(GPT_store_ids, portal_store_ids):
+    """
+    Match the stores of GPT's and portal's reports (full outer join on the store id).
+
+    Parameters
+    ----------
+    GPT_store_ids : array-like
+        The mcd_gbal_lcat_id_nu column of GPT's TotXStore report.
+    portal_store_ids : array-like
+        The global_store_id column of portal's summary per store.
+
+    Returns
+    -------
+    dict:
+        - store_ids : ndarray
+            The int64 store id of every matched row, sorted, MISSING_STORE_ID (first) for invalid ids.
+        - GPT_rows : ndarray
+            The row in GPT's report of every matched row, -1 for stores only in portal's report.
+        - portal_rows : ndarray
+            The row in portal's report of every matched row, -1 for stores only in GPT's report.
+        - GPT_only : ndarray
+            The ids of the stores only in GPT's report.
+        - portal_only : ndarray
+            The ids of the stores only in portal's report.
+
+    Notes
+    -----
+    - Both id columns are normalized to int64 once, so int, float-with-NaN and string ids match.
+    - If a store id is repeated in portal's report, its first row is matched and the other rows
+        are reported as portal-only rows. Rows with a missing id never match.
+    """
+    GPT_ids = normalize_store_ids(GPT_store_ids)
+    portal_ids = normalize_store_ids(portal_store_ids)
+    matched_portal_rows = probe_store_index(build_store_index(portal_ids), GPT_ids)
+    portal_matched = np.zeros(len(portal_ids), dtype=bool)
+    portal_matched[matched_portal_rows[matched_portal_rows >= 0]] = True
+    portal_only_rows = np.flatnonzero(~portal_matched)
+
+    store_ids = np.concatenate([GPT_ids, portal_ids[portal_only_rows]])
+    GPT_rows = np.concatenate([np.arange(len(GPT_ids)), np.full(len(portal_only_rows), -1)])
+    portal_rows = np.concatenate([matched_portal_rows, portal_only_rows])
+    order = np.argsort(store_ids)
+    return {
+        "store_ids": store_ids[order],
+        "GPT_rows": GPT_rows[order],
+        "portal_rows": portal_rows[order],
+        "GPT_only": GPT_ids[matched_portal_rows < 0],
+        "portal_only": portal_ids[portal_only_rows],
+    }
+
+def _take_rows(values, rows):
+    """
+    Take the rows of a 2-D float array, with NaN rows where the row is -1.
+    """
+    taken = np.full((len(rows), values.shape[1]), np.nan)
+    taken[rows >= 0] = values[rows[rows >= 0]]
+    return taken
+
+def _store_summary_frame(store_ids, GPT_rows, portal_rows, GPT_values, portal_values, checks):
+    """
+    Build the store level summary from the matched GPT and portal values of the store checks.
+
+    The columns are compact: the store ids are Int32 when they fit, the values and deviations are
+    float32 when that is exact (see compact_values), and the statuses and "Store Match" are
+    categoricals. The deviations and statuses are computed in float64, or in fixed point for the
+    checks with decimals, before the values are downcast.
+    """
+    columns = [store_check_columns(check) for check in checks]
+    deviation = check_deviations(checks, GPT_values, portal_values)
+    status_codes = check_status_codes(checks, GPT_values, deviation)
+    match_codes = np.select([GPT_rows < 0, portal_rows < 0], [np.int8(2), np.int8(1)], default=np.int8(0)).astype("int8")
+    summary_store = {"Global_Store_Id": compact_store_ids(store_ids)}
+    for key, values in (("GPT", GPT_values), ("portal", portal_values), ("deviation", deviation)):
+        for i, column in enumerate(columns):
+            summary_store[column[key]] = compact_values(values[:, i])
+    for i, column in enumerate(columns):
+        summary_store[column["status"]] = pd.Categorical.from_codes(status_codes[:, i], STATUS_CATEGORIES)
+    summary_store["Store Match"] = pd.Categorical.from_codes(match_codes, STORE_MATCH_CATEGORIES)
+    return pd.DataFrame(summary_store)
+
+# creating the store level summary
+def store_level_summary(GPT_summary_per_store, portal_summary_per_store, checks=None):
+    """
+    Generate a summary of store-level data by matching the stores of two dataframes.
+
+    Parameters
+    ----------
+    GPT_summary_per_store : DataFrame
+        The DataFrame containing store data of GPT's reports. The chunks of a file read with
+        a chunksize are compared with iter_store_level_summary instead.
+    portal_summary_per_store : DataFrame
+        The DataFrame containing summary data per store of portal's report.
+    checks : list, optional
+        The check registry, default is load_checks().
+
+    Returns
+    -------
+    summary_store : DataFrame
+        Summary of store-level data including deviations and statuses, sorted by store id.
+        The "Store Match" column tells whether a store is in both reports, in GPT's only or in portal's only.
+        The columns have the compact types of _store_summary_frame.
+    """
+    checks = [check for check in load_checks(checks) if check["level"] == "store"]
+    match = match_stores(GPT_summary_per_store[GPT_STORE_KEY], portal_summary_per_store[PORTAL_STORE_KEY])
+    GPT_values = GPT_summary_per_store[[check["gpt_column"] for check in checks]].to_numpy(dtype="float64", na_value=np.nan)
+    portal_values = portal_summary_per_store[[check["portal_column"] for check in checks]].to_numpy(dtype="float64", na_value=np.nan)
+    return _store_summary_frame(
+        match["store_ids"], match["GPT_rows"], match["portal_rows"],
+        _take_rows(GPT_values, match["GPT_rows"]), _take_rows(portal_values, match["portal_rows"]), checks,
+    )
+
+def iter_store_level_summary(GPT_chunks, portal_summary_per_store, checks=None):
+    """
+    Generate the store level summary chunk by chunk, without loading the whole GPT file.
+
+    Parameters
+    ----------
+    GPT_chunks : iterable of DataFrame
+        The chunks of the TotXStore file of GPT's report, e.g. pd.read_csv(path, sep="\t", chunksize=n).
+    portal_summary_per_store : DataFrame
+        The DataFrame containing summary data per store of portal's report.
+    checks : list, optional
+        The check registry, default is load_checks().
+
+    Yields
+    ------
+    summary_store : DataFrame
+        The store level summary of the stores of one GPT chunk, followed by one last DataFrame
+        with the stores that are only in the portal's report.
+
+    Notes
+    -----
+    - The portal stores are indexed once with build_store_index and every GPT chunk is probed
+        against that index, so memory holds the portal sheet, one GPT chunk and the chunk's output only.
+    - Rows come out in the order of the GPT file, followed by the portal-only stores, instead of
+        being sorted by store id like store_level_summary.
+    - Store ids are matched as in match_stores.
+    """
+    checks = [check for check in load_checks(checks) if check["level"] == "store"]
+    GPT_columns = [check["gpt_column"] for check in checks]
+    portal_ids = normalize_store_ids(portal_summary_per_store[PORTAL_STORE_KEY])
+    portal_index = build_store_index(portal_ids)
+    portal_values = portal_summary_per_store[[check["portal_column"] for check in checks]].to_numpy(dtype="float64", na_value=np.nan)
+    portal_matched = np.zeros(len(portal_ids), dtype=bool)
+    GPT_only_stores = 0
+
+    for chunk in GPT_chunks:
+        chunk = chunk.rename(columns=lambda x: x.lower())
+        GPT_ids = normalize_store_ids(chunk[GPT_STORE_KEY])
+        portal_rows = probe_store_index(portal_index, GPT_ids)
+        portal_matched[portal_rows[portal_rows >= 0]] = True
+        GPT_only_stores += int((portal_rows < 0).sum())
+        GPT_rows = np.arange(len(chunk))
+        yield _store_summary_frame(
+            GPT_ids, GPT_rows, portal_rows,
+            chunk[GPT_columns].to_numpy(dtype="float64", na_value=np.nan), _take_rows(portal_values, portal_rows), checks,
+        )
+
+    portal_only_rows = np.flatnonzero(~portal_matched)
+    print(f"stores only in GPT's report: {GPT_only_stores}, stores only in portal's report: {len(portal_only_rows)}")
+    yield _store_summary_frame(
+        portal_ids[portal_only_rows], np.full(len(portal_only_rows), -1), portal_only_rows,
+        np.full((len(portal_only_rows), len(checks)), np.nan), portal_values[portal_only_rows], checks,
+    )
+
+def store_summary_counts(store_summary, checks=None):
+    """
+    Count the failing stores of a store level summary, and its stores of each "Store Match" category.
+
+    Parameters
+    ----------
+    store_summary : DataFrame or StoreSummaryChunks
+        The store level summary, or the chunks of a streamed one (counted as they were written).
+    checks : list, optional
+        The check registry, default is load_checks().
+
+    Returns
+    -------
+    dict:
+        The number of stores failing any store check ("failing"), and of each of STORE_MATCH_CATEGORIES.
+    """
+    if isinstance(store_summary, StoreSummaryChunks):
+        return dict(store_summary.counts)
+    status_columns = [store_check_columns(check)["status"] for check in load_checks(checks) if check["level"] == "store"]
+    matches = store_summary["Store Match"].value_counts()
+    counts = {"failing": int((store_summary[status_columns] == "FAIL").any(axis=1).sum())}
+    counts.update({category: int(matches.get(category, 0)) for category in STORE_MATCH_CATEGORIES})
+    return counts
+
+class StoreSummaryChunks:
+    """
+    The store level summary of a streamed comparison, spilled chunk by chunk to a local file
+    instead of being concatenated in memory.
+
+    The reports, the parquet files, the history and the store delta read the chunks back one at
+    a time by iterating over it, so memory holds a few chunks whatever the number of stores.
+
+    Parameters
+    ----------
+    path : str
+        The local file the chunks are pickled to, e.g. in the work directory of the validation.
+    checks : list, optional
+        The check registry, default is load_checks().
+
+    Attributes
+    ----------
+    counts : dict
+        The counts of store_summary_counts, summed over the chunks written.
+    rows : int
+        The number of rows written, also len() of the summary.
+    """
+
+    def __init__(self, path, checks=None):
+        self.path = path
+        self.checks = load_checks(checks)
+        self.counts = {"failing": 0, **{category: 0 for category in STORE_MATCH_CATEGORIES}}
+        self.rows = 0
+
+    def write(self, summary_chunks):
+        """
+        Write the chunks of iter_store_level_summary, counting their stores on the way.
+
+        Returns
+        -------
+        StoreSummaryChunks:
+            self, to be read back.
+        """
+        import pickle
+
+        with open(self.path, "wb") as f:
+            for chunk in summary_chunks:
+                pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+                for key, count in store_summary_counts(chunk, self.checks).items():
+                    self.counts[key] += count
+                self.rows += len(chunk)
+        return self
+
+    def __iter__(self):
+        import pickle
+
+        with open(self.path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def __len__(self):
+        return self.rows
+
+# incremental comparison with the previous report date
+def load_store_summary(summary_report_path, market, report_date):
+    """
+    Load the store level summary of an earlier validation, from its parquet file or else from its xlsx report.
+
+    Parameters
+    ----------
+    summary_report_path : str
+        The directory of the validation reports of the market.
+    market : str
+        The name of the market.
+    report_date : str
+        The report date of the earlier validation.
+
+    Returns
+    -------
+    DataFrame or None:
+        The Daily_PMIX_TotXStore summary, None if the market has no report for that date.
+    """
+    parquet_path = f"{summary_report_path}parquet/Daily_PMIX_TotXStore/market={market}/report_date={report_date}/part-0.parquet"
+    try:
+        with open_file(parquet_path) as f:
+            return pd.read_parquet(f)
+    except (FileNotFoundError, ImportError):
+        pass
+    try:
+        with open_file(summary_report_path + "PMIX_Validation_" + report_date + ".xlsx") as f:
+            return pd.read_excel(f, sheet_name="Daily_PMIX_TotXStore")
+    except FileNotFoundError:
+        return None
+
+def store_delta(previous_store_summary, store_summary, checks=None):
+    """
+    Compare the store level summary with the one of the previous report date.
+
+    Parameters
+    ----------
+    previous_store_summary : DataFrame
+        The store level summary of the previous report date.
+    store_summary : DataFrame or iterable of DataFrame
+        The store level summary of the report date being validated, or its chunks (e.g. a
+        StoreSummaryChunks), compared one at a time.
+    checks : list, optional
+        The check registry, default is load_checks().
+
+    Returns
+    -------
+    store_delta : DataFrame
+        One row per store that changed, with its "Change" (see STORE_CHANGES), its previous and
+        current status and, for every store check, its deviation and the change of its deviation.
+        A store fails if any of its store checks fails; stores failing on both dates are only
+        listed if one of their deviations changed, and stores passing on both dates are not listed.
+
+    Notes
+    -----
+    - Rows without a valid store id are left out, they cannot be matched from one date to the next.
+    - Store ids are matched as in match_stores, the previous summary being the indexed side.
+    """
+    checks = [check for check in load_checks(checks) if check["level"] == "store"]
+    columns = [store_check_columns(check) for check in checks]
+    status_columns = [column["status"] for column in columns]
+    deviation_columns = [column["deviation"] for column in columns]
+
+    def failing_and_deviations(summary):
+        failing = (summary[status_columns] == "FAIL").any(axis=1).to_numpy(dtype="float64")
+        return failing, summary[deviation_columns].to_numpy(dtype="float64", na_value=np.nan)
+
+    previous_ids = normalize_store_ids(previous_store_summary["Global_Store_Id"])
+    previous_index = build_store_index(previous_ids)
+    previous_failing, previous_deviations = failing_and_deviations(previous_store_summary)
+    previous_matched = np.zeros(len(previous_ids), dtype=bool)
+    deltas = []
+    for chunk in [store_summary] if isinstance(store_summary, pd.DataFrame) else store_summary:
+        store_ids = normalize_store_ids(chunk["Global_Store_Id"])
+        previous_rows = probe_store_index(previous_index, store_ids)
+        previous_matched[previous_rows[previous_rows >= 0]] = True
+        failing, deviations = failing_and_deviations(chunk)
+        deltas.append(_store_delta_frame(
+            store_ids, failing, _take_rows(previous_failing[:, None], previous_rows)[:, 0],
+            deviations, _take_rows(previous_deviations, previous_rows), deviation_columns,
+        ))
+    # the stores of the previous summary no chunk matched
+    disappeared = np.flatnonzero(~previous_matched)
+    deltas.append(_store_delta_frame(
+        previous_ids[disappeared], np.full(len(disappeared), np.nan), previous_failing[disappeared],
+        np.full((len(disappeared), len(deviation_columns)), np.nan), previous_deviations[disappeared], deviation_columns,
+    ))
+    # the frames without rows are left out, their empty status columns would not have the type of the others
+    delta = pd.concat([frame for frame in deltas if len(frame)] or deltas[-1:], ignore_index=True)
+    delta = delta.sort_values(["Change", "Global_Store_Id"], kind="stable", ignore_index=True)
+    delta["Change"] = delta["Change"].astype(str)
+    return delta
+
+def _store_delta_frame(store_ids, failing, previous_failing, deviations, previous_deviations, deviation_columns):
+    """
+    Build the rows of the store delta of matched stores, NaN on the side a store is missing from.
+    """
+    # the tolerance absorbs the rounding of the deviations read back from an xlsx report
+    deviation_changed = ~np.isclose(deviations, previous_deviations, rtol=1e-9, atol=1e-6, equal_nan=True).all(axis=1)
+
+    # the condition of every change of STORE_CHANGES, the first one a store meets is its change
+    conditions = {
+        "Newly failing": (failing == 1) & (previous_failing == 0),
+        "Newly passing": (failing == 0) & (previous_failing == 1),
+        "Appeared": np.isnan(previous_failing),
+        "Disappeared": np.isnan(failing),
+        "Deviation changed": (failing == 1) & deviation_changed,
+    }
+    change = np.select([conditions[change] for change in STORE_CHANGES], STORE_CHANGES, default="")
+    keep = (change != "") & (store_ids != MISSING_STORE_ID)
+    status_names = np.array(["PASS", "FAIL", ""], dtype=object)
+    return pd.concat([
+        pd.DataFrame({
+            "Global_Store_Id": store_ids[keep],
+            "Change": pd.Categorical(change[keep], categories=STORE_CHANGES),
+            "Previous Status": status_names[np.nan_to_num(previous_failing[keep], nan=2).astype(int)],
+            "Status": status_names[np.nan_to_num(failing[keep], nan=2).astype(int)],
+        }),
+        pd.DataFrame(deviations[keep], columns=deviation_columns),
+        pd.DataFrame(deviations[keep] - previous_deviations[keep], columns=["Change in " + column for column in deviation_columns]),
+    ], axis=1)
+
+def store_delta_counts(store_delta):
+    """
+    Count the stores of each change of a store delta, for the email body.
+    """
+    counts = store_delta["Change"].value_counts()
+    return {change: int(counts.get(change, 0)) for change in STORE_CHANGES}
+
+# result cache of the validations
+def file_fingerprint(path):
+    """
+    Get a fingerprint of the content of a local, s3:// or memory:// file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+
+    Returns
+    -------
+    str:
+        "etag:<ETag>" for an S3 object, without downloading it, and "sha256:<digest>" of the
+        content for the other files (or an S3 object without ETag).
+
+    Raises
+    ------
+    FileNotFoundError
+        If the file does not exist.
+    """
+    return get_storage(path).fingerprint(path)
+
+def file_exists(path):
+    """
+    Check if a local, s3:// or memory:// file exists.
+    """
+    return get_storage(path).exists(path)
+
+def result_cache_key(input_paths, checks, output_formats, incremental=False):
+    """
+    Compute the key of the result of a validation, which changes when any of its inputs does.
+
+    Parameters
+    ----------
+    input_paths : list
+        The paths of the portal report and of the two GPT files.
+    checks : list
+        The check registry the reports are compared with.
+    output_formats : list
+        The formats the summaries are saved in.
+    incremental : bool, optional
+        If the reports are compared with the previous report date, default is False.
+
+    Returns
+    -------
+    tuple:
+        - key : str
+            The sha256 of the fingerprints of the inputs, the checks, the output formats and the incremental mode.
+        - fingerprints : dict
+            The fingerprint of each input path.
+
+    Raises
+    ------
+    FileNotFoundError
+        If one of the inputs does not exist.
+    """
+    with ThreadPoolExecutor(max_workers=len(input_paths)) as executor:
+        fingerprints = dict(zip(input_paths, executor.map(file_fingerprint, input_paths)))
+    content = {
+        "version": RESULT_CACHE_VERSION,
+        "inputs": [fingerprints[path] for path in input_paths],
+        "checks": checks,
+        "output_formats": sorted(output_formats),
+        "incremental": incremental,
+    }
+    key = hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+    return key, fingerprints
+
+def manifest_path(summary_report_path, report_date):
+    """
+    Get the path of the result cache manifest, next to PMIX_Validation_<date>.xlsx.
+    """
+    return summary_report_path + "PMIX_Validation_" + report_date + ".manifest.json"
+
+def read_manifest(path):
+    """
+    Read a result cache manifest.
+
+    Returns
+    -------
+    dict or None:
+        The manifest, None if it does not exist or cannot be read.
+    """
+    try:
+        with open_file(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error: result cache manifest {path} not read: {e}")
+        return None
+
+def write_manifest(path, key, fingerprints, message_dict):
+    """
+    Write the result cache manifest of a validation.
+
+    Parameters
+    ----------
+    path : str
+        The path of the manifest, see manifest_path.
+    key : str
+        The key of the result, see result_cache_key.
+    fingerprints : dict
+        The fingerprint of each input path.
+    message_dict : dict
+        The content of the email of the validation, returned again on a cache hit.
+
+    Returns
+    -------
+        None
+    """
+    manifest = {
+        "key": key,
+        "inputs": fingerprints,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "message": message_dict,
+    }
+    with open_file(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+def cached_result(path, key, manifest=None):
+    """
+    Get the message of an earlier validation with the same key, if its reports still exist.
+
+    Parameters
+    ----------
+    path : str
+        The path of the manifest, see manifest_path.
+    key : str
+        The key of the result, see result_cache_key.
+    manifest : dict, optional
+        The manifest if it was already read from path, default is None, it is read.
+
+    Returns
+    -------
+    dict or None:
+        The message_dict of the earlier validation, None on a cache miss.
+    """
+    manifest = manifest if manifest is not None else read_manifest(path)
+    if manifest is None or manifest.get("key") != key:
+        return None
+    message_dict = manifest["message"]
+    report_path = message_dict.get("report path", "")
+    if report_path.endswith(".xlsx") and not file_exists(report_path):
+        print(f"result cache manifest {path} found but its report {report_path} is missing")
+        return None
+    return message_dict
+
+# save the reports to s3
+def save_reports(summary_path, overall_summary, store_summary, excel_engine="openpyxl", store_delta=None, local_path=None, top_items=None):
+    """
+    Saves a validation report file to S3.
+
+    Parameters
+    ----------
+    summary_path : str
+        The path where the report file is to be saved in S3.
+    store_summary : DataFrame or StoreSummaryChunks
+        The DataFrame containing the store level summary, or the chunks of a streamed one.
+    overall_summary : DataFrame 
+        The DataFrame containing the overall summary.
+    excel_engine : str, optional
+        The engine writing the file, see write_workbook. Default is "openpyxl".
+    store_delta : DataFrame, optional
+        The changes since the previous report date, saved as a third sheet "Daily_PMIX_Store_Delta"
+        if given. Default is None.
+    local_path : str, optional
+        The local file the report is built in before being copied to summary_path, and kept,
+        see write_workbook. Default is None.
+    top_items : DataFrame, optional
+        The most offending items of the failing stores, saved as a "Daily_PMIX_Top_Items" sheet
+        if given, see item_level_summary. Default is None.
+
+    Returns
+    -------
+    int:
+        The number of bytes written.
+    """
+    sheets = {"PMIX_Overall_Summary": overall_summary, "Daily_PMIX_TotXStore": store_summary}
+    if store_delta is not None:
+        sheets["Daily_PMIX_Store_Delta"] = store_delta
+    if top_items is not None:
+        sheets["Daily_PMIX_Top_Items"] = top_items
+    return write_workbook(summary_path, sheets, excel_engine, local_path)
+
+def write_workbook(path, sheets, excel_engine="openpyxl", local_path=None):
+    """
+    Write DataFrames to the sheets of a local, s3:// or memory:// xlsx file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the xlsx file.
+    sheets : dict
+        The DataFrame of each sheet name, written in order, with a header and without index.
+        A sheet may also be an iterable of DataFrames with the same columns (e.g. a
+        StoreSummaryChunks), written one after the other without being concatenated.
+    excel_engine : str, optional
+        The engine writing the file, default is "openpyxl".
+        - "openpyxl" : pd.ExcelWriter with openpyxl.
+        - "xlsxwriter" : xlsxwriter in constant memory mode, writing the rows one at a time.
+            Falls back to "openpyxl" if xlsxwriter is not installed.
+    local_path : str, optional
+        The local file the workbook is built in before being copied to path. It is kept, e.g. to
+        attach the report to the email without downloading it again. Default is None, a temporary
+        file that is deleted.
+
+    Returns
+    -------
+    int:
+        The number of bytes written.
+    """
+    if excel_engine not in EXCEL_ENGINES:
+        raise ValueError(f"Unknown excel engine '{excel_engine}', expected one of {EXCEL_ENGINES}")
+    if excel_engine == "xlsxwriter":
+        try:
+            import xlsxwriter
+        except ImportError:
+            print("Error: xlsxwriter is not installed, saving the reports with openpyxl.")
+            excel_engine = "openpyxl"
+
+    if local_path is None:
+        with tempfile.TemporaryDirectory() as directory:
+            return write_workbook(path, sheets, excel_engine, os.path.join(directory, path.split("/")[-1]))
+
+    if excel_engine == "openpyxl":
+        with pd.ExcelWriter(local_path, engine="openpyxl") as writer:
+            for sheet_name, frames in sheets.items():
+                row_number = 0
+                for frame in [frames] if isinstance(frames, pd.DataFrame) else frames:
+                    frame.to_excel(writer, sheet_name=sheet_name, header=row_number == 0, index=False, startrow=row_number)
+                    row_number += len(frame) + (row_number == 0)
+    else:
+        # constant memory mode flushes every row to a temporary file
+        workbook = xlsxwriter.Workbook(local_path, {"constant_memory": True})
+        for sheet_name, frames in sheets.items():
+            worksheet = workbook.add_worksheet(sheet_name)
+            row_number = 0
+            for frame in [frames] if isinstance(frames, pd.DataFrame) else frames:
+                if row_number == 0:
+                    worksheet.write_row(0, 0, [str(column) for column in frame.columns])
+                    row_number = 1
+                values = frame.astype(object).to_numpy(copy=True)
+                values[pd.isna(values)] = None
+                for row in values.tolist():
+                    worksheet.write_row(row_number, 0, row)
+                    row_number += 1
+        workbook.close()
+    if storage_scheme(path) != "local" or os.path.abspath(path) != os.path.abspath(local_path):
+        with open(local_path, "rb") as source, open_file(path, "wb") as destination:
+            shutil.copyfileobj(source, destination)
+    return os.path.getsize(local_path)
+
+def compact_report_frame(frame):
+    """
+    Convert a report DataFrame to the compact types used for the parquet output.
+
+    Parameters
+    ----------
+    frame : DataFrame
+        The overall summary or the store level summary.
+
+    Returns
+    -------
+    DataFrame:
+        A copy with the store ids as int32 (when they fit) and the text columns (checks,
+        statuses, store match) as categoricals.
+    """
+    frame = frame.copy()
+    for column in frame.columns:
+        if column == "Global_Store_Id":
+            store_ids = frame[column].astype("Int64")
+            fits_int32 = store_ids.dropna().between(np.iinfo("int32").min, np.iinfo("int32").max).all()
+            frame[column] = store_ids.astype("Int32") if fits_int32 else store_ids
+        elif not pd.api.types.is_numeric_dtype(frame[column]):
+            frame[column] = frame[column].astype("category")
+    return frame
+
+def save_reports_parquet(output_path, market, report_date, overall_summary, store_summary, top_items=None, store_delta=None):
+    """
+    Saves the overall and store level summaries as parquet files, partitioned by market and report date.
+
+    Parameters
+    ----------
+    output_path : str
+        The directory of the validation reports of the market.
+    market : str
+        The name of the market.
+    report_date : str
+        Date extracted from the portal report filename.
+    overall_summary : DataFrame
+        The DataFrame containing the overall summary.
+    store_summary : DataFrame or StoreSummaryChunks
+        The DataFrame containing the store level summary, or the chunks of a streamed one, written
+        as one row group each (see write_parquet_chunks).
+    top_items : DataFrame, optional
+        The most offending items of the failing stores, saved as Daily_PMIX_Top_Items if given.
+        Default is None.
+    store_delta : DataFrame, optional
+        The changes since the previous report date, saved as Daily_PMIX_Store_Delta if given.
+        Default is None.
+
+    Returns
+    -------
+    parquet_paths : dict
+        The path of the parquet file of each summary, e.g.
+        <output_path>parquet/Daily_PMIX_TotXStore/market=<market>/report_date=<report_date>/part-0.parquet
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError('The parquet output needs pyarrow, install it or remove "parquet" from output_formats') from e
+
+    parquet_paths = {}
+    frames = {"PMIX_Overall_Summary": overall_summary, "Daily_PMIX_TotXStore": store_summary}
+    if store_delta is not None:
+        frames["Daily_PMIX_Store_Delta"] = store_delta
+    if top_items is not None:
+        frames["Daily_PMIX_Top_Items"] = top_items
+    for name, frame in frames.items():
+        parquet_path = f"{output_path}parquet/{name}/market={market}/report_date={report_date}/part-0.parquet"
+        with open_file(parquet_path, "wb") as f:
+            if isinstance(frame, pd.DataFrame):
+                write_parquet_chunks(f, [compact_report_frame(frame)])
+            else:
+                write_parquet_chunks(f, (compact_report_frame(chunk) for chunk in frame))
+        parquet_paths[name] = parquet_path
+    return parquet_paths
+
+def write_parquet_chunks(f, frames):
+    """
+    Write DataFrames with the same columns to one parquet file, one row group each, without
+    concatenating them.
+
+    Parameters
+    ----------
+    f : file object
+        The binary file the parquet file is written to.
+    frames : iterable of DataFrame
+        The DataFrames, e.g. the chunks of a StoreSummaryChunks.
+
+    Notes
+    -----
+    The schema is the one of the first DataFrame with its int32 and float32 columns widened to
+    int64 and float64, so that the chunks compacted to different types (see compact_values and
+    compact_store_ids) are cast to it exactly. A single DataFrame keeps its own types.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    wider_types = {pa.int32(): pa.int64(), pa.float32(): pa.float64()}
+    frames = iter(frames)
+    table = pa.Table.from_pandas(next(frames), preserve_index=False)
+    second = next(frames, None)
+    if second is None:
+        pq.write_table(table, f)
+        return
+    # the pandas types saved in the metadata are widened as well, e.g. Int32 store ids are read back as Int64
+    pandas_metadata = json.loads(table.schema.metadata[b"pandas"])
+    wider_pandas_types = {"int32": "int64", "Int32": "Int64", "float32": "float64"}
+    for column in pandas_metadata["columns"]:
+        column["pandas_type"] = wider_pandas_types.get(column["pandas_type"], column["pandas_type"])
+        column["numpy_type"] = wider_pandas_types.get(column["numpy_type"], column["numpy_type"])
+    schema = pa.schema(
+        [field.with_type(wider_types.get(field.type, field.type)) for field in table.schema],
+        metadata={b"pandas": json.dumps(pandas_metadata).encode()},
+    )
+    with pq.ParquetWriter(f, schema) as writer:
+        writer.write_table(table.cast(schema))
+        for frame in itertools.chain([second], frames):
+            writer.write_table(pa.Table.from_pandas(frame, preserve_index=False).cast(schema))
+    
+# main function
+def generate_validation_report(env, market, portal_report_path, GPT_report_path, summary_report_path, portal_excel_sheet_names, path_prefixes, secret_name, region_name, email_port, receiver_email, cc_recipients=[], checks=None, portal_reader="pandas", store_chunksize=None, smtp_session=None, send_notification=True, output_formats=("xlsx",), excel_engine="openpyxl", result_cache=False, email_on_cache_hit=False, incremental=False, metrics=None, profile=False, max_attachment_bytes=MAX_ATTACHMENT_BYTES, notification_queue=None, GPT_wait_seconds=0, GPT_poll_seconds=GPT_POLL_SECONDS, history_path=None, chronic_failures=None, item_chunksize=None, top_items=None):
+    """
+    Generates a validation report for PMIX comparison between GPT and portal's reports.
+    
+    Parameters
+    ----------
+    env : str
+        The name of the environment.
+    market : str
+        The name of the market.
+    portal_report_path : str
+        The Path to the portal's report file.
+    GPT_report_path : str
+        The path to the GPT's report file.
+    summary_report_path : str
+        The path to save the summary report in S3.
+    portal_excel_sheet_names : list
+        The list of sheet names in the portal report.
+    path_prefixes : list
+        The list of prefixes for the paths of the portal report and GPT report.
+    sender_email : 
+        The email address of the sender.
+    password : 
+        The app password of the sender's email.
+    receiver_email : list
+        A list of email addresses of the receivers.
+    cc_recipients : list, optional 
+        The list of email addresses to receive CC, default is [].
+    checks : list, optional
+        The check definitions from lambda_config.json, default is DEFAULT_CHECKS.
+    portal_reader : str, optional
+        The reader used for the portal report, see read_portal_report. Default is "pandas".
+    store_chunksize : int, optional
+        If given, the TotXStore file of GPT's report is compared in chunks of this many rows
+        instead of being loaded at once, and the chunks of the store level summary are spilled
+        to a local file the outputs read them back from (see StoreSummaryChunks). Default is None.
+    smtp_session : SMTPSession, optional
+        The SMTP session to send the email with, shared by the reports of one batch. Default is None,
+        a connection is opened for the email.
+    send_notification : bool, optional
+        If False, the report is saved but no email is sent (and the secret is not looked up),
+        e.g. when the backfill sends one digest for many reports. Default is True.
+    output_formats : list, optional
+        The formats the summaries are saved in, "xlsx" (PMIX_Validation_<date>.xlsx, attached to the email)
+        and/or "parquet" (see save_reports_parquet). Default is ("xlsx",).
+    excel_engine : str, optional
+        The engine writing the xlsx report, see save_reports. Default is "openpyxl".
+    result_cache : bool, optional
+        If True, the ETags (or content hashes) of the three inputs and the checks are compared with the
+        manifest saved next to the xlsx report by the last run. If they are the same, the reports are
+        not generated again and the message of the last run is returned. Default is False.
+    email_on_cache_hit : bool, optional
+        If True, the email is sent again (with the report the last run attached, capped by
+        max_attachment_bytes) on a cache hit. Default is False, a re-delivered event does not send a
+        duplicate email.
+    incremental : bool, optional
+        If True, the store level summary is compared with the one of the previous report date (see
+        store_delta). The changes are saved as a "Daily_PMIX_Store_Delta" sheet of the report, counted in
+        the email body and attached as PMIX_Validation_Delta_<date>.xlsx (with the overall summary) instead
+        of the full report. If the previous report date has no report, the full report is attached.
+        With the parquet output the changes are also saved as Daily_PMIX_Store_Delta (see
+        save_reports_parquet), which is the saved delta without the xlsx output. Default is False.
+    metrics : StageMetrics, optional
+        The metrics the stages are recorded in, default is None, a StageMetrics with the market as dimension.
+        The metrics are printed as one CloudWatch EMF JSON line when the validation ends, also if it fails.
+    profile : bool, optional
+        If True, the validation runs under cProfile and the stats are saved to
+        <summary_report_path>profiles/<portal file name>_<timestamp>.prof, see profiled. Default is False.
+    max_attachment_bytes : int, optional
+        The largest total size of the attachments of the email, larger reports are sent as a
+        presigned link instead, see send_email. Default is MAX_ATTACHMENT_BYTES.
+    notification_queue : NotificationQueue, optional
+        If given, the email is queued there, to be coalesced with the other emails to the same
+        recipients, instead of being sent at once. Default is None.
+    GPT_wait_seconds : float, optional
+        If GPT's files of the report date are not there yet, wait for them for at most this long,
+        listing their directory every GPT_poll_seconds, see report_paths. Default is 0, no wait.
+    GPT_poll_seconds : float, optional
+        The interval of the listings while waiting for GPT's files, default is GPT_POLL_SECONDS.
+    history_path : str, optional
+        If given, the overall and store level summaries are added to the history dataset under this
+        path, for the trend queries of summary_comp.history. Default is None, no history.
+    chronic_failures : dict, optional
+        If given (with history_path), the stores failing a check on "min_failures" or more of the last
+        "days" report dates are listed in the email, see chronic_failures_message. Default is None.
+    item_chunksize : int, optional
+        If the registry has "item" level checks, the item by store extracts of both sides are
+        compared (see summary_comp.items) in chunks of this many rows. The most offending items of
+        the failing stores are saved as a "Daily_PMIX_Top_Items" sheet and counted in the email. An
+        error of the item comparison is reported in the email without stopping the validation.
+        Default is None, ITEM_CHUNKSIZE.
+    top_items : int, optional
+        The offending items listed per failing store, default is None, TOP_ITEMS.
+
+    Returns
+    -------
+    message_dict : dict
+        The content of the email, with the subject, the statuses and the report path.
+
+    Notes
+    -----
+    This runs generate_validation_report_async in a new event loop, so it cannot be called from
+    a running event loop; await generate_validation_report_async there instead.
+    """
+    return asyncio.run(generate_validation_report_async(
+        env = env,
+        market = market,
+        portal_report_path = portal_report_path,
+        GPT_report_path = GPT_report_path,
+        summary_report_path = summary_report_path,
+        portal_excel_sheet_names = portal_excel_sheet_names,
+        path_prefixes = path_prefixes,
+        secret_name = secret_name,
+        region_name = region_name,
+        email_port = email_port,
+        receiver_email = receiver_email,
+        cc_recipients = cc_recipients,
+        checks = checks,
+        portal_reader = portal_reader,
+        store_chunksize = store_chunksize,
+        smtp_session = smtp_session,
+        send_notification = send_notification,
+        output_formats = output_formats,
+        excel_engine = excel_engine,
+        result_cache = result_cache,
+        email_on_cache_hit = email_on_cache_hit,
+        incremental = incremental,
+        metrics = metrics,
+        profile = profile,
+        max_attachment_bytes = max_attachment_bytes,
+        notification_queue = notification_queue,
+        GPT_wait_seconds = GPT_wait_seconds,
+        GPT_poll_seconds = GPT_poll_seconds,
+        history_path = history_path,
+        chronic_failures = chronic_failures,
+        item_chunksize = item_chunksize,
+        top_items = top_items,
+    ))
+
+async def generate_validation_report_async(env, market, portal_report_path, GPT_report_path, summary_report_path, portal_excel_sheet_names, path_prefixes, secret_name, region_name, email_port, receiver_email, cc_recipients=[], checks=None, portal_reader="pandas", store_chunksize=None, smtp_session=None, send_notification=True, output_formats=("xlsx",), excel_engine="openpyxl", result_cache=False, email_on_cache_hit=False, incremental=False, metrics=None, profile=False, max_attachment_bytes=MAX_ATTACHMENT_BYTES, notification_queue=None, GPT_wait_seconds=0, GPT_poll_seconds=GPT_POLL_SECONDS, history_path=None, chronic_failures=None, item_chunksize=None, top_items=None):
+    """
+    The asyncio version of generate_validation_report, see its parameters.
+
+    The blocking calls (S3, Secrets Manager, SMTP) and the pandas work run in the default executor,
+    and the independent ones are awaited together: the secret lookup, the reading of the reports and
+    of the previous store summary; the overall, store and item checks; the xlsx, delta and parquet outputs and
+    the history; the result cache manifest and the email.
+    """
+    metrics = metrics if metrics is not None else StageMetrics(Market=market)
+    only_file_name = portal_report_path.split("/")[-1].split(".xlsx")[0]
+    metrics.set_property(file=portal_report_path, environment=env)
+    profile_path = summary_report_path + "profiles/" + only_file_name + "_" + datetime.now().strftime("%Y%m%dT%H%M%S") + ".prof"
+    try:
+        # the reports are built in the work directory and attached from there, so the email does not read them back from S3
+        with profiled(profile, profile_path), metrics.stage("generate_validation_report"), tempfile.TemporaryDirectory(prefix="pmix_") as work_dir:
+            return await _generate_validation_report(
+                env, market, portal_report_path, GPT_report_path, summary_report_path, portal_excel_sheet_names, path_prefixes,
+                secret_name, region_name, email_port, receiver_email, cc_recipients, checks, portal_reader, store_chunksize,
+                smtp_session, send_notification, output_formats, excel_engine, result_cache, email_on_cache_hit, incremental,
+                metrics, max_attachment_bytes, notification_queue, GPT_wait_seconds, GPT_poll_seconds, history_path, chronic_failures, item_chunksize, top_items, work_dir,
+            )
+    except Exception as e:
+        metrics.set_property(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        metrics.emit()
+
+
+def _save_manifest(path, key, fingerprints, message_dict):
+    """
+    Write the result cache manifest, logging the error if it cannot be written.
+    """
+    try:
+        write_manifest(path, key, fingerprints, message_dict)
+    except Exception as e:
+        print(f"Error: result cache manifest not saved: {e}")
+
+def _timed(metrics, stage_name, function, *args, **kwargs):
+    """
+    Run a function in a metrics stage, recording its rows if it returns a DataFrame or StoreSummaryChunks.
+    """
+    with metrics.stage(stage_name) as stage:
+        result = function(*args, **kwargs)
+        if isinstance(result, (pd.DataFrame, StoreSummaryChunks)):
+            stage["rows"] = len(result)
+    return result
+
+async def _generate_validation_report(env, market, portal_report_path, GPT_report_path, summary_report_path, portal_excel_sheet_names, path_prefixes, secret_name, region_name, email_port, receiver_email, cc_recipients, checks, portal_reader, store_chunksize, smtp_session, send_notification, output_formats, excel_engine, result_cache, email_on_cache_hit, incremental, metrics, max_attachment_bytes, notification_queue, GPT_wait_seconds, GPT_poll_seconds, history_path, chronic_failures, item_chunksize, top_items, work_dir):
+    """
+    The validation of generate_validation_report_async, recording its stages in metrics and building
+    the xlsx reports in the local directory work_dir.
+    """
+    checks = load_checks(checks)
+    if not output_formats or set(output_formats) - set(OUTPUT_FORMATS):
+        raise ValueError(f"Unknown output formats {output_formats}, expected some of {OUTPUT_FORMATS}")
+    only_file_name = portal_report_path.split("/")[-1].split(".xlsx")[0]
+    item_checks = [check for check in checks if check["level"] == "item"]
+    if item_checks:
+        from .items import ITEM_CHUNKSIZE, TOP_ITEMS, compare_item_extracts, item_extract_paths
+    notification = dict(
+        notification_queue = notification_queue,
+        secret_name = secret_name,
+        region_name = region_name,
+        receiver_email = receiver_email,
+        cc_recipients = cc_recipients,
+        port = email_port,
+        smtp_session = smtp_session,
+        metrics = metrics,
+        max_attachment_bytes = max_attachment_bytes
+    )
+    try:
+        # lists GPT's directory (or waits for its files), read_files then finds them in the same listing
+        with metrics.stage("find_GPT_files"):
+            report_date, GPT_overall_summary_path, GPT_summary_per_store_path = await asyncio.to_thread(
+                report_paths, portal_report_path, GPT_report_path, path_prefixes, GPT_wait_seconds, GPT_poll_seconds,
+            )
+    except Exception:
+        # read_files reports the file name it cannot parse
+        report_date = None
+    cache_key = None
+    if result_cache and report_date is not None:
+        cache_manifest_path = manifest_path(summary_report_path, report_date)
+        with metrics.stage("result_cache"):
+            manifest_task = asyncio.create_task(asyncio.to_thread(read_manifest, cache_manifest_path))
+            input_paths = [portal_report_path, GPT_overall_summary_path, GPT_summary_per_store_path]
+            if item_checks:
+                input_paths += await asyncio.to_thread(item_extract_paths, portal_report_path, GPT_report_path, path_prefixes, report_date)
+            try:
+                cache_key, fingerprints = await asyncio.to_thread(
+                    result_cache_key, input_paths, checks, output_formats, incremental,
+                )
+            except FileNotFoundError:
+                # read_files reports the missing file
+                cache_key = None
+            manifest = await manifest_task
+            message_dict = await asyncio.to_thread(cached_result, cache_manifest_path, cache_key, manifest) if cache_key else None
+        if message_dict is not None:
+            print(f"inputs unchanged since the last validation, reusing the reports of {cache_manifest_path}")
+            message_dict["result cache"] = "HIT"
+            metrics.set_property(report_date=report_date, result_cache="HIT")
+            if send_notification and email_on_cache_hit:
+                # the report the first email attached (the delta report of an incremental validation), read
+                # from its saved path and replaced by a link above max_attachment_bytes, as in the first email
+                report_path = message_dict.get("delta report path") or message_dict.get("report path", "")
+                await asyncio.to_thread(
+                    notify, message_dict = message_dict, attachment_paths = [report_path] if report_path.endswith(".xlsx") else [], **notification,
+                )
+                print("email sent successfully" if notification_queue is None else "email queued")
+            return message_dict
+
+    # the secret lookup and the previous store summary do not depend on the reports, so they are
+    # fetched (or served from the cache) while the reports are being read
+    secret_task = asyncio.create_task(asyncio.to_thread(key_vault, secret_name = secret_name, region_name = region_name)) if send_notification else None
+    previous_date = previous_report_date(report_date) if incremental and report_date is not None else None
+    previous_task = asyncio.create_task(asyncio.to_thread(
+        _timed, metrics, "load_previous_store_summary", load_store_summary, summary_report_path, market, previous_date,
+    )) if previous_date else None
+    try:
+        with metrics.stage("read_files"):
+            portal_overall_summary, portal_summary_per_store, GPT_overall_summary, GPT_summary_per_store, report_date, message, status = await asyncio.to_thread(
+                read_files, portal_report_path, GPT_report_path, portal_excel_sheet_names, path_prefixes, checks, portal_reader, store_chunksize, metrics,
+            )
+        if secret_task is not None:
+            await secret_task
+
+        metrics.set_property(report_date=report_date)
+        if status=="False":
+            metrics.set_property(error=message.get("error"))
+            message["subject"] = "Error in PMIX" + " ( " + market + " ) " + "Summary Comparison " + report_date
+            message["environment"] = f"{env}"
+            message["market"] = f"{market}"
+            message["file name"] = f"{only_file_name}"
+            if not send_notification:
+                return message
+
+            await asyncio.to_thread(notify, message_dict = message, attachment_paths = [], **notification)
+            return message
+
+        summary_path = summary_report_path + "PMIX_Validation_" + report_date + ".xlsx"
+        if isinstance(GPT_summary_per_store, pd.DataFrame):
+            store_comparison = asyncio.to_thread(_timed, metrics, "store_level_summary", store_level_summary, GPT_summary_per_store, portal_summary_per_store, checks)
+        else:
+            # streamed, the chunks of the store level summary are spilled to the work directory, and
+            # the outputs below read them back one at a time
+            store_summary_chunks = StoreSummaryChunks(os.path.join(work_dir, "store_summary.pickle"), checks)
+            store_comparison = asyncio.to_thread(
+                _timed, metrics, "store_level_summary", store_summary_chunks.write, iter_store_level_summary(GPT_summary_per_store, portal_summary_per_store, checks),
+            )
+        # the overall checks, the store level summary and the item comparison are independent, pandas releases the GIL in most of their work
+        comparisons = [
+            asyncio.to_thread(_timed, metrics, "evaluate_overall_checks", evaluate_overall_checks, GPT_overall_summary, portal_overall_summary, checks),
+            store_comparison,
+        ]
+        if item_checks:
+            comparisons.append(asyncio.to_thread(
+                _timed, metrics, "item_level_summary", compare_item_extracts, portal_report_path, GPT_report_path, path_prefixes, report_date,
+                checks, item_chunksize or ITEM_CHUNKSIZE, top_items or TOP_ITEMS,
+            ))
+        pmix_overall_summary, store_summary, *item_result = await asyncio.gather(*comparisons, return_exceptions=True)
+        for result in (pmix_overall_summary, store_summary):
+            if isinstance(result, BaseException):
+                raise result
+        print("pmix overall summary generated")
+        print("store summary generated")
+        item_summary = None
+        item_message = None
+        if item_result:
+            # the item comparison is a drill-down, failing to run it does not stop the report
+            if isinstance(item_result[0], BaseException):
+                item_message = f"ERROR {type(item_result[0]).__name__}: {item_result[0]}"
+                print(f"Error: item comparison failed: {item_result[0]}")
+            else:
+                item_summary = item_result[0]
+                print(f"item comparison done: {len(item_summary['stores'])} store(s) with failing items out of {item_summary['items']} store items")
+        top_items_frame = item_summary["top_items"] if item_summary is not None else None
+
+        delta = None
+        if incremental:
+            previous_store_summary = await previous_task if previous_task is not None else None
+            if previous_store_summary is None:
+                print(f"no store summary found for the previous report date {previous_date}, sending the full report")
+            else:
+                delta = await asyncio.to_thread(_timed, metrics, "store_delta", store_delta, previous_store_summary, store_summary, checks)
+                print(f"store delta with {previous_date} generated: {len(delta)} store(s) changed")
+    finally:
+        # a failed read or comparison leaves the lookups running, they are awaited so that none is
+        # left pending and their errors are retrieved (the error being raised is the first one)
+        await asyncio.gather(*[task for task in (secret_task, previous_task) if task is not None], return_exceptions=True)
+    
+    # the xlsx report, the delta report, the parquet files and the history are written at the same time
+    attachment_paths = []
+    outputs = {}
+    if "xlsx" in output_formats:
+        print("saving reports to S3")
+        local_summary_path = os.path.join(work_dir, summary_path.split("/")[-1])
+
+        def save_summary():
+            with metrics.stage("save_reports") as stage:
+                stage["bytes_written"] = save_reports(summary_path, pmix_overall_summary, store_summary, excel_engine, delta, local_summary_path, top_items_frame)
+                stage["rows"] = len(pmix_overall_summary) + len(store_summary)
+            print(f"reports saved to S3 at: {summary_path}")
+
+        outputs["xlsx"] = asyncio.to_thread(save_summary)
+        if delta is None:
+            attachment_paths.append(Attachment(local_summary_path, link_path=summary_path))
+        else:
+            delta_path = summary_report_path + "PMIX_Validation_Delta_" + report_date + ".xlsx"
+            local_delta_path = os.path.join(work_dir, delta_path.split("/")[-1])
+
+            delta_sheets = {"PMIX_Overall_Summary": pmix_overall_summary, "Daily_PMIX_Store_Delta": delta}
+            if top_items_frame is not None:
+                delta_sheets["Daily_PMIX_Top_Items"] = top_items_frame
+
+            def save_delta():
+                with metrics.stage("save_delta_report") as stage:
+                    stage["bytes_written"] = write_workbook(delta_path, delta_sheets, excel_engine, local_delta_path)
+                print(f"delta report saved to S3 at: {delta_path}")
+
+            outputs["delta"] = asyncio.to_thread(save_delta)
+            attachment_paths.append(Attachment(local_delta_path, link_path=delta_path))
+    else:
+        summary_path = summary_report_path + "parquet/"
+    if "parquet" in output_formats:
+        outputs["parquet"] = asyncio.to_thread(
+            _timed, metrics, "save_reports_parquet", save_reports_parquet, summary_report_path, market, report_date, pmix_overall_summary, store_summary, top_items_frame, delta,
+        )
+    if history_path:
+        outputs["history"] = asyncio.to_thread(_timed, metrics, "save_history", HistoryStore(history_path).append, market, report_date, store_summary, pmix_overall_summary, checks)
+    results = dict(zip(outputs, await asyncio.gather(*outputs.values(), return_exceptions=True)))
+    for output, result in results.items():
+        if isinstance(result, BaseException) and output not in ("parquet", "history"):
+            raise result
+    parquet_message = None
+    if "parquet" in results:
+        # the parquet files are an additional output, failing to write them does not stop the email
+        if isinstance(results["parquet"], BaseException):
+            parquet_message = f"ERROR {type(results['parquet']).__name__}: {results['parquet']}"
+            print(f"Error: parquet reports not saved: {results['parquet']}")
+        else:
+            parquet_message = f"{summary_report_path}parquet/"
+            print(f"parquet reports saved to S3 at: {parquet_message}")
+    history_message = None
+    if "history" in results:
+        # like the parquet files, the history does not stop the email
+        if isinstance(results["history"], BaseException):
+            history_message = f"ERROR {type(results['history']).__name__}: {results['history']}"
+            print(f"Error: summaries not added to the history: {results['history']}")
+        else:
+            history_message = history_path
+            print(f"summaries added to the history at: {history_path}")
+    
+    overall_summary_flag = "PASS"
+    store_summary_flag = "PASS"
+    
+    if "FAIL" in pmix_overall_summary["Status (abs(0.05%)"].values:
+        overall_summary_flag = "FAIL"
+    # else:
+    #     overall_summary_flag = "PASS"
+    print(f"Status of overall PMIX summary : {overall_summary_flag}")
+    
+    store_counts = store_summary_counts(store_summary, checks)
+    if store_counts["failing"]:
+        store_summary_flag = "FAIL"
+    # else:
+    #     store_summary_flag = "PASS"
+    print(f"Status of store level PMIX summary : {store_summary_flag}")
+    GPT_only_stores = store_counts["GPT only"]
+    portal_only_stores = store_counts["Portal only"]
+    print(f"stores only in GPT's report: {GPT_only_stores}, stores only in portal's report: {portal_only_stores}")
+    
+    message_dict = {}
+    message_dict["subject"] = "PMIX" + " ( " + market + " ) " + "Summary Comparison " + report_date
+    message_dict["environment"] = f"{env}"
+    message_dict["market"] = f"{market}"
+    message_dict["file name"] = f"{only_file_name}"
+    message_dict["report path"] = f"{summary_path}"
+    message_dict["overall summary status"] = f"{overall_summary_flag}"
+    message_dict["store summary status"] = f"{store_summary_flag}"
+    message_dict["stores only in GPT"] = f"{GPT_only_stores}"
+    message_dict["stores only in portal"] = f"{portal_only_stores}"
+    if item_summary is not None:
+        item_stores = item_summary["stores"]
+        message_dict["item summary status"] = "FAIL" if len(item_stores) else "PASS"
+        message_dict["stores with failing items"] = f"{len(item_stores)}"
+        message_dict["failing items"] = f"{int(item_stores['Failing Items'].sum())}"
+        if len(item_stores):
+            message_dict["most failing stores"] = ", ".join(
+                f"{store_id} ({failing_items} items)" for store_id, failing_items in item_stores[["Global_Store_Id", "Failing Items"]].head(5).itertuples(index=False)
+            )
+    elif item_message is not None:
+        message_dict["item comparison"] = item_message
+    if parquet_message is not None:
+        message_dict["parquet path"] = parquet_message
+    if history_message is not None:
+        message_dict["history path"] = history_message
+        if chronic_failures and not history_message.startswith("ERROR"):
+            try:
+                message_dict["chronic failures"] = await asyncio.to_thread(
+                    _timed, metrics, "chronic_failures", chronic_failures_message, HistoryStore(history_path), market, report_date, chronic_failures,
+                )
+            except Exception as e:
+                message_dict["chronic failures"] = f"ERROR {type(e).__name__}: {e}"
+                print(f"Error: chronic failures not queried: {e}")
+    if incremental:
+        if delta is None:
+            message_dict["compared with"] = f"no report for {previous_date}, full report attached"
+        else:
+            message_dict["compared with"] = f"{previous_date}"
+            for change, count in store_delta_counts(delta).items():
+                message_dict[f"stores {change.lower()}"] = f"{count}"
+            if attachment_paths:
+                message_dict["delta report path"] = attachment_paths[0].link_path
+            elif "parquet" in results and not isinstance(results["parquet"], BaseException):
+                # without the xlsx output, the delta is only saved with the parquet files
+                message_dict["delta report path"] = results["parquet"]["Daily_PMIX_Store_Delta"]
+    # the manifest is saved without the cache status, and only once the email is sent: a retry of a
+    # validation whose email failed must send it, not find its result in the cache
+    save_manifest = None
+    if cache_key is not None:
+        # a failed parquet output or item comparison is not cached, so that the next delivery runs it again
+        if (parquet_message is None or not parquet_message.startswith("ERROR")) and item_message is None:
+            save_manifest = functools.partial(_save_manifest, cache_manifest_path, cache_key, fingerprints, dict(message_dict))
+        message_dict["result cache"] = "MISS"
+        metrics.set_property(result_cache="MISS")
+    metrics.set_property(overall_summary_status=overall_summary_flag, store_summary_status=store_summary_flag)
+    if send_notification:
+        # with a notification queue, the manifest is saved when the queue sends the email
+        await asyncio.to_thread(notify, message_dict = message_dict, attachment_paths = attachment_paths, on_sent = save_manifest, **notification)
+        print("email sent successfully" if notification_queue is None else "email queued")
+    elif save_manifest is not None:
+        await asyncio.to_thread(save_manifest)
+    return message_dict
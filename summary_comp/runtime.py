@@ -0,0 +1,259 @@
+"""
+The state reused across the invocations of a warm Lambda container and the file access built on it.
+
+Only the standard library is imported here, so the handler can route an event with the config
+and its market registry without loading pandas, boto3 or s3fs.
+"""
+import importlib.util
+import json
+import threading
+import time
+
+from .storage import STORAGE_BACKENDS, MemoryStorage, S3Storage, storage_scheme
+
+SECRET_TTL_SECONDS = 900
+# the optional packages needed by the constants of a config: (constant, value, package, what to change without it)
+OPTIONAL_DEPENDENCIES = [
+    ("output_formats", "parquet", "pyarrow", 'remove "parquet" from output_formats'),
+    ("excel_engine", "xlsxwriter", "xlsxwriter", 'set excel_engine to "openpyxl"'),
+    ("history", True, "pyarrow", 'set history to false'),
+]
+
+
+def check_constants(constants):
+    """
+    Check that the optional packages needed by the constants of a config are installed, so that a
+    Lambda deployed without them fails when its config is loaded rather than in the middle of a
+    validation. The packages are looked up, not imported.
+
+    Parameters
+    ----------
+    constants : dict
+        The "constants" section of the config.
+
+    Raises
+    ------
+    ImportError
+        If a package needed by the constants is not installed.
+    """
+    for constant, value, package, fix in OPTIONAL_DEPENDENCIES:
+        setting = constants.get(constant)
+        needed = value in setting if isinstance(setting, list) else setting == value
+        if needed and importlib.util.find_spec(package) is None:
+            raise ImportError(f'The config sets "{constant}" to {json.dumps(setting)}, which needs {package}: install it or {fix}')
+
+
+# state reused across the invocations of a warm container
+class RuntimeContext:
+    """
+    Holds the objects that are expensive to build and can be reused by every invocation
+    of a Lambda container: the parsed config and its market registry, the boto3 session,
+    the storage backends (see summary_comp.storage) and the email secret.
+
+    Parameters
+    ----------
+    config_path : str, optional
+        The path to the config file, default is "lambda_config.json".
+    secret_ttl : float, optional
+        The number of seconds a secret is reused before being fetched again, default is SECRET_TTL_SECONDS.
+    """
+
+    def __init__(self, config_path="lambda_config.json", secret_ttl=SECRET_TTL_SECONDS):
+        self.config_path = config_path
+        self.secret_ttl = secret_ttl
+        self._config = None
+        self._markets = None
+        self._session = None
+        self._secrets_managers = {}
+        self._storage_settings = {}
+        self._storages = {}
+        self._secrets = {}
+        self._lock = threading.Lock()
+        self._session_lock = threading.Lock()
+
+    @property
+    def config(self):
+        """
+        The parsed config file, read on first use. Its constants are checked with check_constants.
+        """
+        if self._config is None:
+            with open(self.config_path) as f:
+                config = json.load(f)
+            check_constants(config.get("constants", {}))
+            self._config = config
+        return self._config
+
+    @property
+    def markets(self):
+        """
+        The MarketRegistry of the "paths" section of the config, built on first use.
+        """
+        if self._markets is None:
+            from .markets import MarketRegistry
+
+            self._markets = MarketRegistry.from_config(self.config)
+        return self._markets
+
+    def new_client(self, service_name, **kwargs):
+        """
+        Build a boto3 client with the session of the container, itself built on first use: the
+        Secrets Manager clients and the S3 client of the S3 storage backend. The clients are built
+        one at a time, as a boto3 session is not thread safe (its clients are).
+        """
+        with self._session_lock:
+            if self._session is None:
+                import boto3
+
+                self._session = boto3.session.Session()
+            return self._session.client(service_name, **kwargs)
+
+    def configure_storage(self, **settings):
+        """
+        Set the settings of the storage backends, e.g. the "storage" section of the constants of the
+        config: block_size, cache_type and max_pool_connections, see summary_comp.storage.Storage.
+        The backends are built again with new settings, the in-memory one keeps its files.
+        """
+        with self._lock:
+            if settings == self._storage_settings:
+                return
+            memory = self._storages.get("memory")
+            self._storage_settings = dict(settings)
+            self._storages = {}
+            if memory is not None:
+                self._storages["memory"] = MemoryStorage(files=memory.files, **settings)
+
+    def storage(self, path=""):
+        """
+        Get the storage backend of a path (see summary_comp.storage.storage_scheme), built on first
+        use and shared afterwards.
+        """
+        scheme = storage_scheme(path)
+        with self._lock:
+            if scheme not in self._storages:
+                if scheme == "s3":
+                    # the S3 client of the backend is built with the session of the container
+                    self._storages[scheme] = S3Storage(new_client=self.new_client, **self._storage_settings)
+                else:
+                    self._storages[scheme] = STORAGE_BACKENDS[scheme](**self._storage_settings)
+            return self._storages[scheme]
+
+    def secret(self, secret_name, region_name, refresh=False):
+        """
+        Get a secret from the AWS Secrets Manager, fetched again only after secret_ttl seconds or if refresh is True.
+        """
+        with self._lock:
+            if region_name not in self._secrets_managers:
+                self._secrets_managers[region_name] = self.new_client("secretsmanager", region_name=region_name)
+            secrets_manager = self._secrets_managers[region_name]
+            fetched_at, secret_string_json = self._secrets.get((secret_name, region_name), (None, None))
+            if refresh or fetched_at is None or time.monotonic() - fetched_at > self.secret_ttl:
+                secret_value = secrets_manager.get_secret_value(SecretId=secret_name)
+                secret_string_json = json.loads(secret_value["SecretString"])
+                self._secrets[(secret_name, region_name)] = (time.monotonic(), secret_string_json)
+            return secret_string_json
+
+    def put_secret(self, secret_name, region_name, secret_string_json):
+        """
+        Put a secret in the cache without the AWS Secrets Manager, e.g. for local runs and benchmarks.
+        It is served until secret_ttl seconds have passed.
+        """
+        with self._lock:
+            self._secrets[(secret_name, region_name)] = (time.monotonic(), secret_string_json)
+
+_runtime_context = None
+
+def get_runtime_context(config_path="lambda_config.json"):
+    """
+    Get the RuntimeContext of the container, created on the first (cold) invocation.
+
+    Parameters
+    ----------
+    config_path : str, optional
+        The path to the config file, only used when the context is created. Default is "lambda_config.json".
+
+    Returns
+    -------
+    RuntimeContext:
+        The runtime context shared by all the invocations of the container.
+    """
+    global _runtime_context
+    if _runtime_context is None:
+        _runtime_context = RuntimeContext(config_path)
+    return _runtime_context
+
+def get_storage(path):
+    """
+    Get the storage backend of a local, s3:// or memory:// path from the runtime context.
+    """
+    return get_runtime_context().storage(path)
+
+def open_file(path, mode="rb"):
+    """
+    Open a local, s3:// or memory:// file with its storage backend.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+    mode : str, optional
+        The mode to open the file in, "rb", "wb", "r" or "w", default is "rb". The parent
+        directories of a local file opened for writing are created.
+
+    Returns
+    -------
+    file object
+    """
+    return get_storage(path).open(path, mode)
+
+def file_size(path):
+    """
+    Get the size in bytes of a local, s3:// or memory:// file.
+    """
+    return get_storage(path).size(path)
+
+def read_range(path, start, length):
+    """
+    Read length bytes of a local, s3:// or memory:// file from start, with one ranged GET request on S3.
+    """
+    return get_storage(path).read_range(path, start, length)
+
+def list_directory(path, recursive=False):
+    """
+    List the files of a local, s3:// or memory:// directory, with one (paginated) listing request on S3.
+
+    The s3fs listing cache is bypassed, so files added since an earlier listing are seen.
+
+    Parameters
+    ----------
+    path : str
+        The directory.
+    recursive : bool, optional
+        If True, the files of the subdirectories are listed as well (still one listing on S3,
+        without delimiter). Default is False.
+
+    Returns
+    -------
+    list:
+        The (path, modified time in epoch seconds) of every file, empty if the directory does not exist.
+    """
+    return get_storage(path).list(path, recursive)
+
+def key_vault(secret_name, region_name, refresh=False):
+    """
+    Retrieves the required email details from the AWS Secrets Manager.
+    
+    Parameters
+    ----------
+    secret_name : str
+        The name of the secret containing the email details.
+    region_name : str
+    The AWS region where the secret manager is located.
+    refresh : bool, optional
+        If True, the secret is fetched again instead of being taken from the runtime context cache.
+
+    Returns
+    -------
+    secret_string_json : dict
+        A dictionary containing all the required for email.
+    """
+    return get_runtime_context().secret(secret_name, region_name, refresh=refresh)
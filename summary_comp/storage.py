@@ -0,0 +1,340 @@
+"""
+The storage backends the reports are read from and written to: S3, the local filesystem and an
+in-memory store.
+
+A path is routed to a backend by its scheme (see storage_scheme): s3:// paths to S3Storage,
+memory:// paths to MemoryStorage and the other paths to LocalStorage. The backends are built on
+first use by the runtime context, with the "storage" settings of the config (see
+RuntimeContext.configure_storage), so the tuning of the S3 reads lives in one place. The in-memory
+store lets the pipeline, the benchmarks and local runs work offline.
+
+Only the standard library is imported here, s3fs and boto3 are imported by S3Storage on first use.
+"""
+import abc
+import fnmatch
+import hashlib
+import io
+import os
+import threading
+import time
+
+# the bytes fetched by one read of an S3 file, and read ahead of the position with the "readahead" cache
+STORAGE_BLOCK_SIZE = 8 * 1024 * 1024
+# the fsspec cache of the S3 files: "readahead" reads block_size bytes ahead of the position, "none"
+# reads what is asked only, "blockcache" keeps the blocks for random access (e.g. parquet footers)
+STORAGE_CACHE_TYPE = "readahead"
+# the connections of the S3 client pool, shared by the threads reading and writing the reports
+STORAGE_MAX_POOL_CONNECTIONS = 16
+
+
+def storage_scheme(path):
+    """
+    Get the scheme of the backend of a path: "s3", "memory" or "local".
+    """
+    if path.startswith("s3://"):
+        return "s3"
+    if path.startswith("memory://"):
+        return "memory"
+    return "local"
+
+
+class Storage(abc.ABC):
+    """
+    The file access of a backend. Directories are prefixes of the paths, listed with a trailing "/".
+    A backend implements open, size, exists and list, the other methods are built on them.
+
+    Parameters
+    ----------
+    block_size : int, optional
+        The bytes fetched by a read of an S3 file, and the size of the blocks of Storage.blocks.
+        Default is STORAGE_BLOCK_SIZE.
+    cache_type : str, optional
+        The read-ahead of the S3 files, default is STORAGE_CACHE_TYPE.
+    max_pool_connections : int, optional
+        The size of the connection pool of the S3 client, default is STORAGE_MAX_POOL_CONNECTIONS.
+    """
+
+    def __init__(self, block_size=STORAGE_BLOCK_SIZE, cache_type=STORAGE_CACHE_TYPE, max_pool_connections=STORAGE_MAX_POOL_CONNECTIONS):
+        self.block_size = block_size
+        self.cache_type = cache_type
+        self.max_pool_connections = max_pool_connections
+
+    @abc.abstractmethod
+    def open(self, path, mode="rb"):
+        """
+        Open a file, in one of the modes "rb", "wb", "r" and "w".
+        """
+
+    @abc.abstractmethod
+    def size(self, path):
+        """
+        Get the size of a file in bytes.
+        """
+
+    @abc.abstractmethod
+    def exists(self, path):
+        """
+        Check if a file exists.
+        """
+
+    @abc.abstractmethod
+    def list(self, path, recursive=False):
+        """
+        List the files of a directory as (path, modified time in epoch seconds), empty if the
+        directory does not exist. With recursive, the files of the subdirectories are listed as well.
+        """
+
+    def read_range(self, path, start, length):
+        """
+        Read length bytes of a file from start, fewer at its end.
+        """
+        with self.open(path) as f:
+            f.seek(start)
+            return f.read(length)
+
+    def blocks(self, path, block_size=None):
+        """
+        Read a file block by block, of block_size bytes (default is the block size of the backend).
+        """
+        with self.open(path) as f:
+            yield from iter(lambda: f.read(block_size or self.block_size), b"")
+
+    def fingerprint(self, path):
+        """
+        Get "sha256:<digest>" of the content of a file, see process_function.file_fingerprint.
+        """
+        digest = hashlib.sha256()
+        for block in self.blocks(path):
+            digest.update(block)
+        return "sha256:" + digest.hexdigest()
+
+    def link(self, path, expires_in):
+        """
+        Get a URL a file can be downloaded from for expires_in seconds, None if the backend has none.
+        """
+        return None
+
+    def glob(self, directory, pattern):
+        """
+        List the paths of the files of a directory (not of its subdirectories) matching a glob pattern.
+        """
+        return sorted(path for path, _ in self.list(directory) if fnmatch.fnmatch(path.split("/")[-1], pattern))
+
+
+class LocalStorage(Storage):
+    """
+    The local filesystem. The parent directories of a file opened for writing are created.
+
+    The files are opened with the default buffering, the OS already reads ahead, and a buffer of
+    block_size would slow down the random access of the parquet readers.
+    """
+
+    def open(self, path, mode="rb"):
+        if "w" in mode:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return open(path, mode)
+
+    def size(self, path):
+        return os.path.getsize(path)
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def list(self, path, recursive=False):
+        if not os.path.isdir(path):
+            return []
+        if recursive:
+            return [
+                (os.path.join(directory, name), os.path.getmtime(os.path.join(directory, name)))
+                for directory, _, names in os.walk(path) for name in names
+            ]
+        return [(os.path.join(path, entry.name), entry.stat().st_mtime) for entry in os.scandir(path) if entry.is_file()]
+
+
+class _MemoryFile(io.BytesIO):
+    """
+    A file of a MemoryStorage opened for writing, stored when it is closed.
+    """
+
+    def __init__(self, storage, path):
+        super().__init__()
+        self._storage = storage
+        self._path = path
+
+    def close(self):
+        if not self.closed:
+            self._storage.put(self._path, self.getvalue())
+        super().close()
+
+
+class MemoryStorage(Storage):
+    """
+    Files kept in memory by their memory:// path, e.g. to run the pipeline or a benchmark offline.
+    A file is visible once the file it is written with is closed.
+
+    Parameters
+    ----------
+    files : dict, optional
+        The (content, modified time in epoch seconds) of every file by path, e.g. the files of
+        another MemoryStorage to keep them under new settings. Default is None, no file.
+    **kwargs
+        The settings of the backend, see Storage.
+    """
+
+    def __init__(self, files=None, **kwargs):
+        super().__init__(**kwargs)
+        self.files = files if files is not None else {}
+        self._lock = threading.Lock()
+
+    def put(self, path, data):
+        """
+        Store the content of a file.
+        """
+        with self._lock:
+            self.files[path] = (bytes(data), time.time())
+
+    def get(self, path):
+        """
+        Get the content of a file.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the file does not exist.
+        """
+        with self._lock:
+            if path not in self.files:
+                raise FileNotFoundError(path)
+            return self.files[path][0]
+
+    def open(self, path, mode="rb"):
+        if mode not in ("rb", "wb", "r", "w"):
+            raise ValueError(f"Unsupported mode '{mode}' for {path}")
+        f = _MemoryFile(self, path) if "w" in mode else io.BytesIO(self.get(path))
+        return f if "b" in mode else io.TextIOWrapper(f, encoding="utf-8")
+
+    def size(self, path):
+        return len(self.get(path))
+
+    def exists(self, path):
+        with self._lock:
+            return path in self.files
+
+    def list(self, path, recursive=False):
+        prefix = path if path.endswith("/") else path + "/"
+        with self._lock:
+            return [
+                (file_path, modified) for file_path, (_, modified) in self.files.items()
+                if file_path.startswith(prefix) and (recursive or "/" not in file_path[len(prefix):])
+            ]
+
+    def read_range(self, path, start, length):
+        return self.get(path)[start:start + length]
+
+
+class S3Storage(Storage):
+    """
+    S3, through an s3fs filesystem and a boto3 client sharing the settings of the backend. The
+    files are read block_size bytes at a time with the cache_type read-ahead, and both use a
+    connection pool of max_pool_connections.
+
+    Parameters
+    ----------
+    new_client : callable, optional
+        Builds the boto3 client from a service name and keyword arguments, e.g. RuntimeContext.new_client
+        to build it with the session of the container. Default is None, a client of a new boto3 session.
+    **kwargs
+        The settings of the backend, see Storage.
+    """
+
+    def __init__(self, new_client=None, **kwargs):
+        super().__init__(**kwargs)
+        self._new_client = new_client
+        self._filesystem = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def filesystem(self):
+        """
+        Get the s3fs filesystem, built on first use.
+        """
+        with self._lock:
+            if self._filesystem is None:
+                import s3fs
+
+                self._filesystem = s3fs.S3FileSystem(
+                    default_block_size=self.block_size,
+                    default_cache_type=self.cache_type,
+                    config_kwargs={"max_pool_connections": self.max_pool_connections},
+                )
+            return self._filesystem
+
+    def client(self):
+        """
+        Get the boto3 S3 client, built on first use (boto3 clients are thread safe).
+        """
+        with self._lock:
+            if self._client is None:
+                import boto3
+                from botocore.config import Config
+
+                new_client = self._new_client if self._new_client is not None else boto3.session.Session().client
+                self._client = new_client("s3", config=Config(max_pool_connections=self.max_pool_connections))
+            return self._client
+
+    def open(self, path, mode="rb"):
+        return self.filesystem().open(path, mode)
+
+    def size(self, path):
+        return self.filesystem().size(path)
+
+    def exists(self, path):
+        filesystem = self.filesystem()
+        filesystem.invalidate_cache(path)
+        return filesystem.exists(path)
+
+    def list(self, path, recursive=False):
+        # the s3fs listing cache is bypassed, so files added since an earlier listing are seen
+        filesystem = self.filesystem()
+        filesystem.invalidate_cache(path)
+        try:
+            if recursive:
+                entries = filesystem.find(path, detail=True).values()
+            else:
+                entries = filesystem.ls(path, detail=True)
+        except FileNotFoundError:
+            return []
+        return [
+            ("s3://" + entry["name"], entry["LastModified"].timestamp() if "LastModified" in entry else 0.0)
+            for entry in entries if entry["type"] == "file"
+        ]
+
+    def read_range(self, path, start, length):
+        bucket_name, object_key = path[len("s3://"):].split("/", 1)
+        response = self.client().get_object(Bucket=bucket_name, Key=object_key, Range=f"bytes={start}-{start + length - 1}")
+        return response["Body"].read()
+
+    def blocks(self, path, block_size=None):
+        # one ranged GET request per block, without the read-ahead of the s3fs files
+        block_size = block_size or self.block_size
+        for start in range(0, self.size(path), block_size):
+            yield self.read_range(path, start, block_size)
+
+    def fingerprint(self, path):
+        # the ETag of the object, without downloading it; a listing cached by an earlier invocation
+        # could hold the ETag of an overwritten object
+        filesystem = self.filesystem()
+        filesystem.invalidate_cache(path)
+        etag = filesystem.info(path).get("ETag")
+        if etag:
+            return "etag:" + etag.strip('"')
+        return super().fingerprint(path)
+
+    def link(self, path, expires_in):
+        bucket_name, object_key = path[len("s3://"):].split("/", 1)
+        return self.client().generate_presigned_url(
+            "get_object", Params={"Bucket": bucket_name, "Key": object_key}, ExpiresIn=expires_in,
+        )
+
+
+STORAGE_BACKENDS = {"s3": S3Storage, "memory": MemoryStorage, "local": LocalStorage}
@@ -0,0 +1,394 @@
+"""
+The shared fixtures of the tests, and the synthetic inputs of the PMIX summary comparison used by the
+tests and the benchmarks (benchmarks/fixtures.py), with a local SMTP sink.
+
+The portal workbook (``overall_summary`` and ``summary_per_store`` sheets) and GPT's gzip TSVs
+(``Daily_Pmix_Summary_<date>.txt.gz`` and ``Daily_Pmix_TotXStore_<date>.txt.gz``) are generated
+from the check registry, so they have the columns the comparison reads, with a chosen share of
+stores whose values differ or that are only in one of the reports.
+
+The repository root is put on sys.path so that summary_comp is imported from the tree.
+"""
+import gzip
+import os
+import shutil
+import socketserver
+import sys
+import tempfile
+import threading
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+SHEET_NAMES = {"portal_overall_summary": "overall_summary", "portal_summary_per_store": "summary_per_store"}
+PATH_PREFIXES = {
+    "portal_path_prefix": "Daily_Dlry_Pmix_",
+    "GPT_overall_summary_path_prefix": "Daily_Pmix_Summary_",
+    "GPT_summary_per_store_path_prefix": "Daily_Pmix_TotXStore_",
+}
+# the overall checks of GPT's report read under another name, see read_files
+GPT_OVERALL_FILE_COLUMNS = {"total_alacarte_units": "total_units"}
+
+
+def synthetic_reports(n_stores, mismatch_rate=0.01, missing_rate=0.001, extra_columns=0, seed=0):
+    """
+    Generate the content of the portal and GPT reports of one report date.
+
+    Parameters
+    ----------
+    n_stores : int
+        The number of stores of the portal report.
+    mismatch_rate : float, optional
+        The share of the stores whose GPT values are 1% to 5% off, so their checks fail. Default is 0.01.
+    missing_rate : float, optional
+        The share of the stores missing from GPT's report, replaced by as many stores only in GPT's report.
+        Default is 0.001.
+    extra_columns : int, optional
+        The number of unused columns of the portal store sheet, as the real export has. Default is 0.
+    seed : int, optional
+        The seed of the random values, default is 0.
+
+    Returns
+    -------
+    dict:
+        The DataFrames "portal_overall_summary", "portal_summary_per_store", "GPT_overall_summary"
+        (with the column names of the file) and "GPT_summary_per_store".
+    """
+    import numpy as np
+    import pandas as pd
+
+    from summary_comp.process_function import GPT_STORE_KEY, PORTAL_STORE_KEY, load_checks
+
+    rng = np.random.default_rng(seed)
+    checks = load_checks()
+    store_checks = [check for check in checks if check["level"] == "store"]
+    overall_checks = [check for check in checks if check["level"] == "overall"]
+
+    store_ids = np.arange(1, n_stores + 1)
+    values = {
+        "unique_days": np.ones(n_stores),
+        "total_net_sales": rng.uniform(1e3, 1e5, n_stores).round(2),
+        "total_units": rng.integers(100, 20000, n_stores).astype("float64"),
+    }
+    portal_stores = pd.DataFrame({PORTAL_STORE_KEY: store_ids})
+    for check in store_checks:
+        portal_stores[check["portal_column"]] = values.get(check["gpt_column"], rng.uniform(0, 1e4, n_stores).round(2))
+    for i in range(extra_columns):
+        portal_stores[f"extra_{i}"] = rng.uniform(0, 1e4, n_stores).round(2)
+
+    GPT_stores = pd.DataFrame({GPT_STORE_KEY: store_ids})
+    for check in store_checks:
+        GPT_stores[check["gpt_column"]] = portal_stores[check["portal_column"]].to_numpy()
+    mismatched = rng.random(n_stores) < mismatch_rate
+    for check in store_checks:
+        if check["gpt_column"] != "unique_days":
+            GPT_stores.loc[mismatched, check["gpt_column"]] *= 1 + rng.uniform(0.01, 0.05, mismatched.sum())
+    n_missing = int(round(n_stores * missing_rate))
+    if n_missing:
+        missing = rng.choice(n_stores, n_missing, replace=False)
+        GPT_only = GPT_stores.iloc[missing].copy()
+        GPT_only[GPT_STORE_KEY] = np.arange(n_stores + 1, n_stores + 1 + n_missing)
+        GPT_stores = pd.concat([GPT_stores.drop(index=missing), GPT_only], ignore_index=True)
+    GPT_stores = GPT_stores.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+    overall_values = {
+        "unique_stores": n_stores,
+        "unique_days": 1,
+        "total_net_sales": float(values["total_net_sales"].sum().round(2)),
+        "total_rows": n_stores * 300,
+        "unique_items": 450,
+        "total_alacarte_units": float(values["total_units"].sum()),
+        "days_removed": 0,
+    }
+    portal_overall = pd.DataFrame({check["portal_column"]: [overall_values.get(check["gpt_column"], 0)] for check in overall_checks})
+    GPT_overall = pd.DataFrame({
+        GPT_OVERALL_FILE_COLUMNS.get(check["gpt_column"], check["gpt_column"]): [overall_values.get(check["gpt_column"], 0)]
+        for check in overall_checks
+    })
+    GPT_overall["total_net_sales"] = GPT_stores["total_net_sales"].sum().round(2)
+    return {
+        "portal_overall_summary": portal_overall,
+        "portal_summary_per_store": portal_stores,
+        "GPT_overall_summary": GPT_overall,
+        "GPT_summary_per_store": GPT_stores,
+    }
+
+
+def write_portal_workbook(path, n_stores, extra_columns=0, seed=0, reports=None):
+    """
+    Write a portal workbook with the overall_summary and summary_per_store sheets.
+
+    Parameters
+    ----------
+    path : str
+        The local path of the workbook.
+    n_stores, extra_columns, seed :
+        See synthetic_reports, used if reports is not given.
+    reports : dict, optional
+        The reports returned by synthetic_reports, default is None.
+    """
+    import openpyxl
+
+    reports = reports if reports is not None else synthetic_reports(n_stores, extra_columns=extra_columns, seed=seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    for key in ("portal_overall_summary", "portal_summary_per_store"):
+        sheet = workbook.create_sheet(SHEET_NAMES[key])
+        frame = reports[key]
+        sheet.append(list(frame.columns))
+        for row in frame.itertuples(index=False):
+            sheet.append([value.item() if hasattr(value, "item") else value for value in row])
+    workbook.save(path)
+
+
+def write_fixtures(root, report_date, n_stores, mismatch_rate=0.01, missing_rate=0.001, extra_columns=0, seed=0, GPT_stores=None):
+    """
+    Write the portal workbook and GPT's gzip TSVs of one report date under a local, s3:// or memory:// directory.
+
+    Parameters
+    ----------
+    n_stores, mismatch_rate, missing_rate, extra_columns, seed :
+        See synthetic_reports.
+    GPT_stores : int, optional
+        The number of stores of GPT's TotXStore file if it is not the portal's, e.g. a multi-country
+        file whose stores past n_stores are only in GPT's report. Default is None, n_stores.
+
+    Returns
+    -------
+    dict:
+        - portal_report_path : the portal workbook, <root>portal/Daily_Dlry_Pmix_<date>.xlsx
+        - GPT_report_path : the directory of GPT's reports, <root>gpt/
+        - summary_report_path : the directory for the validation reports, <root>reports/
+    """
+    from summary_comp.runtime import open_file
+    from summary_comp.storage import storage_scheme
+
+    root = root.rstrip("/") + "/"
+    reports = synthetic_reports(n_stores, mismatch_rate, missing_rate, extra_columns, seed)
+    if GPT_stores is not None:
+        reports["GPT_summary_per_store"] = synthetic_reports(GPT_stores, mismatch_rate, 0, seed=seed)["GPT_summary_per_store"]
+    paths = {
+        "portal_report_path": f"{root}portal/{PATH_PREFIXES['portal_path_prefix']}{report_date}.xlsx",
+        "GPT_report_path": f"{root}gpt/",
+        "summary_report_path": f"{root}reports/",
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        local_workbook = os.path.join(directory, "portal.xlsx")
+        write_portal_workbook(local_workbook, n_stores, reports=reports)
+        with open(local_workbook, "rb") as source, open_file(paths["portal_report_path"], "wb") as destination:
+            shutil.copyfileobj(source, destination)
+    for prefix, key in (("GPT_overall_summary_path_prefix", "GPT_overall_summary"), ("GPT_summary_per_store_path_prefix", "GPT_summary_per_store")):
+        with open_file(f"{paths['GPT_report_path']}{PATH_PREFIXES[prefix]}{report_date}.txt.gz", "wb") as f:
+            f.write(gzip.compress(reports[key].to_csv(sep="\t", index=False).encode(), compresslevel=6))
+    if storage_scheme(root) == "local":
+        os.makedirs(paths["summary_report_path"], exist_ok=True)
+    return paths
+
+
+def draw_cents(case, n_stores, rng):
+    """
+    Draw GPT and portal amounts in int64 cents, for the fixed point checks (see bench_fixed_point.py).
+
+    Parameters
+    ----------
+    case : str
+        - "random": GPT amounts up to 10 million, the portal amounts off by up to 0.2%
+        - "boundary": the deviation is the tolerance of a relative check of 0.05% (half of the stores)
+          or of an absolute check of 0.25, give or take a cent
+        - "large": GPT amounts up to 10**11, off by up to 0.1%
+    n_stores : int
+        The number of amounts.
+    rng : numpy.random.Generator
+        The random generator.
+
+    Returns
+    -------
+    tuple:
+        The GPT and the portal cents.
+    """
+    import numpy as np
+
+    if case == "boundary":
+        # the GPT amounts are multiples of 20 (2000 cents), so that 0.05% of them is a whole cent
+        GPT = rng.integers(1, 500_000, n_stores) * 2000
+        deviation = np.where(rng.random(n_stores) < 0.5, GPT // 2000, 25) + rng.integers(-1, 2, n_stores)
+        return GPT, GPT - deviation * rng.choice([-1, 1], n_stores)
+    high = 10 ** 9 if case == "random" else 10 ** 13
+    spread = 0.002 if case == "random" else 0.001
+    GPT = rng.integers(0, high, n_stores)
+    return GPT, GPT + np.rint(GPT * rng.uniform(-spread, spread, n_stores)).astype("int64")
+
+
+# the item level checks of the item extracts written by write_item_extracts
+ITEM_CHECKS = [
+    {"name": "Item Net Sales", "gpt_column": "net_sales", "portal_column": "net_sales", "level": "item"},
+    {"name": "Item Units", "gpt_column": "units", "portal_column": "units", "level": "item", "mode": "absolute", "tolerance": 0},
+]
+
+
+def write_item_extracts(root, report_date, n_stores, n_items, days=1, mismatch_rate=0.001, stores_per_block=200, seed=0):
+    """
+    Write GPT's gzip TSV and the portal's parquet item extracts of one report date, one block of
+    stores at a time, so that extracts of tens of millions of rows can be written.
+
+    Parameters
+    ----------
+    root : str
+        The local directory, see write_fixtures: the extracts are written to <root>gpt/ and <root>portal/.
+    n_stores, n_items, days : int
+        Every store sells every item (with zero-padded ids) on every day, n_stores * n_items * days rows.
+    mismatch_rate : float, optional
+        The share of the GPT rows whose net sales are 1% to 5% off. Default is 0.001.
+    stores_per_block : int, optional
+        The stores written at a time, one row group of the parquet extract. Default is 200.
+
+    Returns
+    -------
+    dict:
+        The "GPT" and "portal" paths of the extracts and their "rows".
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    from summary_comp.items import GPT_ITEM_KEY, ITEM_PATH_PREFIXES, PORTAL_ITEM_KEY
+    from summary_comp.process_function import GPT_STORE_KEY, PORTAL_STORE_KEY
+
+    root = root.rstrip("/") + "/"
+    os.makedirs(root + "gpt", exist_ok=True)
+    os.makedirs(root + "portal", exist_ok=True)
+    paths = {
+        "GPT": f"{root}gpt/{ITEM_PATH_PREFIXES['GPT_item_per_store_path_prefix']}{report_date}.txt.gz",
+        "portal": f"{root}portal/{ITEM_PATH_PREFIXES['portal_item_per_store_path_prefix']}{report_date}.parquet",
+        "rows": n_stores * n_items * days,
+    }
+    rng = np.random.default_rng(seed)
+    item_ids = np.array([f"{item:06d}" for item in range(1, n_items + 1)], dtype=object)
+    writer = None
+    with gzip.open(paths["GPT"], "wt", compresslevel=1) as GPT_file:
+        for first_store in range(0, n_stores, stores_per_block):
+            stores = np.arange(first_store, min(first_store + stores_per_block, n_stores)) + 1
+            n_rows = len(stores) * n_items * days
+            store_ids = np.repeat(stores, n_items * days)
+            items = np.tile(np.repeat(item_ids, days), len(stores))
+            net_sales = rng.uniform(1, 500, n_rows).round(2)
+            units = rng.integers(1, 50, n_rows).astype("float64")
+            portal = pd.DataFrame({PORTAL_STORE_KEY: store_ids, PORTAL_ITEM_KEY: items, "net_sales": net_sales, "units": units})
+            table = pa.Table.from_pandas(portal, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(paths["portal"], table.schema)
+            writer.write_table(table)
+            mismatched = rng.random(n_rows) < mismatch_rate
+            GPT_net_sales = net_sales.copy()
+            GPT_net_sales[mismatched] *= 1 + rng.uniform(0.01, 0.05, mismatched.sum())
+            GPT = pd.DataFrame({GPT_STORE_KEY: store_ids, GPT_ITEM_KEY: items, "net_sales": GPT_net_sales.round(2), "units": units})
+            GPT.to_csv(GPT_file, sep="\t", index=False, header=first_store == 0)
+    writer.close()
+    return paths
+
+
+class _SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks enough SMTP (with AUTH PLAIN accepting any credentials) for smtplib to send emails.
+    """
+
+    def handle(self):
+        with self.server.sink.lock:
+            self.server.sink.connections += 1
+        self.wfile.write(b"220 smtp-sink ESMTP\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith("EHLO"):
+                self.wfile.write(b"250-smtp-sink\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n")
+            elif command.startswith("HELO"):
+                self.wfile.write(b"250 smtp-sink\r\n")
+            elif command.startswith("AUTH"):
+                self.wfile.write(b"235 2.7.0 Authentication successful\r\n")
+            elif command.startswith("DATA"):
+                self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                size = 0
+                for data_line in iter(self.rfile.readline, b""):
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    size += len(data_line)
+                with self.server.sink.lock:
+                    refused = self.server.sink.refuse_data > 0
+                    self.server.sink.refuse_data -= refused
+                    if not refused:
+                        self.server.sink.messages.append(size)
+                self.wfile.write(b"451 4.3.0 Try again later\r\n" if refused else b"250 OK\r\n")
+            elif command.startswith("QUIT"):
+                self.wfile.write(b"221 Bye\r\n")
+                return
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.wfile.write(b"250 OK\r\n")
+            else:
+                self.wfile.write(b"502 Command not implemented\r\n")
+
+
+class SMTPSink:
+    """
+    A local SMTP server keeping the size of every email it receives, on a free port of 127.0.0.1.
+
+    Use it as a context manager; the emails are sent to it with SMTPSession(..., use_ssl=False)
+    and a secret whose EMAIL_HOST is "127.0.0.1".
+
+    Parameters
+    ----------
+    refuse_data : int, optional
+        The number of emails answered with a temporary error (451) before the emails are accepted,
+        to exercise the retries. Default is 0.
+    """
+
+    def __init__(self, refuse_data=0):
+        self.messages = []
+        self.connections = 0
+        self.refuse_data = refuse_data
+        self.lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPSinkHandler)
+        self._server.daemon_threads = True
+        self._server.sink = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def runtime_context(monkeypatch, tmp_path):
+    """
+    A fresh RuntimeContext for the test, so that its boto3 session, storage backends (and the files
+    of the memory:// store) and secrets are not shared with the other tests, nor the listings of
+    GPT's directories kept by summary_comp.gpt_index.
+    """
+    from summary_comp import gpt_index, runtime
+
+    context = runtime.RuntimeContext(config_path=str(tmp_path / "lambda_config.json"))
+    monkeypatch.setattr(runtime, "_runtime_context", context)
+    monkeypatch.setattr(gpt_index, "_indexes", {})
+    return context
+
+
+@pytest.fixture
+def smtp_sink(runtime_context):
+    """
+    A local SMTPSink, with the secret "email-secret" of the runtime context pointing to it, for
+    SMTPSession("email-secret", "eu-west-1", smtp_sink.port, use_ssl=False).
+    """
+    runtime_context.put_secret("email-secret", "eu-west-1", {
+        "EMAIL_HOST": "127.0.0.1", "EMAIL_HOST_USER": "sender@example.com", "EMAIL_HOST_PASSWORD": "password",
+    })
+    with SMTPSink() as sink:
+        yield sink
@@ -0,0 +1,168 @@
+"""
+Tests of the asyncio pipeline of generate_validation_report: its reports are the ones of the
+comparison run step by step, concurrent validations in one event loop give the same results as
+one at a time, and the errors of its concurrent steps are raised or reported as before.
+"""
+import asyncio
+import gc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import PATH_PREFIXES, SHEET_NAMES, write_fixtures
+from summary_comp import process_function
+from summary_comp.mail import SMTPSession
+from summary_comp.process_function import (
+    evaluate_overall_checks, generate_validation_report, generate_validation_report_async, read_files, store_level_summary,
+)
+from summary_comp.runtime import get_storage, open_file
+
+REPORT_DATE = "20240101"
+STORES = 300
+
+
+def arguments(paths, **kwargs):
+    """
+    The arguments of a validation of the fixtures of paths, without email unless kwargs ask for it.
+    """
+    return {**dict(
+        env = "Test",
+        market = "us",
+        portal_report_path = paths["portal_report_path"],
+        GPT_report_path = paths["GPT_report_path"],
+        summary_report_path = paths["summary_report_path"],
+        portal_excel_sheet_names = SHEET_NAMES,
+        path_prefixes = PATH_PREFIXES,
+        secret_name = "email-secret",
+        region_name = "eu-west-1",
+        email_port = 0,
+        receiver_email = ["receiver@example.com"],
+        send_notification = False,
+    ), **kwargs}
+
+
+def read_report(path):
+    with open_file(path) as f:
+        return pd.read_excel(f, sheet_name=None)
+
+
+@pytest.fixture
+def paths(runtime_context):
+    return write_fixtures("memory://bucket/", REPORT_DATE, STORES, mismatch_rate=0.05, missing_rate=0.01)
+
+
+def test_reports_match_the_step_by_step_comparison(paths):
+    message_dict = generate_validation_report(**arguments(paths))
+
+    portal_overall, portal_per_store, GPT_overall, GPT_per_store, *_ = read_files(
+        paths["portal_report_path"], paths["GPT_report_path"], SHEET_NAMES, PATH_PREFIXES,
+    )
+    expected_overall = evaluate_overall_checks(GPT_overall, portal_overall)
+    expected_stores = store_level_summary(GPT_per_store, portal_per_store)
+    report = read_report(message_dict["report path"])
+    pd.testing.assert_frame_equal(report["PMIX_Overall_Summary"], expected_overall, check_dtype=False)
+    store_report = report["Daily_PMIX_TotXStore"]
+    assert list(store_report.columns) == list(expected_stores.columns)
+    for column in expected_stores.columns:
+        if isinstance(expected_stores[column].dtype, pd.CategoricalDtype):
+            assert store_report[column].fillna("").tolist() == expected_stores[column].astype(str).tolist(), column
+        else:
+            np.testing.assert_allclose(store_report[column], expected_stores[column].astype("float64"), rtol=1e-12, err_msg=column)
+    assert message_dict["store summary status"] == "FAIL"
+
+
+def test_concurrent_validations_match_sequential_ones(runtime_context):
+    markets = {market: write_fixtures(f"memory://{market}/", REPORT_DATE, STORES, mismatch_rate=rate, seed=seed) for market, rate, seed in [("us", 0.05, 0), ("ca", 0, 1), ("ir", 0.2, 2)]}
+
+    async def validate_all():
+        return await asyncio.gather(*[generate_validation_report_async(**arguments(paths, market=market)) for market, paths in markets.items()])
+
+    concurrent = asyncio.run(validate_all())
+    concurrent_reports = [read_report(message_dict["report path"]) for message_dict in concurrent]
+    sequential = [generate_validation_report(**arguments(paths, market=market)) for market, paths in markets.items()]
+
+    assert concurrent == sequential
+    assert [message_dict["store summary status"] for message_dict in sequential] == ["FAIL", "PASS", "FAIL"]
+    for message_dict, report in zip(sequential, concurrent_reports):
+        for sheet_name, sheet in read_report(message_dict["report path"]).items():
+            pd.testing.assert_frame_equal(sheet, report[sheet_name])
+
+
+# asyncio.run refuses the coroutine of the validation without awaiting it
+@pytest.mark.filterwarnings("ignore:coroutine 'generate_validation_report_async' was never awaited")
+def test_sync_entry_point_cannot_run_in_an_event_loop(paths):
+    async def validate():
+        generate_validation_report(**arguments(paths))
+
+    with pytest.raises(RuntimeError, match="cannot be called from a running event loop"):
+        asyncio.run(validate())
+    gc.collect()
+
+
+def test_unknown_output_format(paths):
+    with pytest.raises(ValueError, match="Unknown output formats"):
+        generate_validation_report(**arguments(paths, output_formats=["csv"]))
+
+
+def test_missing_GPT_file_sends_the_error(paths, smtp_sink):
+    path = f"{paths['GPT_report_path']}{PATH_PREFIXES['GPT_summary_per_store_path_prefix']}{REPORT_DATE}.txt.gz"
+    del get_storage(path).files[path]
+
+    with SMTPSession("email-secret", "eu-west-1", smtp_sink.port, use_ssl=False) as smtp_session:
+        message_dict = generate_validation_report(**arguments(paths, email_port=smtp_sink.port, send_notification=True, smtp_session=smtp_session))
+
+    assert message_dict["subject"] == f"Error in PMIX ( us ) Summary Comparison {REPORT_DATE}"
+    assert message_dict["error"] == f"File not found in the path : {path}"
+    assert len(smtp_sink.messages) == 1
+    assert not get_storage(paths["summary_report_path"]).list(paths["summary_report_path"])
+
+
+def test_failed_secret_lookup_is_raised(monkeypatch, runtime_context, paths):
+    def secret(secret_name, region_name, refresh=False):
+        raise RuntimeError("AccessDeniedException")
+
+    monkeypatch.setattr(runtime_context, "secret", secret)
+    with pytest.raises(RuntimeError, match="AccessDeniedException"):
+        generate_validation_report(**arguments(paths, send_notification=True))
+
+
+def test_failed_comparison_is_raised(monkeypatch, paths):
+    def evaluate_overall_checks(*args):
+        raise KeyError("Overall_Net_Sales")
+
+    monkeypatch.setattr(process_function, "evaluate_overall_checks", evaluate_overall_checks)
+    with pytest.raises(KeyError, match="Overall_Net_Sales"):
+        generate_validation_report(**arguments(paths))
+
+
+def test_failed_xlsx_output_is_raised(monkeypatch, paths):
+    def save_reports(*args):
+        raise OSError("bucket not writable")
+
+    monkeypatch.setattr(process_function, "save_reports", save_reports)
+    with pytest.raises(OSError, match="bucket not writable"):
+        generate_validation_report(**arguments(paths, output_formats=["xlsx", "parquet"]))
+
+
+def test_failed_additional_outputs_are_reported(monkeypatch, paths, smtp_sink):
+    def save_reports_parquet(*args):
+        raise OSError("parquet not writable")
+
+    def append(*args):
+        raise OSError("history not writable")
+
+    monkeypatch.setattr(process_function, "save_reports_parquet", save_reports_parquet)
+    monkeypatch.setattr(process_function.HistoryStore, "append", append)
+    history_path = "memory://bucket/history/"
+
+    with SMTPSession("email-secret", "eu-west-1", smtp_sink.port, use_ssl=False) as smtp_session:
+        message_dict = generate_validation_report(**arguments(
+            paths, output_formats=["xlsx", "parquet"], history_path=history_path, email_port=smtp_sink.port, send_notification=True, smtp_session=smtp_session,
+        ))
+
+    assert message_dict["parquet path"] == "ERROR OSError: parquet not writable"
+    assert message_dict["history path"] == "ERROR OSError: history not writable"
+    assert message_dict["report path"].endswith(f"PMIX_Validation_{REPORT_DATE}.xlsx")
+    # the email is still sent, with the report attached
+    assert len(smtp_sink.messages) == 1
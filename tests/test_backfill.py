@@ -0,0 +1,104 @@
+"""
+Tests of summary_comp.backfill: a backfill over a date range run with --root on local fixtures,
+the reports it validates, the dates it reports with missing GPT files and its digest email.
+"""
+import json
+import os
+
+import pytest
+
+from conftest import PATH_PREFIXES, SHEET_NAMES, write_fixtures
+from summary_comp import backfill
+
+CONFIG = {
+    "ENV": "Test",
+    "secret_name": "email-secret",
+    "region_name": "eu-west-1",
+    "email_port": 465,
+    "receiver_email": ["receiver@example.com"],
+    "cc_recipients": ["cc@example.com"],
+    "paths": {
+        "us": {"source_bucket": "portal-us", "GPT_file_path": "s3://gpt-us/gpt/", "output_s3_path": "s3://reports-us/reports/"},
+        "italy": {"source_bucket": "portal-it", "GPT_file_path": "s3://gpt-it/gpt/", "output_s3_path": "s3://reports-it/reports/"},
+    },
+    "constants": {"portal_excel_sheet_names": SHEET_NAMES, "path_prefixes": PATH_PREFIXES},
+}
+
+
+@pytest.fixture
+def digests(monkeypatch):
+    """
+    The digest emails of the backfill, replaced by a stub keeping their arguments.
+    """
+    digests = []
+
+    def send_email_from_secret(**kwargs):
+        digests.append(kwargs)
+
+    monkeypatch.setattr(backfill, "send_email_from_secret", send_email_from_secret)
+    return digests
+
+
+@pytest.fixture
+def root(runtime_context, tmp_path):
+    """
+    The buckets of CONFIG under a local directory: the reports of the us market from 20240101 to
+    20240103 (20240103 without GPT's TotXStore file) and 20240201, out of the range, and one report
+    of the italy market.
+    """
+    with open(runtime_context.config_path, "w") as f:
+        json.dump(CONFIG, f)
+    root = tmp_path / "s3"
+    for report_date in ("20240101", "20240102", "20240103", "20240201"):
+        paths = write_fixtures(str(root / "gpt-us"), report_date, 100, mismatch_rate=0.05, seed=int(report_date))
+    os.remove(f"{paths['GPT_report_path']}{PATH_PREFIXES['GPT_summary_per_store_path_prefix']}20240103.txt.gz")
+    write_fixtures(str(root / "gpt-it"), "20240102", 100, mismatch_rate=0)
+    return root
+
+
+def run_backfill(runtime_context, root, *args):
+    return backfill.main([
+        "--start-date", "2024-01-01", "--end-date", "2024-01-31", "--config", runtime_context.config_path,
+        "--portal-path", "us=s3://gpt-us/portal/", "--portal-path", "italy=s3://gpt-it/portal/",
+        "--root", str(root), "--workers", "2", *args,
+    ])
+
+
+def test_backfill_validates_the_reports_of_the_range(runtime_context, root, digests):
+    message_dict = run_backfill(runtime_context, root)
+
+    # the jobs: the reports of the range with both GPT files
+    assert message_dict["reports validated"] == "3"
+    assert sorted(name for name in message_dict if name.startswith(("us ", "italy "))) == ["italy 20240102", "us 20240101", "us 20240102", "us 20240103"]
+    for name in ("us 20240101", "us 20240102", "italy 20240102"):
+        market, report_date = name.split()
+        bucket = "reports-us" if market == "us" else "reports-it"
+        report_path = os.path.join(str(root), bucket, "reports", f"PMIX_Validation_{report_date}.xlsx")
+        assert message_dict[name].endswith(f"report {report_path}")
+        assert os.path.exists(report_path)
+    assert message_dict["italy 20240102"].startswith("overall summary PASS, store summary PASS")
+    assert message_dict["reports failed"] == "2"
+    # the missing GPT files
+    assert message_dict["reports with missing GPT files"] == "1"
+    assert message_dict["us 20240103"] == "GPT files not found: Daily_Pmix_TotXStore_20240103.txt.gz"
+
+    # a single digest email, without attachment
+    assert len(digests) == 1
+    assert digests[0]["message_dict"] == message_dict
+    assert digests[0]["message_dict"]["subject"] == "PMIX Summary Comparison Backfill 2024-01-01 to 2024-01-31"
+    assert digests[0]["receiver_email"] == ["receiver@example.com"]
+    assert digests[0]["cc_recipients"] == ["cc@example.com"]
+    assert digests[0]["attachment_paths"] == []
+
+
+def test_backfill_of_one_market_without_email(runtime_context, root, digests):
+    message_dict = run_backfill(runtime_context, root, "--markets", "italy", "--no-email")
+
+    assert message_dict["reports validated"] == "1"
+    assert message_dict["reports with missing GPT files"] == "0"
+    assert digests == []
+
+
+def test_backfill_of_an_unknown_market(runtime_context, root, digests):
+    with pytest.raises(SystemExit, match="Unknown market"):
+        run_backfill(runtime_context, root, "--markets", "france")
@@ -0,0 +1,67 @@
+"""
+Tests of summary_comp.build: the bundle of a Lambda holds its entry point and config next to the
+summary_comp package, the handler can be imported from it, and a config that cannot be deployed
+fails the build.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+from conftest import REPO_DIR
+from summary_comp import build
+
+
+def test_every_lambda_is_found():
+    assert build.find_lambdas() == ["IR_summary_comp", "US_summary_comp"]
+
+
+@pytest.mark.parametrize("lambda_name", ["US_summary_comp", "IR_summary_comp"])
+def test_bundle_runs_the_handler(lambda_name, tmp_path):
+    bundle_path = build.build_bundle(os.path.join(REPO_DIR, lambda_name), str(tmp_path / "dist"))
+
+    assert bundle_path == str(tmp_path / "dist" / f"{lambda_name}.zip")
+    with zipfile.ZipFile(bundle_path) as bundle:
+        names = bundle.namelist()
+        bundle.extractall(tmp_path / "lambda")
+    assert names[:2] == ["lambda_function.py", "lambda_config.json"]
+    assert "summary_comp/handler.py" in names and "summary_comp/__init__.py" in names
+    assert not [name for name in names if "__pycache__" in name or name.startswith("tests/")]
+    # the handler is imported from the bundle only, as the Lambda runtime does
+    completed = subprocess.run(
+        [sys.executable, "-c", "import lambda_function, summary_comp; print(lambda_function.lambda_handler({'Records': []}, None)['statusCode'], summary_comp.__file__)"],
+        cwd=tmp_path / "lambda", capture_output=True, text=True, env={**os.environ, "PYTHONPATH": ""},
+    )
+    assert completed.returncode == 0, completed.stderr
+    status_code, package_file = completed.stdout.split()
+    assert status_code == "400"
+    assert package_file.startswith(str(tmp_path / "lambda"))
+
+
+def test_bundle_is_reproducible(tmp_path):
+    first = build.build_bundle(os.path.join(REPO_DIR, "US_summary_comp"), str(tmp_path / "first"))
+    second = build.build_bundle(os.path.join(REPO_DIR, "US_summary_comp"), str(tmp_path / "second"))
+
+    with open(first, "rb") as f, open(second, "rb") as g:
+        assert f.read() == g.read()
+
+
+@pytest.mark.parametrize("config, error", [
+    ("{", "not valid JSON"),
+    (json.dumps({"paths": {}, "constants": {}, "secret_name": "s", "region_name": "r", "receiver_email": []}), "has no market"),
+    (json.dumps({"paths": {"us": {"source_bucket": "b"}}, "constants": {}, "secret_name": "s", "region_name": "r", "receiver_email": []}), "GPT_file_path"),
+    (json.dumps({"paths": {}}), "has no constants, secret_name, region_name, receiver_email"),
+])
+def test_config_that_cannot_be_deployed_fails_the_build(config, error, tmp_path):
+    lambda_dir = tmp_path / "Broken_summary_comp"
+    lambda_dir.mkdir()
+    shutil.copy(os.path.join(REPO_DIR, "US_summary_comp", "lambda_function.py"), lambda_dir)
+    (lambda_dir / "lambda_config.json").write_text(config)
+
+    with pytest.raises(ValueError, match=error):
+        build.build_bundle(str(lambda_dir), str(tmp_path / "dist"))
+    assert not (tmp_path / "dist").exists()
@@ -0,0 +1,110 @@
+"""
+Tests of the check registry: the validation of the check definitions by load_checks, and the
+overall and store level comparisons driven by it (evaluate_overall_checks, update_status).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from summary_comp.process_function import (
+    DEFAULT_CHECKS, OVERALL_SUMMARY_COLUMNS, compare_columns, evaluate_overall_checks, load_checks, store_check_columns, update_status,
+)
+
+CHECK = {"name": "units", "gpt_column": "units", "portal_column": "#units", "level": "overall"}
+
+
+def test_default_checks_are_filled_in():
+    registry = load_checks()
+
+    assert [check["name"] for check in registry] == [check["name"] for check in DEFAULT_CHECKS]
+    assert registry[0] == {**DEFAULT_CHECKS[0], "tolerance": 0.0005, "mode": "relative", "decimals": None}
+    # the values of the config are kept
+    assert load_checks([{**CHECK, "tolerance": 2, "mode": "absolute"}])[0]["tolerance"] == 2
+    assert load_checks([]) == []
+
+
+@pytest.mark.parametrize("check, error", [
+    ({"name": "units", "gpt_column": "units", "level": "overall"}, r"missing the keys \['portal_column'\]"),
+    ({**CHECK, "level": "region"}, "Unknown level 'region'"),
+    ({**CHECK, "mode": "percent"}, "Unknown mode 'percent'"),
+    ({**CHECK, "decimals": -1}, "must be a non-negative integer, got -1"),
+    ({**CHECK, "decimals": 2.0}, "must be a non-negative integer, got 2.0"),
+    ({**CHECK, "decimals": True}, "must be a non-negative integer, got True"),
+])
+def test_invalid_checks_are_rejected(check, error):
+    with pytest.raises(ValueError, match=error):
+        load_checks([CHECK, check])
+
+
+def overall(checks, GPT_values, portal_values):
+    """
+    Run evaluate_overall_checks on one-row summaries, indexed by check name.
+    """
+    return evaluate_overall_checks(pd.DataFrame([GPT_values]), pd.DataFrame([portal_values]), checks).set_index("Check")
+
+
+def test_overall_checks_statuses():
+    checks = [
+        {"name": "stores", "gpt_column": "stores", "portal_column": "#stores", "level": "overall"},
+        {"name": "rows", "gpt_column": "rows", "portal_column": "#rows", "level": "overall"},
+        {"name": "items", "gpt_column": "items", "portal_column": "#items", "level": "overall", "mode": "absolute", "tolerance": 2},
+        {"name": "days", "gpt_column": "days", "portal_column": "NA", "level": "overall"},
+        {"name": "net sales", "gpt_column": "sales", "portal_column": "#sales", "level": "overall", "decimals": 2},
+        # the store checks are not overall checks
+        {"name": "store units", "gpt_column": "units", "portal_column": "#units", "level": "store"},
+    ]
+    summary = overall(
+        checks,
+        {"stores": 10000, "rows": 10000, "items": 450, "days": 7, "sales": 2000.004},
+        {"#stores": 9995, "#rows": 9994, "#items": 453, "#sales": 1999.006},
+    )
+
+    assert list(summary.reset_index().columns) == OVERALL_SUMMARY_COLUMNS
+    assert list(summary.index) == ["stores", "rows", "items", "days", "net sales"]
+    # 5 and 6 rows off 10000, at 0.05% the tolerance is 5
+    assert summary.loc["stores", OVERALL_SUMMARY_COLUMNS[4]] == "PASS"
+    assert summary.loc["rows", OVERALL_SUMMARY_COLUMNS[4]] == "FAIL"
+    # 3 items off, over the absolute tolerance of 2
+    assert summary.loc["items", OVERALL_SUMMARY_COLUMNS[4]] == "FAIL"
+    assert summary.loc["items", "Difference"] == -3
+    # no portal column: the GPT value only
+    assert summary.loc["days", "GPT"] == 7
+    assert np.isnan(summary.loc["days", "Portal"]) and pd.isna(summary.loc["days", OVERALL_SUMMARY_COLUMNS[4]])
+    # the amounts are rounded to cents, 2000.00 - 1999.01 is 0.99, within 0.05% of 2000
+    assert summary.loc["net sales", "GPT"] == 2000.0
+    assert summary.loc["net sales", "Difference"] == pytest.approx(0.99)
+    assert summary.loc["net sales", OVERALL_SUMMARY_COLUMNS[4]] == "PASS"
+
+
+def test_overall_values_are_truncated_like_compare_columns():
+    GPT_df, portal_df = pd.DataFrame([{"units": 1000.9}]), pd.DataFrame([{"#units": 999.2}])
+    summary = evaluate_overall_checks(GPT_df, portal_df, [CHECK])
+
+    name, GPT_value, portal_value, diff, status = compare_columns("units", "#units", GPT_df, portal_df)
+    assert summary.iloc[0].tolist() == ["units", GPT_value, portal_value, diff, str(status)]
+    assert summary["GPT"].dtype == "int64"
+
+
+def test_overall_check_of_a_missing_column():
+    summary = overall([CHECK], {"other": 1}, {"#units": 100})
+
+    assert np.isnan(summary.loc["units", "GPT"]) and summary.loc["units", "Portal"] == 100
+    assert pd.isna(summary.loc["units", OVERALL_SUMMARY_COLUMNS[4]])
+
+
+def test_store_checks_follow_the_registry():
+    checks = load_checks([
+        {"name": "Units", "gpt_column": "units", "portal_column": "units", "level": "store", "mode": "absolute", "tolerance": 1},
+        {"name": "Sales", "gpt_column": "sales", "portal_column": "sales", "level": "store", "tolerance": 0.01},
+    ])
+    columns = [store_check_columns(check) for check in checks]
+    summary_store = pd.DataFrame({
+        columns[0]["GPT"]: [10.0, 10.0, 10.0], columns[0]["deviation"]: [1.0, 2.0, np.nan],
+        columns[1]["GPT"]: [100.0, 100.0, 100.0], columns[1]["deviation"]: [1.0, -1.5, 0.0],
+    })
+
+    status = update_status(summary_store, checks)
+
+    assert list(status.columns) == [column["status"] for column in columns]
+    assert status[columns[0]["status"]].tolist() == ["PASS", "FAIL", ""]
+    assert status[columns[1]["status"]].tolist() == ["PASS", "FAIL", "PASS"]
@@ -0,0 +1,142 @@
+"""
+Tests of the compact types of the store level summary (nullable Int32 store ids, float32 values
+where exact, categorical statuses): the summary and everything built from it, the xlsx and parquet
+reports, the store delta and the history, are the same as with the float64 and object types it
+had before, including the stores whose id is missing.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import synthetic_reports
+from summary_comp.history import store_history_frame
+from summary_comp.process_function import (
+    GPT_STORE_KEY, PORTAL_STORE_KEY, STATUS_CATEGORIES, STORE_MATCH_CATEGORIES, check_deviations, check_status_codes,
+    evaluate_overall_checks, load_checks, match_stores, open_file, save_reports, save_reports_parquet, store_check_columns,
+    store_delta, store_level_summary,
+)
+
+CHECKS = [check for check in load_checks() if check["level"] == "store"]
+COLUMNS = [store_check_columns(check) for check in CHECKS]
+
+
+def reports(seed):
+    """
+    Synthetic reports of 300 stores, with a missing or invalid store id in both reports.
+    """
+    reports = synthetic_reports(300, mismatch_rate=0.05, missing_rate=0.02, seed=seed)
+    GPT, portal = reports["GPT_summary_per_store"], reports["portal_summary_per_store"]
+    GPT[GPT_STORE_KEY] = GPT[GPT_STORE_KEY].astype("float64")
+    GPT.loc[[3, 7], GPT_STORE_KEY] = np.nan
+    portal[PORTAL_STORE_KEY] = portal[PORTAL_STORE_KEY].astype(object)
+    portal.loc[5, PORTAL_STORE_KEY] = "n/a"
+    return reports
+
+
+def wide_summary(GPT, portal):
+    """
+    The store level summary with the types it had before the compact ones: Int64 store ids, float64
+    values and object statuses.
+    """
+    match = match_stores(GPT[GPT_STORE_KEY], portal[PORTAL_STORE_KEY])
+    rows = {"GPT": match["GPT_rows"], "portal": match["portal_rows"]}
+    values = {}
+    for key, frame, column_key in (("GPT", GPT, "gpt_column"), ("portal", portal, "portal_column")):
+        matched = frame[[check[column_key] for check in CHECKS]].to_numpy(dtype="float64")[np.maximum(rows[key], 0)]
+        matched[rows[key] < 0] = np.nan
+        values[key] = matched
+    values["deviation"] = check_deviations(CHECKS, values["GPT"], values["portal"])
+    statuses = np.array(STATUS_CATEGORIES, dtype=object)[check_status_codes(CHECKS, values["GPT"], values["deviation"])]
+    frame = {"Global_Store_Id": pd.array(np.where(match["store_ids"] == np.iinfo("int64").min, None, match["store_ids"]), dtype="Int64")}
+    for key in ("GPT", "portal", "deviation"):
+        for i, column in enumerate(COLUMNS):
+            frame[column[key]] = values[key][:, i]
+    for i, column in enumerate(COLUMNS):
+        frame[column["status"]] = statuses[:, i]
+    match_codes = np.select([rows["GPT"] < 0, rows["portal"] < 0], [2, 1], default=0)
+    frame["Store Match"] = np.array(STORE_MATCH_CATEGORIES, dtype=object)[match_codes]
+    return pd.DataFrame(frame)
+
+
+@pytest.fixture(scope="module")
+def summaries():
+    summaries = {}
+    for name, seed in (("previous", 1), ("current", 2)):
+        report = reports(seed)
+        summaries[name] = {
+            "compact": store_level_summary(report["GPT_summary_per_store"], report["portal_summary_per_store"], CHECKS),
+            "wide": wide_summary(report["GPT_summary_per_store"], report["portal_summary_per_store"]),
+            "overall": evaluate_overall_checks(report["GPT_overall_summary"], report["portal_overall_summary"]),
+        }
+    return summaries
+
+
+def as_wide(frame):
+    """
+    Convert the compact columns of a frame to the wide types, to compare their values.
+    """
+    return frame.astype({
+        column: "Int64" if column == "Global_Store_Id" else "float64" if pd.api.types.is_float_dtype(frame[column]) else str
+        for column in frame.columns
+    })
+
+
+def test_summary_is_compact(summaries):
+    compact = summaries["current"]["compact"]
+
+    assert compact["Global_Store_Id"].dtype == "Int32"
+    assert compact["Global_Store_Id"].isna().sum() == 3
+    assert compact[COLUMNS[0]["GPT"]].dtype == "float32"
+    assert compact[COLUMNS[1]["GPT"]].dtype == "float64"
+    assert compact[COLUMNS[0]["status"]].dtype == "category"
+
+
+def test_summary_values_are_unchanged(summaries):
+    for summary in summaries.values():
+        pd.testing.assert_frame_equal(as_wide(summary["compact"]), summary["wide"])
+
+
+@pytest.mark.parametrize("excel_engine", ["openpyxl", "xlsxwriter"])
+def test_xlsx_report_is_unchanged(summaries, runtime_context, excel_engine):
+    pytest.importorskip(excel_engine)
+    current = summaries["current"]
+    sheets = {}
+    for kind in ("compact", "wide"):
+        path = f"memory://reports/{kind}.xlsx"
+        save_reports(path, current["overall"], current[kind], excel_engine)
+        with open_file(path) as f:
+            sheets[kind] = pd.read_excel(f, sheet_name=None)
+
+    assert list(sheets["compact"]) == ["PMIX_Overall_Summary", "Daily_PMIX_TotXStore"]
+    for name in sheets["compact"]:
+        pd.testing.assert_frame_equal(sheets["compact"][name], sheets["wide"][name])
+
+
+def test_parquet_report_is_unchanged(summaries, runtime_context):
+    pytest.importorskip("pyarrow")
+    current = summaries["current"]
+    frames = {}
+    for kind in ("compact", "wide"):
+        paths = save_reports_parquet(f"memory://{kind}/", "us", "20240101", current["overall"], current[kind])
+        with open_file(paths["Daily_PMIX_TotXStore"]) as f:
+            frames[kind] = pd.read_parquet(f)
+
+    assert frames["compact"]["Global_Store_Id"].isna().sum() == 3
+    pd.testing.assert_frame_equal(as_wide(frames["compact"]), as_wide(frames["wide"]))
+
+
+def test_store_delta_is_unchanged(summaries):
+    compact = store_delta(summaries["previous"]["compact"], summaries["current"]["compact"], CHECKS)
+    wide = store_delta(summaries["previous"]["wide"], summaries["current"]["wide"], CHECKS)
+
+    assert len(wide) > 0
+    pd.testing.assert_frame_equal(as_wide(compact), as_wide(wide))
+
+
+def test_history_is_unchanged(summaries):
+    current = summaries["current"]
+    compact = store_history_frame(current["compact"], CHECKS)
+    wide = store_history_frame(current["wide"], CHECKS)
+
+    assert compact["Global_Store_Id"].isna().sum() == 3 * len(CHECKS)
+    pd.testing.assert_frame_equal(compact, wide)
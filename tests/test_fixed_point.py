@@ -0,0 +1,116 @@
+"""
+Tests of the fixed point path of the monetary checks (a check with "decimals", see load_checks):
+its deviations and statuses against a decimal.Decimal reference on random amounts, the exact
+tolerance boundary, and the int64 overflow guards.
+"""
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from conftest import draw_cents
+from summary_comp.process_function import (
+    FIXED_POINT_MAX_UNITS, _exceeds_tolerance, check_deviations, check_status_codes, load_checks, to_fixed_point,
+)
+
+CHECKS = [
+    {"name": "relative", "gpt_column": "GPT", "portal_column": "portal", "level": "store", "tolerance": 0.0005, "mode": "relative"},
+    {"name": "absolute", "gpt_column": "GPT", "portal_column": "portal", "level": "store", "tolerance": 0.25, "mode": "absolute"},
+]
+FIXED_CHECKS = load_checks([{**check, "decimals": 2} for check in CHECKS])
+
+
+def reference_statuses(GPT_cents, portal_cents, check):
+    """
+    The deviations and status codes of a check computed with decimal.Decimal, one store at a time.
+    """
+    tolerance = Decimal(str(check["tolerance"]))
+    deviations, statuses = [], []
+    for GPT, portal in zip(GPT_cents.tolist(), portal_cents.tolist()):
+        GPT, portal = Decimal(GPT) / 100, Decimal(portal) / 100
+        deviation = GPT - portal
+        bound = tolerance * GPT if check["mode"] == "relative" else tolerance
+        deviations.append(float(deviation))
+        statuses.append(1 if abs(deviation) > bound else 0)
+    return np.array(deviations), np.array(statuses, dtype="int8")
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("case", ["random", "boundary", "large"])
+def test_fixed_point_matches_decimal(case, seed):
+    GPT_cents, portal_cents = draw_cents(case, 5000, np.random.default_rng(seed))
+    # the amounts as they are read from the reports, e.g. 1234.56 parsed to the nearest float64
+    GPT_values = np.repeat((GPT_cents / 100)[:, np.newaxis], len(CHECKS), axis=1)
+    portal_values = np.repeat((portal_cents / 100)[:, np.newaxis], len(CHECKS), axis=1)
+
+    deviation = check_deviations(FIXED_CHECKS, GPT_values, portal_values)
+    status_codes = check_status_codes(FIXED_CHECKS, GPT_values, deviation)
+
+    for i, check in enumerate(CHECKS):
+        expected_deviation, expected_status = reference_statuses(GPT_cents, portal_cents, check)
+        np.testing.assert_array_equal(deviation[:, i], expected_deviation)
+        np.testing.assert_array_equal(status_codes[:, i], expected_status)
+
+
+def test_float64_misses_the_boundary():
+    # 0.05% of 98760.00 is exactly 49.38, which float64 computes as 49.38000000000466
+    GPT_values, portal_values = np.array([[98760.0]]), np.array([[98710.62]])
+    float_checks = load_checks(CHECKS[:1])
+
+    float_deviation = check_deviations(float_checks, GPT_values, portal_values)
+    fixed_deviation = check_deviations(FIXED_CHECKS[:1], GPT_values, portal_values)
+
+    assert check_status_codes(float_checks, GPT_values, float_deviation)[0, 0] == 1
+    assert fixed_deviation[0, 0] == 49.38
+    assert check_status_codes(FIXED_CHECKS[:1], GPT_values, fixed_deviation)[0, 0] == 0
+
+
+@pytest.mark.parametrize("deviation_units, exceeds", [(99, False), (100, False), (101, True), (-100, False), (-101, True)])
+def test_relative_tolerance_boundary(deviation_units, exceeds):
+    # 0.05% of 2000.00 is exactly 100 cents
+    GPT_units = np.array([200_000], dtype="int64")
+    assert _exceeds_tolerance(FIXED_CHECKS[0], GPT_units, np.array([deviation_units], dtype="int64"))[0] == exceeds
+
+
+@pytest.mark.parametrize("deviation_units, exceeds", [(24, False), (25, False), (26, True), (-25, False), (-26, True)])
+def test_absolute_tolerance_boundary(deviation_units, exceeds):
+    # 0.25 is 25 cents, whatever the GPT amount
+    GPT_units = np.array([123_456_789], dtype="int64")
+    assert _exceeds_tolerance(FIXED_CHECKS[1], GPT_units, np.array([deviation_units], dtype="int64"))[0] == exceeds
+
+
+def test_zero_tolerance_fails_any_deviation():
+    check = load_checks([{**CHECKS[1], "tolerance": 0, "decimals": 2}])[0]
+    assert _exceeds_tolerance(check, np.array([100, 100]), np.array([0, 1])).tolist() == [False, True]
+
+
+def test_missing_values_have_an_empty_status():
+    GPT_values = np.array([[np.nan, 10.0], [10.0, np.nan]])
+    portal_values = np.array([[10.0, 10.0], [10.0, 10.0]])
+    deviation = check_deviations(FIXED_CHECKS, GPT_values, portal_values)
+
+    assert np.isnan(deviation[0, 0]) and np.isnan(deviation[1, 1])
+    assert check_status_codes(FIXED_CHECKS, GPT_values, deviation).tolist() == [[2, 0], [0, 2]]
+
+
+def test_to_fixed_point_rounds_to_the_nearest_unit():
+    units = to_fixed_point(np.array([1234.56, 0.1 + 0.2, -0.015, np.nan]), 2)
+    assert units.dtype == "int64"
+    assert units.tolist() == [123456, 30, -2, 0]
+
+
+def test_to_fixed_point_overflow_guard():
+    largest = FIXED_POINT_MAX_UNITS / 100
+    assert to_fixed_point(np.array([largest, -largest]), 2).tolist() == [FIXED_POINT_MAX_UNITS, -FIXED_POINT_MAX_UNITS]
+    with pytest.raises(ValueError, match="fixed point"):
+        to_fixed_point(np.array([largest * 4]), 2)
+    with pytest.raises(ValueError, match="fixed point"):
+        to_fixed_point(np.array([-largest * 4]), 2)
+
+
+def test_exceeds_tolerance_overflow_guard():
+    # a tolerance of 10**-7 multiplies the units by 10**7, over int64 for 2**50 units
+    check = load_checks([{**CHECKS[0], "tolerance": 0.0000001, "decimals": 2}])[0]
+    with pytest.raises(ValueError, match="too large"):
+        _exceeds_tolerance(check, np.array([2 ** 50], dtype="int64"), np.array([1], dtype="int64"))
+    assert not _exceeds_tolerance(check, np.array([2 ** 30], dtype="int64"), np.array([1], dtype="int64"))[0]
@@ -0,0 +1,59 @@
+"""
+Tests of the synthetic inputs of conftest.py the benchmarks run the pipeline on: a validation of
+them, end to end to the SMTP sink, finds the stores they were generated with.
+"""
+import pandas as pd
+
+from conftest import PATH_PREFIXES, SHEET_NAMES, synthetic_reports, write_fixtures
+from summary_comp.mail import SMTPSession
+from summary_comp.process_function import GPT_STORE_KEY, PORTAL_STORE_KEY, generate_validation_report, load_checks, store_check_columns
+from summary_comp.runtime import file_size, open_file
+
+REPORT_DATE = "20240101"
+STORES = 1000
+
+
+def failing_stores(reports):
+    """
+    Count the stores of both reports whose GPT values differ from the portal's.
+    """
+    checks = [check for check in load_checks() if check["level"] == "store"]
+    merged = reports["GPT_summary_per_store"].merge(reports["portal_summary_per_store"], left_on=GPT_STORE_KEY, right_on=PORTAL_STORE_KEY)
+    return int(pd.concat([merged[check["gpt_column"]] != merged[check["portal_column"]] for check in checks], axis=1).any(axis=1).sum())
+
+
+def test_synthetic_reports_have_the_columns_of_the_checks():
+    reports = synthetic_reports(STORES, mismatch_rate=0.05, missing_rate=0.01)
+    GPT_ids = set(reports["GPT_summary_per_store"][GPT_STORE_KEY])
+    portal_ids = set(reports["portal_summary_per_store"][PORTAL_STORE_KEY])
+
+    assert len(portal_ids) == STORES
+    assert len(portal_ids - GPT_ids) == len(GPT_ids - portal_ids) == STORES * 0.01
+    assert 0 < failing_stores(reports) < STORES * 0.1
+    for check in load_checks():
+        if check["level"] == "store":
+            assert check["gpt_column"] in reports["GPT_summary_per_store"]
+            assert check["portal_column"] in reports["portal_summary_per_store"]
+        else:
+            assert check["portal_column"] in reports["portal_overall_summary"]
+
+
+def test_fixtures_validate_end_to_end(runtime_context, smtp_sink):
+    paths = write_fixtures("memory://bucket/", REPORT_DATE, STORES, mismatch_rate=0.05, missing_rate=0.01)
+    with SMTPSession("email-secret", "eu-west-1", smtp_sink.port, use_ssl=False) as smtp_session:
+        message_dict = generate_validation_report(
+            "Test", "us", paths["portal_report_path"], paths["GPT_report_path"], paths["summary_report_path"],
+            SHEET_NAMES, PATH_PREFIXES, "email-secret", "eu-west-1", smtp_sink.port, ["receiver@example.com"],
+            smtp_session=smtp_session,
+        )
+
+    assert message_dict["stores only in GPT"] == message_dict["stores only in portal"] == "10"
+    assert message_dict["store summary status"] == "FAIL"
+    with open_file(message_dict["report path"]) as f:
+        store_summary = pd.read_excel(f, sheet_name="Daily_PMIX_TotXStore")
+    status_columns = [store_check_columns(check)["status"] for check in load_checks() if check["level"] == "store"]
+    # the reports are generated again from the same seed
+    assert (store_summary[status_columns] == "FAIL").any(axis=1).sum() == failing_stores(synthetic_reports(STORES, 0.05, 0.01))
+    # the report is attached, base64 encoded
+    assert len(smtp_sink.messages) == 1
+    assert smtp_sink.messages[0] > file_size(message_dict["report path"]) * 4 / 3
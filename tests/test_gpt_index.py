@@ -0,0 +1,115 @@
+"""
+Tests of summary_comp.gpt_index: the GPT files of a directory by report date, the relisting of a
+directory for files landing late and the wait for the files of a date, on a memory:// directory.
+"""
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from summary_comp import gpt_index
+from summary_comp.gpt_index import GPT_file_index, GPTFileIndex, parse_report_date
+from summary_comp.runtime import get_storage
+
+GPT_DIRECTORY = "memory://gpt/"
+PATH_PREFIXES = {"GPT_overall_summary_path_prefix": "Daily_Pmix_Summary_", "GPT_summary_per_store_path_prefix": "Daily_Pmix_TotXStore_"}
+REPORT_DATE = date(2024, 1, 31)
+
+
+@pytest.fixture(autouse=True)
+def indexes(monkeypatch, runtime_context):
+    monkeypatch.setattr(gpt_index, "_indexes", {})
+
+
+def put(name):
+    path = GPT_DIRECTORY + name
+    get_storage(path).put(path, b"")
+    return path
+
+
+@pytest.mark.parametrize("report_date", ["20240131", "2024-01-31", "2024_01_31", "31012024", "31-01-2024", "31_01_2024"])
+def test_parse_report_date(report_date):
+    assert parse_report_date(report_date) == REPORT_DATE
+
+
+def test_parse_report_date_rejects_other_strings():
+    assert parse_report_date("2024-31-01") is None
+    assert parse_report_date("report") is None
+
+
+def test_files_are_indexed_by_parsed_date():
+    overall = put("Daily_Pmix_Summary_2024-01-31.txt.gz")
+    store = put("Daily_Pmix_TotXStore_20240131_0215.txt.gz")
+    put("Daily_Pmix_TotXStore_20240130.txt.gz")
+    put("notes.txt")
+    index = GPTFileIndex(GPT_DIRECTORY, PATH_PREFIXES)
+
+    assert index.lookup(REPORT_DATE) == (overall, store)
+    assert index.dates() == [REPORT_DATE]
+
+
+def test_latest_delivery_of_a_date_is_used():
+    put("Daily_Pmix_Summary_20240131.txt.gz")
+    time.sleep(0.01)
+    redelivery = put("Daily_Pmix_Summary_20240131_0215.txt.gz")
+    index = GPTFileIndex(GPT_DIRECTORY, PATH_PREFIXES)
+
+    assert index.lookup(REPORT_DATE)[0] == redelivery
+
+
+def test_lookup_relists_for_a_missing_file():
+    overall = put("Daily_Pmix_Summary_20240131.txt.gz")
+    index = GPT_file_index(GPT_DIRECTORY, PATH_PREFIXES)
+    assert index.lookup(REPORT_DATE) == (overall, None)
+    listed_at = index.listed_at
+
+    store = put("Daily_Pmix_TotXStore_20240131.txt.gz")
+    # a fresh listing is reused, a missing file only lists the directory again once it is old enough
+    assert index.lookup(REPORT_DATE, relist_after=60) == (overall, None)
+    assert index.lookup(REPORT_DATE, relist_after=None) == (overall, None)
+    assert index.listed_at == listed_at
+    assert index.lookup(REPORT_DATE, relist_after=0) == (overall, store)
+    assert index.listed_at > listed_at
+
+
+def test_shared_index_is_listed_again_after_max_age():
+    index = GPT_file_index(GPT_DIRECTORY, PATH_PREFIXES)
+    assert index.dates() == []
+    put("Daily_Pmix_Summary_20240131.txt.gz")
+    put("Daily_Pmix_TotXStore_20240131.txt.gz")
+
+    assert GPT_file_index(GPT_DIRECTORY, PATH_PREFIXES) is index
+    assert index.dates() == []
+    assert GPT_file_index(GPT_DIRECTORY, PATH_PREFIXES, max_age=0).dates() == [REPORT_DATE]
+
+
+def test_wait_times_out():
+    overall = put("Daily_Pmix_Summary_20240131.txt.gz")
+    index = GPTFileIndex(GPT_DIRECTORY, PATH_PREFIXES)
+
+    start = time.monotonic()
+    assert index.wait(REPORT_DATE, timeout=0.3, poll_seconds=0.05) == (overall, None)
+    assert 0.3 <= time.monotonic() - start < 2
+
+
+def test_wait_finds_files_landing_late():
+    overall = put("Daily_Pmix_Summary_20240131.txt.gz")
+    index = GPTFileIndex(GPT_DIRECTORY, PATH_PREFIXES)
+    timer = threading.Timer(0.2, put, args=("Daily_Pmix_TotXStore_20240131.txt.gz",))
+    timer.start()
+
+    start = time.monotonic()
+    paths = index.wait(REPORT_DATE, timeout=10, poll_seconds=0.05)
+    timer.join()
+
+    assert paths == (overall, GPT_DIRECTORY + "Daily_Pmix_TotXStore_20240131.txt.gz")
+    assert time.monotonic() - start < 5
+
+
+def test_wait_without_timeout_does_not_sleep():
+    index = GPTFileIndex(GPT_DIRECTORY, PATH_PREFIXES)
+
+    start = time.monotonic()
+    assert index.wait(REPORT_DATE, timeout=0) == (None, None)
+    assert time.monotonic() - start < 1
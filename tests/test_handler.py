@@ -0,0 +1,91 @@
+"""
+Tests of summary_comp.handler: the routing of the records of S3 and SQS events to their market,
+and the failure of one record not failing the others.
+"""
+import json
+
+import pytest
+
+from summary_comp import process_function
+from summary_comp.handler import lambda_handler
+from summary_comp.runtime import key_vault
+
+CONFIG = {
+    "ENV": "Test",
+    "secret_name": "email-secret",
+    "region_name": "eu-west-1",
+    "email_port": 465,
+    "receiver_email": ["receiver@example.com"],
+    "cc_recipients": [],
+    "paths": {
+        "us": {"source_bucket": "portal-us", "GPT_file_path": "memory://gpt-us/", "output_s3_path": "memory://reports-us/"},
+        "italy": {"source_bucket": "portal-it", "GPT_file_path": "memory://gpt-it/", "output_s3_path": "memory://reports-it/"},
+    },
+    "constants": {"portal_excel_sheet_names": {}, "path_prefixes": {}},
+}
+
+
+def s3_record(bucket, key):
+    return {"s3": {"bucket": {"name": bucket}, "object": {"key": key}}}
+
+
+@pytest.fixture
+def validations(monkeypatch, runtime_context):
+    """
+    The validations run by the handler, replaced by a stub looking up the email secret as
+    generate_validation_report does.
+    """
+    with open(runtime_context.config_path, "w") as f:
+        json.dump(CONFIG, f)
+    validations = []
+
+    def generate_validation_report(**kwargs):
+        key_vault(secret_name = kwargs["secret_name"], region_name = kwargs["region_name"])
+        validations.append((kwargs["market"], kwargs["portal_report_path"]))
+        return {"subject": f"PMIX ( {kwargs['market']} ) Summary Comparison"}
+
+    monkeypatch.setattr(process_function, "generate_validation_report", generate_validation_report)
+    return validations
+
+
+def test_every_record_is_routed_to_its_market(runtime_context, validations):
+    runtime_context.put_secret("email-secret", "eu-west-1", {"EMAIL_HOST_USER": "sender@example.com"})
+    event = {"Records": [
+        s3_record("portal-us", "Daily_Dlry_Pmix_20240101.xlsx"),
+        s3_record("unknown-bucket", "Daily_Dlry_Pmix_20240101.xlsx"),
+        {"body": json.dumps({"Records": [s3_record("portal-it", "Daily_Pmix_20240101.xlsx")]})},
+    ]}
+
+    response = lambda_handler(event, None)
+
+    assert response["statusCode"] == 207
+    assert [result["statusCode"] for result in response["results"]] == [200, 400, 200]
+    assert [result.get("market") for result in response["results"]] == ["us", None, "italy"]
+    assert sorted(validations) == [
+        ("italy", "s3://portal-it/Daily_Pmix_20240101.xlsx"), ("us", "s3://portal-us/Daily_Dlry_Pmix_20240101.xlsx"),
+    ]
+
+
+def test_event_without_records():
+    assert lambda_handler({"Records": []}, None)["statusCode"] == 400
+
+
+def test_secret_lookup_failure_fails_each_record(monkeypatch, runtime_context, validations):
+    def secret(secret_name, region_name, refresh=False):
+        raise RuntimeError("AccessDeniedException")
+
+    monkeypatch.setattr(runtime_context, "secret", secret)
+    event = {"Records": [
+        s3_record("portal-us", "Daily_Dlry_Pmix_20240101.xlsx"),
+        s3_record("portal-it", "Daily_Pmix_20240101.xlsx"),
+        s3_record("unknown-bucket", "Daily_Dlry_Pmix_20240101.xlsx"),
+    ]}
+
+    response = lambda_handler(event, None)
+
+    assert response["statusCode"] == 500
+    assert [result["statusCode"] for result in response["results"]] == [500, 500, 400]
+    assert response["results"][0] == {
+        "statusCode": 500, "file": "s3://portal-us/Daily_Dlry_Pmix_20240101.xlsx", "body": "ERROR: AccessDeniedException",
+    }
+    assert validations == []
@@ -0,0 +1,91 @@
+"""
+Tests of summary_comp.history: the chronic failures of the history and their section of the email.
+"""
+import pandas as pd
+import pytest
+
+from summary_comp import history
+from summary_comp.history import HistoryStore, chronic_failures_message
+from summary_comp.process_function import OVERALL_SUMMARY_COLUMNS, load_checks, store_check_columns
+
+CHECKS = load_checks([
+    {"name": "Total Net Sales", "gpt_column": "total_net_sales", "portal_column": "sum_net_Sales", "level": "store"},
+    {"name": "Total Alacarte Units", "gpt_column": "total_units", "portal_column": "sum_alacarte_units", "level": "store"},
+])
+
+
+class FakeHistory:
+    """
+    A history whose chronic failures are given.
+    """
+
+    def __init__(self, rows):
+        self.failures = pd.DataFrame(rows, columns=["market", "Global_Store_Id", "Check", "Failures", "Last Failure", "Mean Deviation"])
+
+    def chronic_failures(self, checks, min_failures, days, end_date, markets):
+        return self.failures
+
+
+def store_summary(failing):
+    """
+    A store level summary of stores 1 to 4, with the (store id, check name) pairs of failing failing.
+    """
+    frame = {"Global_Store_Id": pd.array([1, 2, 3, 4], dtype="Int32"), "Store Match": ["Both"] * 4}
+    for check in CHECKS:
+        columns = store_check_columns(check)
+        statuses = ["FAIL" if (store_id, check["name"]) in failing else "PASS" for store_id in range(1, 5)]
+        frame[columns["GPT"]] = [100.0] * 4
+        frame[columns["portal"]] = [90.0 if status == "FAIL" else 100.0 for status in statuses]
+        frame[columns["deviation"]] = [10.0 if status == "FAIL" else 0.0 for status in statuses]
+        frame[columns["status"]] = statuses
+    return pd.DataFrame(frame)
+
+
+OVERALL_SUMMARY = pd.DataFrame([["total_rows", 10, 10, 0, "PASS"]], columns=OVERALL_SUMMARY_COLUMNS)
+
+
+def test_message_counts_and_lists_stores():
+    message = chronic_failures_message(FakeHistory([
+        ("us", 7, "Total Net Sales", 5, None, 1.0),
+        ("us", 7, "Total Alacarte Units", 4, None, 1.0),
+        ("us", 8, "Total Net Sales", 3, None, 1.0),
+    ]), "us", "20240114", {"min_failures": 3, "days": 14})
+
+    assert message == (
+        "2 store(s) failed a check on 3 or more of the last 14 days: "
+        "store 7 (Total Net Sales 5/14 days; Total Alacarte Units 4/14 days), store 8 (Total Net Sales 3/14 days)"
+    )
+
+
+def test_message_counts_the_stores_left_out(monkeypatch):
+    monkeypatch.setattr(history, "CHRONIC_FAILURES_IN_EMAIL", 2)
+    message = chronic_failures_message(FakeHistory([
+        (market, store_id, check, 3, None, 1.0)
+        for store_id in (1, 2, 3, 4) for market, check in (("us", "Total Net Sales"), ("us", "Total Alacarte Units"))
+    ]), "us", "20240114")
+
+    assert message.startswith("4 store(s) failed")
+    assert message.endswith("store 2 (Total Net Sales 3/14 days; Total Alacarte Units 3/14 days) and 2 more")
+
+
+def test_message_without_failures():
+    assert chronic_failures_message(FakeHistory([]), "us", "20240114") == "no store failed a check on 3 or more of the last 14 days"
+
+
+def test_chronic_failures_of_the_history(runtime_context):
+    pytest.importorskip("pyarrow")
+    store = HistoryStore("memory://history/")
+    # store 1 fails both checks every day, store 2 one check on two days, store 3 once
+    failing = {
+        "20240101": {(1, "Total Net Sales"), (1, "Total Alacarte Units"), (2, "Total Net Sales")},
+        "20240102": {(1, "Total Net Sales"), (1, "Total Alacarte Units"), (2, "Total Net Sales"), (3, "Total Net Sales")},
+        "20240103": {(1, "Total Net Sales"), (1, "Total Alacarte Units")},
+    }
+    for report_date, pairs in failing.items():
+        store.append("us", report_date, store_summary(pairs), OVERALL_SUMMARY, CHECKS)
+
+    failures = store.chronic_failures(min_failures=2, end_date="20240103", markets=["us"])
+    assert sorted(zip(failures["Global_Store_Id"], failures["Check"], failures["Failures"])) == [
+        (1, "Total Alacarte Units", 3), (1, "Total Net Sales", 3), (2, "Total Net Sales", 2),
+    ]
+    assert chronic_failures_message(store, "us", "20240103", {"min_failures": 2}).startswith("2 store(s) failed a check on 2 or more")
@@ -0,0 +1,92 @@
+"""
+Tests of the item engine, summary_comp.items: the matching of GPT's and the portal's items store by
+store, and the selection of the most offending items of the failing stores.
+"""
+import pandas as pd
+import pytest
+
+from conftest import ITEM_CHECKS, write_item_extracts
+from summary_comp.items import GPT_ITEM_KEY, PORTAL_ITEM_KEY, compare_item_extracts, item_level_summary
+from summary_comp.process_function import GPT_STORE_KEY, PORTAL_STORE_KEY, load_checks, store_check_columns
+
+NET_SALES, UNITS = (store_check_columns(check) for check in load_checks(ITEM_CHECKS))
+
+
+def GPT_chunk(rows):
+    return pd.DataFrame(rows, columns=[GPT_STORE_KEY, GPT_ITEM_KEY, "net_sales", "units"])
+
+
+def portal_chunk(rows):
+    return pd.DataFrame(rows, columns=[PORTAL_STORE_KEY, PORTAL_ITEM_KEY, "net_sales", "units"])
+
+
+def summary(GPT_rows, portal_rows, top_items=10):
+    # the rows are split in chunks of two, as read_item_chunks reads them
+    return item_level_summary(
+        [GPT_chunk(GPT_rows[i:i + 2]) for i in range(0, len(GPT_rows), 2)],
+        [portal_chunk(portal_rows[i:i + 2]) for i in range(0, len(portal_rows), 2)],
+        ITEM_CHECKS, top_items,
+    )
+
+
+def test_items_only_in_one_extract_fail():
+    result = summary(
+        [(1, "A", 10.0, 1.0), (1, "B", 20.0, 2.0), (2, "A", 10.0, 1.0)],
+        [(1, "A", 10.0, 1.0), (1, "C", 30.0, 3.0), (2, "A", 10.0, 1.0)],
+    )
+
+    top = result["top_items"].set_index("Item_Id")
+    assert result["items"] == 4
+    assert top["Global_Store_Id"].tolist() == [1, 1]
+    assert top.loc["B", "Item Match"] == "GPT only"
+    assert top.loc["C", "Item Match"] == "Portal only"
+    assert top.loc["B", NET_SALES["GPT"]] == 20.0 and pd.isna(top.loc["B", NET_SALES["portal"]])
+    assert pd.isna(top.loc["C", NET_SALES["GPT"]]) and top.loc["C", NET_SALES["portal"]] == 30.0
+    # a missing side is not a failing check, the status is empty
+    assert top.loc["B", NET_SALES["status"]] == ""
+    assert result["stores"].to_dict("records") == [
+        {"Global_Store_Id": 1, "Items": 3, "Failing Items": 2, "Items only in GPT": 1, "Items only in portal": 1},
+    ]
+
+
+def test_rows_of_an_item_are_summed_across_chunks():
+    result = summary(
+        [(1, "A", 10.0, 1.0), (1, "B", 5.0, 1.0), (1, "A", 10.0, 1.0), (1, "B", 5.0, 1.0)],
+        [(1, "A", 20.0, 2.0), (1, "B", 10.0, 2.0)],
+    )
+
+    assert result["rows"] == {"GPT": 4, "portal": 2}
+    assert result["items"] == 2
+    assert result["top_items"].empty
+    assert result["stores"].empty
+
+
+def test_top_items_are_the_most_offending():
+    # the net sales of items A to D of store 3 are 1%, 4%, 2% and 3% off, item E passes, and item F
+    # of store 4 is off by one unit, over the zero tolerance of the units check
+    GPT_rows = [(3, item, 100.0 + offset, 1.0) for item, offset in zip("ABCDE", (1, 4, 2, 3, 0))] + [(4, "F", 100.0, 2.0)]
+    portal_rows = [(3, item, 100.0, 1.0) for item in "ABCDE"] + [(4, "F", 100.0, 1.0)]
+    result = summary(GPT_rows, portal_rows, top_items=2)
+
+    top = result["top_items"]
+    assert list(zip(top["Global_Store_Id"], top["Item_Id"], top["Rank"])) == [(3, "B", 1), (3, "D", 2), (4, "F", 1)]
+    assert top["Tolerance Multiple"].iloc[0] == pytest.approx(4 / (0.0005 * 104))
+    # a deviation over a zero tolerance ranks first and has no multiple
+    assert pd.isna(top["Tolerance Multiple"].iloc[2])
+    assert top[UNITS["status"]].tolist() == ["PASS", "PASS", "FAIL"]
+    assert result["stores"][["Global_Store_Id", "Items", "Failing Items"]].values.tolist() == [[3, 5, 4], [4, 1, 1]]
+
+
+def test_compare_item_extracts(tmp_path, runtime_context):
+    pytest.importorskip("pyarrow")
+    root = str(tmp_path) + "/"
+    write_item_extracts(root, "20240101", n_stores=30, n_items=20, mismatch_rate=0.02, stores_per_block=7)
+    path_prefixes = {"portal_path_prefix": "Daily_Dlry_Pmix_"}
+
+    result = compare_item_extracts(root + "portal/Daily_Dlry_Pmix_20240101.xlsx", root + "gpt/", path_prefixes, "20240101", ITEM_CHECKS, chunksize=50, top_items=3)
+
+    assert result["rows"] == {"GPT": 600, "portal": 600}
+    assert result["items"] == 600
+    assert len(result["stores"]) > 0
+    assert result["top_items"].groupby("Global_Store_Id")["Rank"].max().le(3).all()
+    assert result["stores"]["Failing Items"].sum() >= len(result["top_items"])
@@ -0,0 +1,52 @@
+"""
+Tests of the lazy imports of the Lambda startup path: importing the entry point of a Lambda and
+routing an event that has nothing to validate load neither pandas nor boto3, checked in a fresh
+interpreter.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPO_DIR
+
+HEAVY_MODULES = ["pandas", "numpy", "boto3", "botocore", "s3fs", "openpyxl", "pyarrow"]
+
+
+def imported_modules(code, cwd):
+    """
+    Run code in a fresh interpreter with the repository on its path, and get the heavy modules it imported.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport json, sys\nprint(json.dumps(sorted(name for name in {HEAVY_MODULES!r} if name in sys.modules)))"],
+        cwd=cwd, capture_output=True, text=True, env={**os.environ, "PYTHONPATH": REPO_DIR},
+    )
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("lambda_name", ["US_summary_comp", "IR_summary_comp"])
+def test_entry_point_import_is_light(lambda_name):
+    assert imported_modules("import lambda_function", os.path.join(REPO_DIR, lambda_name)) == []
+
+
+def test_stdlib_modules_are_light():
+    code = "import summary_comp.handler, summary_comp.runtime, summary_comp.storage, summary_comp.markets, summary_comp.metrics"
+    assert imported_modules(code, REPO_DIR) == []
+
+
+def test_event_of_an_unknown_bucket_is_routed_without_pandas():
+    code = (
+        "import lambda_function\n"
+        "event = {'Records': [{'s3': {'bucket': {'name': 'unknown-bucket'}, 'object': {'key': 'Daily_Dlry_Pmix_20240101.xlsx'}}}]}\n"
+        "assert lambda_function.lambda_handler(event, None)['statusCode'] == 400\n"
+        "assert lambda_function.lambda_handler({'Records': []}, None)['statusCode'] == 400"
+    )
+    assert imported_modules(code, os.path.join(REPO_DIR, "US_summary_comp")) == []
+
+
+def test_process_function_imports_pandas():
+    # the check above would pass vacuously if pandas was never importable
+    assert "pandas" in imported_modules("import summary_comp.process_function", REPO_DIR)
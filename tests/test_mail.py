@@ -0,0 +1,112 @@
+"""
+Tests of the email delivery of summary_comp.mail against the local SMTP sink of conftest.py: the
+retries of SMTPSession, the coalescing of NotificationQueue and the metrics of the emails sent by
+the queue of the handler.
+"""
+import functools
+import json
+import smtplib
+
+import pytest
+
+from summary_comp import mail, process_function
+from summary_comp.handler import lambda_handler
+from summary_comp.mail import NotificationQueue, SMTPSession, notify
+from summary_comp.metrics import StageMetrics
+
+RECEIVERS = ["receiver@example.com"]
+
+
+def message(market):
+    return {"subject": f"PMIX ( {market} ) Summary Comparison 20240101", "market": market, "overall summary status": "PASS"}
+
+
+def session(smtp_sink, **kwargs):
+    return SMTPSession("email-secret", "eu-west-1", smtp_sink.port, use_ssl=False, backoff_seconds=0, **kwargs)
+
+
+def test_transient_errors_are_retried(smtp_sink):
+    smtp_sink.refuse_data = 2
+    metrics = StageMetrics()
+    with session(smtp_sink, retries=2) as smtp_session:
+        notify(None, "email-secret", "eu-west-1", RECEIVERS, [], smtp_sink.port, message("us"), [], smtp_session, metrics)
+
+    assert len(smtp_sink.messages) == 1
+    assert smtp_session.connections == 3
+    assert metrics.stages["send_email"]["bytes_sent"] > 0
+
+
+def test_retries_give_up(smtp_sink):
+    smtp_sink.refuse_data = 3
+    with session(smtp_sink, retries=2) as smtp_session, pytest.raises(smtplib.SMTPDataError):
+        notify(None, "email-secret", "eu-west-1", RECEIVERS, [], smtp_sink.port, message("us"), [], smtp_session)
+
+    assert smtp_sink.messages == []
+
+
+def test_queue_coalesces_the_emails_of_a_window(smtp_sink):
+    metrics = StageMetrics()
+    sent = []
+    with session(smtp_sink) as smtp_session:
+        with NotificationQueue(smtp_session, window_seconds=60, metrics=metrics) as notification_queue:
+            for market in ("us", "ca", "ir"):
+                notification_queue.put(RECEIVERS, [], message(market), on_sent=functools.partial(sent.append, market))
+            notification_queue.put(["other@example.com"], [], message("uk"), on_sent=functools.partial(sent.append, "uk"))
+            assert smtp_sink.messages == []
+
+    assert len(smtp_sink.messages) == 2
+    assert notification_queue.sent == 2
+    assert notification_queue.failed == []
+    assert sorted(sent) == ["ca", "ir", "uk", "us"]
+    assert smtp_session.connections == 1
+    assert metrics.stages["send_email"]["bytes_sent"] > 0
+
+
+def test_queue_records_the_failed_emails(smtp_sink):
+    smtp_sink.refuse_data = 1
+    sent = []
+    with session(smtp_sink, retries=0) as smtp_session:
+        with NotificationQueue(smtp_session, window_seconds=60) as notification_queue:
+            for market in ("us", "ca"):
+                notification_queue.put(RECEIVERS, [], message(market), on_sent=functools.partial(sent.append, market))
+
+    assert smtp_sink.messages == []
+    assert notification_queue.sent == 0
+    assert [message_dict["market"] for message_dict, _ in notification_queue.failed] == ["us", "ca"]
+    assert sent == []
+
+
+def test_handler_emits_the_metrics_of_the_queued_emails(monkeypatch, capsys, runtime_context, smtp_sink):
+    with open(runtime_context.config_path, "w") as f:
+        json.dump({
+            "ENV": "Test", "secret_name": "email-secret", "region_name": "eu-west-1", "email_port": smtp_sink.port,
+            "receiver_email": RECEIVERS, "cc_recipients": [],
+            "paths": {"us": {"source_bucket": "portal-bucket", "GPT_file_path": "memory://gpt/", "output_s3_path": "memory://reports/"}},
+            "constants": {"portal_excel_sheet_names": {}, "path_prefixes": {}, "notification_window_seconds": 60, "smtp_backoff_seconds": 0},
+        }, f)
+
+    def generate_validation_report(**kwargs):
+        message_dict = message(kwargs["market"])
+        notify(
+            kwargs["notification_queue"], kwargs["secret_name"], kwargs["region_name"], kwargs["receiver_email"],
+            kwargs["cc_recipients"], kwargs["email_port"], message_dict, [], kwargs["smtp_session"],
+        )
+        return message_dict
+
+    monkeypatch.setattr(process_function, "generate_validation_report", generate_validation_report)
+    monkeypatch.setattr(mail, "SMTPSession", functools.partial(SMTPSession, use_ssl=False))
+    smtp_sink.refuse_data = 1
+    event = {"Records": [
+        {"s3": {"bucket": {"name": "portal-bucket"}, "object": {"key": f"Daily_Dlry_Pmix_2024010{day}.xlsx"}}} for day in (1, 2)
+    ]}
+
+    assert lambda_handler(event, None)["statusCode"] == 200
+
+    assert len(smtp_sink.messages) == 1
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+    assert len(lines) == 1
+    assert lines[0]["records"] == 2
+    assert lines[0]["emails_sent"] == 1
+    assert lines[0]["emails_failed"] == 0
+    assert lines[0]["send_email.bytes_sent"] > 0
+    assert {"Name": "send_email.duration_ms", "Unit": "Milliseconds"} in lines[0]["_aws"]["CloudWatchMetrics"][0]["Metrics"]
@@ -0,0 +1,108 @@
+"""
+Tests of summary_comp.metrics: the stages recorded by StageMetrics, the CloudWatch Embedded Metric
+Format document they are emitted as, and the EMF line of a validation.
+"""
+import json
+import threading
+
+import pytest
+
+from conftest import PATH_PREFIXES, SHEET_NAMES, write_fixtures
+from summary_comp.metrics import METRIC_UNITS, METRICS_NAMESPACE, StageMetrics
+from summary_comp.process_function import generate_validation_report
+
+
+def emf_lines(output):
+    """
+    Get the EMF documents printed to the log.
+    """
+    return [json.loads(line) for line in output.splitlines() if line.startswith('{"_aws"')]
+
+
+def test_stage_records_its_duration_and_values():
+    metrics = StageMetrics()
+    with metrics.stage("read") as stage:
+        stage["rows"] = 10
+        stage["bytes_read"] = None
+
+    assert set(metrics.stages["read"]) == {"rows", "duration_ms", "peak_rss_mb"}
+    assert metrics.stages["read"]["rows"] == 10
+    assert metrics.stages["read"]["duration_ms"] >= 0
+    assert metrics.stages["read"]["peak_rss_mb"] > 0
+
+
+def test_stage_is_recorded_when_it_raises():
+    metrics = StageMetrics()
+    with pytest.raises(RuntimeError), metrics.stage("send_email") as stage:
+        stage["attachments"] = 1
+        raise RuntimeError("SMTP error")
+
+    assert metrics.stages["send_email"]["attachments"] == 1
+
+
+def test_repeated_stages_add_up():
+    metrics = StageMetrics()
+    threads = [threading.Thread(target=metrics.add, args=("send_email",), kwargs={"bytes_sent": 100, "peak_rss_mb": rss}) for rss in range(1, 9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # the values add up, the peak RSS is the largest
+    assert metrics.stages["send_email"] == {"bytes_sent": 800, "peak_rss_mb": 8}
+
+
+def test_emf_document(capsys):
+    metrics = StageMetrics(Market="us")
+    metrics.add("read_files", duration_ms=12.5, rows=3, peak_rss_mb=100.0)
+    metrics.add("save_reports", bytes_written=2048, custom=1)
+    metrics.set_property(report_date="20240101")
+    metrics.emit()
+
+    [document] = emf_lines(capsys.readouterr().out)
+    [directive] = document["_aws"]["CloudWatchMetrics"]
+    assert directive["Namespace"] == METRICS_NAMESPACE
+    assert directive["Dimensions"] == [["Market"]]
+    assert directive["Metrics"] == [
+        {"Name": "read_files.duration_ms", "Unit": "Milliseconds"},
+        {"Name": "read_files.rows", "Unit": "Count"},
+        {"Name": "read_files.peak_rss_mb", "Unit": "Megabytes"},
+        {"Name": "save_reports.bytes_written", "Unit": "Bytes"},
+        {"Name": "save_reports.custom", "Unit": "None"},
+    ]
+    assert isinstance(document["_aws"]["Timestamp"], int)
+    # every metric and dimension is a member of the document, with the properties
+    assert document["Market"] == "us" and document["report_date"] == "20240101"
+    assert document["read_files.duration_ms"] == 12.5 and document["save_reports.bytes_written"] == 2048
+
+
+def test_validation_emits_one_emf_line(runtime_context, capsys):
+    paths = write_fixtures("memory://bucket/", "20240101", 100)
+    generate_validation_report(
+        "Test", "us", paths["portal_report_path"], paths["GPT_report_path"], paths["summary_report_path"],
+        SHEET_NAMES, PATH_PREFIXES, "unused", "unused", 0, [], send_notification=False,
+    )
+
+    [document] = emf_lines(capsys.readouterr().out)
+    names = [metric["Name"] for metric in document["_aws"]["CloudWatchMetrics"][0]["Metrics"]]
+    for name in names:
+        assert name in document
+        assert METRIC_UNITS.get(name.split(".")[-1]) is not None, name
+    for stage in ("generate_validation_report", "read_files", "read_portal_report", "read_GPT_summary_per_store", "save_reports"):
+        assert f"{stage}.duration_ms" in names
+    assert document["read_portal_report.bytes_read"] > 0 and document["save_reports.bytes_written"] > 0
+    assert document["Market"] == "us"
+    assert document["report_date"] == "20240101" and document["file"] == paths["portal_report_path"]
+
+
+def test_failed_validation_emits_its_error(runtime_context, capsys):
+    paths = write_fixtures("memory://bucket/", "20240101", 100)
+    with pytest.raises(FileNotFoundError):
+        generate_validation_report(
+            "Test", "us", paths["portal_report_path"].replace("20240101", "20240102"), paths["GPT_report_path"],
+            paths["summary_report_path"], SHEET_NAMES, PATH_PREFIXES, "unused", "unused", 0, [], send_notification=False,
+        )
+
+    [document] = emf_lines(capsys.readouterr().out)
+    assert document["error"].startswith("FileNotFoundError")
+    assert "generate_validation_report.duration_ms" in document
@@ -0,0 +1,138 @@
+"""
+Tests of the streamed emails of summary_comp.mail: the MIME message generated in chunks by
+mime_chunks, the attachments read block by block while it is consumed, and the replacement of the
+attachments above the cap by links (limit_attachments).
+"""
+import email
+import os
+from email.header import decode_header, make_header
+
+import pytest
+
+from summary_comp import mail
+from summary_comp.mail import ATTACHMENT_BLOCK_SIZE, Attachment, SMTPSession, limit_attachments, mime_chunks, send_email
+from summary_comp.runtime import get_storage
+
+# more than two blocks, and not a multiple of 57 bytes (one line of base64)
+ATTACHMENT_SIZE = 2 * ATTACHMENT_BLOCK_SIZE + 1000
+
+
+class CountingAttachment(Attachment):
+    """
+    An attachment counting the blocks read from it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.blocks_read = 0
+
+    def blocks(self, block_size=ATTACHMENT_BLOCK_SIZE):
+        for block in super().blocks(block_size):
+            self.blocks_read += 1
+            yield block
+
+
+@pytest.fixture
+def report(runtime_context):
+    """
+    A memory:// report of ATTACHMENT_SIZE random bytes, and its content.
+    """
+    content = os.urandom(ATTACHMENT_SIZE)
+    path = "memory://reports/PMIX_Validation_20240101.xlsx"
+    get_storage(path).put(path, content)
+    return path, content
+
+
+def test_mime_message_round_trips(report):
+    path, content = report
+    chunks = list(mime_chunks(
+        "sender@example.com", ["receiver@example.com"], ["cc@example.com"], "PMIX ( us ) Summary Comparison – 20240101",
+        "<html><body><p>Résumé</p></body></html>", [Attachment(path), Attachment(path, filename="copy.xlsx")],
+    ))
+    data = b"".join(chunks)
+
+    # the chunks can be sent after DATA as they are
+    lines = data.split(b"\r\n")
+    assert data.endswith(b"\r\n") and b"\n" not in data.replace(b"\r\n", b"")
+    assert not [line for line in lines if line.startswith(b".")]
+    assert max(len(line) for line in lines) <= 998
+    message = email.message_from_bytes(data)
+    assert str(make_header(decode_header(message["Subject"]))) == "PMIX ( us ) Summary Comparison – 20240101"
+    assert (message["To"], message["CC"]) == ("receiver@example.com", "cc@example.com")
+    html, *attachments = message.get_payload()
+    assert html.get_payload(decode=True).decode("utf-8") == "<html><body><p>Résumé</p></body></html>"
+    assert [attachment.get_filename() for attachment in attachments] == ["PMIX_Validation_20240101.xlsx", "copy.xlsx"]
+    assert [attachment.get_payload(decode=True) for attachment in attachments] == [content, content]
+
+
+def test_attachments_are_read_as_the_message_is_consumed(report):
+    path, _ = report
+    attachment = CountingAttachment(path)
+    chunks = mime_chunks("sender@example.com", ["receiver@example.com"], [], "subject", "<html></html>", [attachment])
+
+    next(chunks)
+    assert attachment.blocks_read == 0
+    # the headers, the body and the headers of the attachment, then one chunk per block
+    next(chunks), next(chunks), next(chunks)
+    assert attachment.blocks_read == 1
+    list(chunks)
+    assert attachment.blocks_read == 3
+
+
+def test_attachments_within_the_cap_are_kept(report):
+    path, _ = report
+    attachments = [Attachment(path)]
+    message_dict = {"subject": "subject"}
+
+    assert limit_attachments(attachments, message_dict, ATTACHMENT_SIZE) == (attachments, message_dict)
+    assert limit_attachments(attachments, message_dict, None) == (attachments, message_dict)
+
+
+def test_attachments_above_the_cap_are_linked(monkeypatch, report):
+    path, _ = report
+    s3_attachment = Attachment(path, link_path="s3://reports/PMIX_Validation_20240101.xlsx")
+    monkeypatch.setattr(s3_attachment, "link", lambda: "https://reports.s3.amazonaws.com/PMIX_Validation_20240101.xlsx?X-Amz-Signature=1")
+    failing_attachment = Attachment(path, filename="copy.xlsx", link_path="s3://reports/copy.xlsx")
+
+    def link():
+        raise RuntimeError("no credentials")
+
+    monkeypatch.setattr(failing_attachment, "link", link)
+    local_attachment = Attachment(path, filename="local.xlsx")
+    message_dict = {"subject": "subject"}
+
+    attachments, limited_message_dict = limit_attachments([s3_attachment, failing_attachment, local_attachment], message_dict, ATTACHMENT_SIZE)
+
+    assert attachments == []
+    assert message_dict == {"subject": "subject"}
+    assert limited_message_dict == {
+        "subject": "subject",
+        "PMIX_Validation_20240101.xlsx (too large to attach, link valid for 7 days)":
+            '<a href="https://reports.s3.amazonaws.com/PMIX_Validation_20240101.xlsx?X-Amz-Signature=1">PMIX_Validation_20240101.xlsx</a>',
+        "copy.xlsx (too large to attach)": "s3://reports/copy.xlsx",
+        "local.xlsx (too large to attach)": path,
+    }
+
+
+def test_s3_attachment_is_linked_to_itself():
+    assert Attachment("s3://reports/report.xlsx").link_path == "s3://reports/report.xlsx"
+    assert Attachment("/tmp/report.xlsx").link_path is None
+    assert Attachment("/tmp/report.xlsx", link_path="s3://reports/report.xlsx").filename == "report.xlsx"
+
+
+@pytest.mark.parametrize("max_attachment_bytes, attached", [(None, True), (ATTACHMENT_SIZE - 1, False)])
+def test_send_email_streams_the_attachment(monkeypatch, smtp_sink, report, max_attachment_bytes, attached):
+    path, _ = report
+    sent = []
+    monkeypatch.setattr(mail, "mime_chunks", lambda *args: sent.append(args) or mime_chunks(*args))
+    with SMTPSession("email-secret", "eu-west-1", smtp_sink.port, use_ssl=False, backoff_seconds=0) as smtp_session:
+        send_email(
+            "sender@example.com", ["receiver@example.com"], None, [], None, smtp_sink.port, {"subject": "subject", "status": "PASS"},
+            [path], smtp_session=smtp_session, max_attachment_bytes=max_attachment_bytes,
+        )
+
+    assert len(smtp_sink.messages) == 1
+    assert (smtp_sink.messages[0] > ATTACHMENT_SIZE * 4 / 3) == attached
+    html_content, attachments = sent[0][4], sent[0][5]
+    assert len(attachments) == attached
+    assert (f"(too large to attach):</b> {path}" in html_content) != attached
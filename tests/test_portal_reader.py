@@ -0,0 +1,52 @@
+"""
+Tests of read_portal_report: the streaming readers read the compared columns of the portal
+workbook with the values of the "pandas" reader.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import SHEET_NAMES, synthetic_reports, write_portal_workbook
+from summary_comp.process_function import portal_columns, read_portal_report
+
+STORES = 200
+
+
+@pytest.fixture(scope="module")
+def workbook(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("portal") / "Daily_Dlry_Pmix_20240101.xlsx")
+    reports = synthetic_reports(STORES, extra_columns=5)
+    reports["portal_summary_per_store"].loc[3, "sum_net_Sales"] = np.nan
+    write_portal_workbook(path, STORES, reports=reports)
+    return path, reports
+
+
+@pytest.mark.parametrize("portal_reader", ["openpyxl_stream", "calamine"])
+def test_streaming_readers_read_the_compared_columns_only(workbook, portal_reader):
+    path, reports = workbook
+    expected = read_portal_report(path, SHEET_NAMES)
+    overall_summary, summary_per_store = read_portal_report(path, SHEET_NAMES, portal_reader=portal_reader)
+
+    columns = portal_columns()
+    assert list(overall_summary.columns) == columns["portal_overall_summary"]
+    assert list(summary_per_store.columns) == columns["portal_summary_per_store"]
+    assert (summary_per_store.dtypes == "float64").all()
+    pd.testing.assert_frame_equal(summary_per_store, expected[1][columns["portal_summary_per_store"]], check_dtype=False)
+    pd.testing.assert_frame_equal(overall_summary, expected[0][columns["portal_overall_summary"]], check_dtype=False)
+    assert summary_per_store["sum_net_Sales"].isna().sum() == 1
+
+
+@pytest.mark.parametrize("portal_reader", ["openpyxl_stream", "calamine"])
+def test_missing_column_is_left_out(workbook, portal_reader):
+    path, _ = workbook
+    checks = [{"name": "Missing", "gpt_column": "missing", "portal_column": "not_in_the_sheet", "level": "store"}]
+    _, summary_per_store = read_portal_report(path, SHEET_NAMES, checks, portal_reader=portal_reader)
+
+    assert list(summary_per_store.columns) == ["global_store_id"]
+    assert len(summary_per_store) == STORES
+
+
+def test_unknown_reader():
+    with pytest.raises(ValueError, match="Unknown portal reader"):
+        read_portal_report("unused.xlsx", SHEET_NAMES, portal_reader="xlrd")
+
@@ -0,0 +1,99 @@
+"""
+Tests of read_files: the portal workbook and GPT's two files are read concurrently, each as a
+stage of the metrics, and a missing GPT file is reported in the message instead of raising.
+"""
+import threading
+
+import pandas as pd
+import pytest
+
+from conftest import PATH_PREFIXES, SHEET_NAMES, synthetic_reports, write_fixtures
+from summary_comp import process_function
+from summary_comp.metrics import StageMetrics
+from summary_comp.process_function import GPT_STORE_KEY, read_files
+from summary_comp.runtime import file_size, get_storage
+
+REPORT_DATE = "20240101"
+STORES = 200
+
+
+@pytest.fixture
+def paths(runtime_context):
+    return write_fixtures("memory://bucket/", REPORT_DATE, STORES, mismatch_rate=0.05, missing_rate=0.01)
+
+
+def GPT_path(paths, prefix):
+    return f"{paths['GPT_report_path']}{PATH_PREFIXES[prefix]}{REPORT_DATE}.txt.gz"
+
+
+def test_read_files(paths):
+    metrics = StageMetrics()
+    portal_overall, portal_per_store, GPT_overall, GPT_per_store, report_date, message_dict, status = read_files(
+        paths["portal_report_path"], paths["GPT_report_path"], SHEET_NAMES, PATH_PREFIXES, metrics=metrics,
+    )
+
+    reports = synthetic_reports(STORES, 0.05, 0.01)
+    assert (report_date, message_dict, status) == (REPORT_DATE, {}, "True")
+    assert len(portal_per_store) == STORES and list(portal_overall.columns) == list(reports["portal_overall_summary"].columns)
+    # GPT's total_units is read as total_alacarte_units, and only the store key and the columns of the checks are parsed
+    assert "total_alacarte_units" in GPT_overall.columns
+    assert sorted(GPT_per_store.columns) == sorted(reports["GPT_summary_per_store"].columns)
+    assert sorted(GPT_per_store[GPT_STORE_KEY]) == sorted(reports["GPT_summary_per_store"][GPT_STORE_KEY])
+    # one stage per file, with its size and rows
+    assert metrics.stages["read_portal_report"]["bytes_read"] == file_size(paths["portal_report_path"])
+    assert metrics.stages["read_portal_report"]["rows"] == 1 + STORES
+    assert metrics.stages["read_GPT_overall_summary"]["rows"] == 1
+    assert metrics.stages["read_GPT_summary_per_store"]["rows"] == len(GPT_per_store)
+    assert metrics.stages["read_GPT_summary_per_store"]["bytes_read"] == file_size(GPT_path(paths, "GPT_summary_per_store_path_prefix"))
+
+
+def test_files_are_read_concurrently(monkeypatch, paths):
+    # every reader waits for the two others, so the read only completes if the three run at once
+    barrier = threading.Barrier(3, timeout=5)
+    threads = set()
+
+    def read_portal_report(*args):
+        barrier.wait()
+        threads.add(threading.get_ident())
+        return pd.DataFrame({"#distinct_stores": [1]}), pd.DataFrame({"global_store_id": [1]})
+
+    def read_csv_file(path, **kwargs):
+        barrier.wait()
+        threads.add(threading.get_ident())
+        return pd.DataFrame({GPT_STORE_KEY.upper(): [1]})
+
+    monkeypatch.setattr(process_function, "read_portal_report", read_portal_report)
+    monkeypatch.setattr(process_function, "read_csv_file", read_csv_file)
+    result = read_files(paths["portal_report_path"], paths["GPT_report_path"], SHEET_NAMES, PATH_PREFIXES)
+
+    assert result[-1] == "True"
+    assert len(threads) == 3
+    assert list(result[3].columns) == [GPT_STORE_KEY]
+
+
+@pytest.mark.parametrize("prefix", ["GPT_overall_summary_path_prefix", "GPT_summary_per_store_path_prefix"])
+def test_missing_GPT_file(paths, prefix):
+    path = GPT_path(paths, prefix)
+    del get_storage(path).files[path]
+
+    portal_overall, portal_per_store, GPT_overall, GPT_per_store, report_date, message_dict, status = read_files(
+        paths["portal_report_path"], paths["GPT_report_path"], SHEET_NAMES, PATH_PREFIXES,
+    )
+
+    assert status == "False"
+    assert message_dict == {"error": f"File not found in the path : {path}"}
+    # the other files are still read
+    assert len(portal_per_store) == STORES
+    assert (GPT_overall.empty, GPT_per_store.empty) == (prefix == "GPT_overall_summary_path_prefix", prefix == "GPT_summary_per_store_path_prefix")
+
+
+def test_missing_portal_report_raises(paths):
+    with pytest.raises(FileNotFoundError):
+        read_files(paths["portal_report_path"].replace(REPORT_DATE, "20240102"), paths["GPT_report_path"], SHEET_NAMES, PATH_PREFIXES)
+
+
+def test_chunked_GPT_summary_per_store(paths):
+    GPT_per_store = read_files(paths["portal_report_path"], paths["GPT_report_path"], SHEET_NAMES, PATH_PREFIXES, store_chunksize=64)[3]
+
+    chunks = list(GPT_per_store)
+    assert [len(chunk) for chunk in chunks] == [64, 64, 64, 8]
@@ -0,0 +1,99 @@
+"""
+Tests of the result cache of generate_validation_report: a validation is only found in the cache
+once its email was sent, so that the retry of a delivery whose email failed sends it.
+"""
+import pytest
+
+from conftest import PATH_PREFIXES, SHEET_NAMES, write_fixtures
+from summary_comp.mail import NotificationQueue, SMTPSession
+from summary_comp.process_function import generate_validation_report, manifest_path
+from summary_comp.runtime import get_storage
+
+REPORT_DATE = "20240101"
+
+
+@pytest.fixture
+def paths(runtime_context):
+    return write_fixtures("memory://bucket/", REPORT_DATE, 50)
+
+
+def validate(paths, smtp_session, notification_queue=None, report_date=REPORT_DATE, **kwargs):
+    return generate_validation_report(
+        env = "Test",
+        market = "us",
+        portal_report_path = paths["portal_report_path"].replace(REPORT_DATE, report_date),
+        GPT_report_path = paths["GPT_report_path"],
+        summary_report_path = paths["summary_report_path"],
+        portal_excel_sheet_names = SHEET_NAMES,
+        path_prefixes = PATH_PREFIXES,
+        secret_name = "email-secret",
+        region_name = "eu-west-1",
+        email_port = smtp_session.port,
+        receiver_email = ["receiver@example.com"],
+        smtp_session = smtp_session,
+        result_cache = True,
+        notification_queue = notification_queue,
+        **kwargs
+    )
+
+
+def test_cache_hit_after_the_email_is_sent(paths, smtp_sink):
+    with SMTPSession("email-secret", "eu-west-1", smtp_sink.port, use_ssl=False) as smtp_session:
+        assert validate(paths, smtp_session)["result cache"] == "MISS"
+        assert validate(paths, smtp_session)["result cache"] == "HIT"
+    assert len(smtp_sink.messages) == 1
+
+
+def test_email_fails_retry_still_sends(paths, smtp_sink):
+    smtp_sink.refuse_data = 1
+    with SMTPSession("email-secret", "eu-west-1", smtp_sink.port, use_ssl=False, retries=0) as smtp_session:
+        with pytest.raises(Exception):
+            validate(paths, smtp_session)
+        assert not get_storage(paths["summary_report_path"]).exists(manifest_path(paths["summary_report_path"], REPORT_DATE))
+        assert smtp_sink.messages == []
+
+        assert validate(paths, smtp_session)["result cache"] == "MISS"
+    assert len(smtp_sink.messages) == 1
+
+
+def test_queued_email_fails_retry_still_sends(paths, smtp_sink):
+    smtp_sink.refuse_data = 1
+    with SMTPSession("email-secret", "eu-west-1", smtp_sink.port, use_ssl=False, retries=0) as smtp_session:
+        with NotificationQueue(smtp_session) as notification_queue:
+            message_dict = validate(paths, smtp_session, notification_queue)
+        assert [failed for failed, _ in notification_queue.failed] == [message_dict]
+        assert not get_storage(paths["summary_report_path"]).exists(manifest_path(paths["summary_report_path"], REPORT_DATE))
+
+        with NotificationQueue(smtp_session) as notification_queue:
+            assert validate(paths, smtp_session, notification_queue)["result cache"] == "MISS"
+        assert notification_queue.sent == 1
+        # the manifest is written once the queue sent the email
+        assert validate(paths, smtp_session)["result cache"] == "HIT"
+    assert len(smtp_sink.messages) == 1
+
+
+def test_cache_hit_email_attaches_the_delta_report(paths, smtp_sink):
+    write_fixtures("memory://bucket/", REPORT_DATE, 500, mismatch_rate=0.05)
+    write_fixtures("memory://bucket/", "20240102", 500, mismatch_rate=0.05, seed=1)
+    with SMTPSession("email-secret", "eu-west-1", smtp_sink.port, use_ssl=False) as smtp_session:
+        validate(paths, smtp_session, send_notification=False)
+        validate(paths, smtp_session, incremental=True, report_date="20240102")
+        message_dict = validate(paths, smtp_session, incremental=True, report_date="20240102", email_on_cache_hit=True)
+
+    assert message_dict["result cache"] == "HIT"
+    assert message_dict["delta report path"].endswith("PMIX_Validation_Delta_20240102.xlsx")
+    # the same report as the first email, not the full one
+    first_email, hit_email = smtp_sink.messages
+    assert abs(hit_email - first_email) < 100
+    assert hit_email < get_storage(message_dict["report path"]).size(message_dict["report path"]) * 4 / 3
+
+
+def test_cache_hit_email_respects_the_attachment_cap(paths, smtp_sink):
+    with SMTPSession("email-secret", "eu-west-1", smtp_sink.port, use_ssl=False) as smtp_session:
+        validate(paths, smtp_session)
+        message_dict = validate(paths, smtp_session, email_on_cache_hit=True, max_attachment_bytes=1024)
+
+    assert message_dict["result cache"] == "HIT"
+    first_email, hit_email = smtp_sink.messages
+    # the report is named in the body instead of being attached
+    assert hit_email < 4096 < first_email
@@ -0,0 +1,209 @@
+"""
+Tests of summary_comp.runtime: the config, the boto3 session and clients, the s3fs filesystem and
+the email secret are built once per container and reused by the warm invocations of the handler.
+"""
+import functools
+import importlib.util
+import io
+import json
+import os
+import types
+from collections import Counter
+
+import boto3
+import pytest
+import s3fs
+
+from conftest import PATH_PREFIXES, REPO_DIR, SHEET_NAMES, SMTPSink, write_fixtures
+from summary_comp import mail
+from summary_comp.handler import lambda_handler
+from summary_comp.mail import SMTPSession
+from summary_comp.runtime import check_constants
+from summary_comp.storage import LocalStorage
+
+REPORT_DATE = "20240101"
+CONFIG = {
+    "ENV": "Test",
+    "secret_name": "email-secret",
+    "region_name": "eu-west-1",
+    "email_port": 465,
+    "receiver_email": ["receiver@example.com"],
+    "cc_recipients": [],
+    "paths": {
+        "us": {
+            "source_bucket": "portal",
+            "GPT_file_path": "s3://gpt/",
+            "output_s3_path": "s3://reports/",
+        },
+    },
+    "constants": {
+        "portal_excel_sheet_names": SHEET_NAMES,
+        "path_prefixes": PATH_PREFIXES,
+        "storage": {"block_size": 1048576},
+        # the reports are linked with a presigned URL of the S3 client instead of being attached
+        "max_attachment_bytes": 1024,
+    },
+}
+
+
+def s3_event(key):
+    return {"Records": [{"s3": {"bucket": {"name": "portal"}, "object": {"key": key}}}]}
+
+
+@pytest.fixture
+def constructors(monkeypatch, runtime_context, tmp_path):
+    """
+    Count the boto3 sessions and clients, the s3fs filesystems, the Secrets Manager calls and the
+    reads of the config built by the handler, with stand-ins of boto3 and s3fs serving the buckets
+    "portal", "gpt" and "reports" from a local directory holding the reports of five days. The
+    emails are sent to a local SMTP sink.
+    """
+    counts = Counter()
+    s3_root = tmp_path / "s3"
+    for day in range(1, 6):
+        write_fixtures(str(s3_root), f"202401{day:02d}", 50, seed=day)
+
+    def local(path):
+        return str(s3_root / path.removeprefix("s3://"))
+
+    class Client:
+        def __init__(self, service_name):
+            self.service_name = service_name
+
+        def get_secret_value(self, SecretId):
+            counts["get_secret_value"] += 1
+            return {"SecretString": json.dumps({"EMAIL_HOST": "127.0.0.1", "EMAIL_HOST_USER": "sender@example.com", "EMAIL_HOST_PASSWORD": "password"})}
+
+        def get_object(self, Bucket, Key, Range):
+            start, end = map(int, Range.removeprefix("bytes=").split("-"))
+            with open(local(f"{Bucket}/{Key}"), "rb") as f:
+                f.seek(start)
+                return {"Body": io.BytesIO(f.read(end - start + 1))}
+
+        def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):
+            return f"https://{Params['Bucket']}.s3.amazonaws.com/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+    class Session:
+        def __init__(self, *args, **kwargs):
+            counts["session"] += 1
+
+        def client(self, service_name, region_name=None, config=None, **kwargs):
+            counts["client", service_name] += 1
+            return Client(service_name)
+
+    class S3FileSystem:
+        def __init__(self, *args, **kwargs):
+            counts["s3fs"] += 1
+
+        def open(self, path, mode="rb"):
+            return LocalStorage().open(local(path), mode)
+
+        def size(self, path):
+            return os.path.getsize(local(path))
+
+        def exists(self, path):
+            return os.path.exists(local(path))
+
+        def invalidate_cache(self, path=None):
+            pass
+
+        def ls(self, path, detail=True):
+            if not os.path.isdir(local(path)):
+                raise FileNotFoundError(path)
+            return [
+                {"name": path.removeprefix("s3://").rstrip("/") + "/" + name, "type": "file" if os.path.isfile(os.path.join(local(path), name)) else "directory"}
+                for name in os.listdir(local(path))
+            ]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("boto3.client builds a client outside of the runtime context")
+
+    monkeypatch.setattr(boto3.session, "Session", Session)
+    monkeypatch.setattr(boto3, "client", fail)
+    monkeypatch.setattr(s3fs, "S3FileSystem", S3FileSystem)
+    monkeypatch.setattr(mail, "SMTPSession", functools.partial(SMTPSession, use_ssl=False))
+
+    json_load = json.load
+
+    def load(*args, **kwargs):
+        counts["config"] += 1
+        return json_load(*args, **kwargs)
+
+    monkeypatch.setattr(json, "load", load)
+    with SMTPSink() as sink:
+        with open(runtime_context.config_path, "w") as f:
+            json.dump(dict(CONFIG, email_port=sink.port), f)
+        yield types.SimpleNamespace(counts=counts, sink=sink, s3_root=s3_root)
+
+
+def test_warm_invocations_build_no_clients(constructors):
+    counts = constructors.counts
+    cold = lambda_handler(s3_event("Daily_Dlry_Pmix_20240101.xlsx"), None)
+    assert cold["statusCode"] == 200
+    after_cold = Counter(counts)
+
+    for day in range(2, 6):
+        warm = lambda_handler(s3_event(f"Daily_Dlry_Pmix_202401{day:02d}.xlsx"), None)
+        assert warm["statusCode"] == 200
+
+    assert counts == after_cold
+    assert counts["config"] == 1
+    assert counts["get_secret_value"] == 1
+    assert counts["s3fs"] == 1
+    # one session for the container, whose clients are the Secrets Manager one and the S3 one of the storage backend
+    assert counts["session"] == 1
+    assert counts["client", "secretsmanager"] == 1
+    assert counts["client", "s3"] == 1
+    assert sorted(os.listdir(constructors.s3_root / "reports")) == [f"PMIX_Validation_202401{day:02d}.xlsx" for day in range(1, 6)]
+    assert len(constructors.sink.messages) == 5
+
+
+def test_unchanged_storage_settings_keep_the_backends(runtime_context):
+    runtime_context.configure_storage(block_size=1024)
+    storage = runtime_context.storage("s3://bucket/key")
+    runtime_context.configure_storage(block_size=1024)
+    assert runtime_context.storage("s3://bucket/other") is storage
+
+    runtime_context.configure_storage(block_size=2048)
+    assert runtime_context.storage("s3://bucket/key") is not storage
+    assert runtime_context.storage("s3://bucket/key").block_size == 2048
+
+
+def test_secret_is_fetched_again_after_its_ttl(constructors, runtime_context):
+    runtime_context.secret_ttl = 0
+    runtime_context.secret("email-secret", "eu-west-1")
+    runtime_context.secret("email-secret", "eu-west-1")
+    assert constructors.counts["get_secret_value"] == 2
+    assert constructors.counts["client", "secretsmanager"] == 1
+
+
+@pytest.mark.parametrize("market", ["US", "IR"])
+def test_shipped_configs_need_no_optional_package(monkeypatch, market):
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *args: None)
+    with open(os.path.join(REPO_DIR, f"{market}_summary_comp", "lambda_config.json")) as f:
+        check_constants(json.load(f)["constants"])
+
+
+@pytest.mark.parametrize("market", ["US", "IR"])
+def test_shipped_configs_keep_the_default_behavior(market):
+    # the optional modes are opt-in, a deployment turns them on in its own config
+    with open(os.path.join(REPO_DIR, f"{market}_summary_comp", "lambda_config.json")) as f:
+        constants = json.load(f)["constants"]
+    assert constants.get("portal_reader", "pandas") == "pandas"
+    assert constants.get("result_cache", False) is False
+    assert constants.get("notification_window_seconds", 0) == 0
+
+
+@pytest.mark.parametrize("constants, package", [
+    ({"output_formats": ["xlsx", "parquet"]}, "pyarrow"),
+    ({"excel_engine": "xlsxwriter"}, "xlsxwriter"),
+    ({"history": True}, "pyarrow"),
+])
+def test_missing_optional_package_fails_at_config_load(monkeypatch, runtime_context, constants, package):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *args: None if name == package else find_spec(name, *args))
+    with open(runtime_context.config_path, "w") as f:
+        json.dump(dict(CONFIG, constants=dict(CONFIG["constants"], **constants)), f)
+
+    with pytest.raises(ImportError, match=package):
+        lambda_handler(s3_event("Daily_Dlry_Pmix_20240101.xlsx"), None)
@@ -0,0 +1,165 @@
+"""
+Tests of the storage backends, summary_comp.storage: the file access of the in-memory store and of
+the local filesystem, and the routing of a path to its backend by scheme.
+"""
+import pytest
+
+from summary_comp.runtime import file_size, get_storage, list_directory, open_file, read_range
+from summary_comp.storage import STORAGE_BLOCK_SIZE, LocalStorage, MemoryStorage, S3Storage, Storage, storage_scheme
+
+
+@pytest.fixture(params=["memory", "local"])
+def root(request, runtime_context, tmp_path):
+    """
+    The root directory of a test on each backend, with a trailing "/".
+    """
+    return "memory://bucket/" if request.param == "memory" else str(tmp_path) + "/"
+
+
+def write(path, data):
+    with open_file(path, "wb") as f:
+        f.write(data)
+
+
+@pytest.mark.parametrize("path, scheme", [
+    ("s3://bucket/key.xlsx", "s3"),
+    ("memory://bucket/key.xlsx", "memory"),
+    ("/tmp/key.xlsx", "local"),
+    ("reports/key.xlsx", "local"),
+])
+def test_storage_scheme(path, scheme):
+    assert storage_scheme(path) == scheme
+
+
+def test_get_storage_picks_the_backend_by_scheme(runtime_context):
+    assert isinstance(get_storage("s3://bucket/key"), S3Storage)
+    assert isinstance(get_storage("memory://bucket/key"), MemoryStorage)
+    assert isinstance(get_storage("/tmp/key"), LocalStorage)
+    # one backend per scheme, shared by the paths
+    assert get_storage("memory://other/key") is get_storage("memory://bucket/key")
+    assert get_storage("s3://other/key") is get_storage("s3://bucket/key")
+
+
+def test_incomplete_backend_fails_at_instantiation():
+    class ListlessStorage(Storage):
+        def open(self, path, mode="rb"):
+            return open(path, mode)
+
+        def size(self, path):
+            return 0
+
+        def exists(self, path):
+            return True
+
+    with pytest.raises(TypeError, match="list"):
+        ListlessStorage()
+    with pytest.raises(TypeError):
+        Storage()
+
+
+def test_get_storage_uses_the_configured_settings(runtime_context):
+    assert get_storage("/tmp/key").block_size == STORAGE_BLOCK_SIZE
+    runtime_context.configure_storage(block_size=1024, cache_type="none", max_pool_connections=4)
+    storage = get_storage("s3://bucket/key")
+    assert (storage.block_size, storage.cache_type, storage.max_pool_connections) == (1024, "none", 4)
+
+
+def test_memory_files_survive_new_settings(runtime_context):
+    write("memory://bucket/a.bin", b"abc")
+    runtime_context.configure_storage(block_size=1)
+
+    assert get_storage("memory://bucket/a.bin").block_size == 1
+    assert get_storage("memory://bucket/a.bin").get("memory://bucket/a.bin") == b"abc"
+
+
+def test_write_and_read(root):
+    write(root + "reports/a.bin", b"0123456789")
+    with open_file(root + "reports/b.txt", "w") as f:
+        f.write("PMIX\n")
+
+    with open_file(root + "reports/a.bin") as f:
+        assert f.read() == b"0123456789"
+    with open_file(root + "reports/b.txt", "r") as f:
+        assert f.read() == "PMIX\n"
+    assert file_size(root + "reports/a.bin") == 10
+    assert read_range(root + "reports/a.bin", 2, 3) == b"234"
+    assert read_range(root + "reports/a.bin", 8, 5) == b"89"
+
+
+def test_overwrite(root):
+    write(root + "a.bin", b"old")
+    write(root + "a.bin", b"new content")
+
+    with open_file(root + "a.bin") as f:
+        assert f.read() == b"new content"
+
+
+def test_exists(root):
+    assert not get_storage(root).exists(root + "a.bin")
+    write(root + "a.bin", b"")
+
+    assert get_storage(root).exists(root + "a.bin")
+    assert not get_storage(root).exists(root + "b.bin")
+
+
+def test_missing_file(root):
+    with pytest.raises(FileNotFoundError):
+        open_file(root + "missing.bin")
+    with pytest.raises(FileNotFoundError):
+        file_size(root + "missing.bin")
+
+
+def test_list(root):
+    for name in ("a.bin", "b.txt", "sub/c.bin", "sub/deeper/d.bin"):
+        write(root + "dir/" + name, name.encode())
+
+    assert sorted(path for path, _ in list_directory(root + "dir/")) == [root + "dir/a.bin", root + "dir/b.txt"]
+    assert sorted(path for path, _ in list_directory(root + "dir", recursive=True)) == [
+        root + "dir/" + name for name in ("a.bin", "b.txt", "sub/c.bin", "sub/deeper/d.bin")
+    ]
+    assert all(modified > 0 for _, modified in list_directory(root + "dir/"))
+    assert list_directory(root + "missing/") == []
+
+
+def test_glob(root):
+    for name in ("Daily_Pmix_Summary_20240101.txt.gz", "Daily_Pmix_Summary_20240102.txt.gz", "Daily_Pmix_TotXStore_20240101.txt.gz", "sub/Daily_Pmix_Summary_20240103.txt.gz"):
+        write(root + "gpt/" + name, b"")
+    storage = get_storage(root)
+
+    assert storage.glob(root + "gpt/", "Daily_Pmix_Summary_*.txt.gz") == [
+        root + "gpt/Daily_Pmix_Summary_20240101.txt.gz", root + "gpt/Daily_Pmix_Summary_20240102.txt.gz",
+    ]
+    assert storage.glob(root + "gpt/", "*_20240101.*") == [
+        root + "gpt/Daily_Pmix_Summary_20240101.txt.gz", root + "gpt/Daily_Pmix_TotXStore_20240101.txt.gz",
+    ]
+    assert storage.glob(root + "gpt/", "*.xlsx") == []
+    assert storage.glob(root + "missing/", "*") == []
+
+
+def test_blocks_and_fingerprint(root):
+    data = bytes(range(256)) * 10
+    write(root + "a.bin", data)
+    write(root + "b.bin", data)
+    storage = get_storage(root)
+
+    blocks = list(storage.blocks(root + "a.bin", block_size=1000))
+    assert [len(block) for block in blocks] == [1000, 1000, 560]
+    assert b"".join(blocks) == data
+    assert storage.fingerprint(root + "a.bin").startswith("sha256:")
+    assert storage.fingerprint(root + "a.bin") == storage.fingerprint(root + "b.bin")
+    write(root + "b.bin", data[:-1])
+    assert storage.fingerprint(root + "a.bin") != storage.fingerprint(root + "b.bin")
+    assert storage.link(root + "a.bin", 60) is None
+
+
+def test_memory_file_is_visible_once_closed(runtime_context):
+    f = open_file("memory://bucket/a.bin", "wb")
+    f.write(b"data")
+    assert not get_storage("memory://bucket/").exists("memory://bucket/a.bin")
+    f.close()
+    assert get_storage("memory://bucket/").exists("memory://bucket/a.bin")
+
+
+def test_memory_storage_rejects_other_modes(runtime_context):
+    with pytest.raises(ValueError, match="mode"):
+        open_file("memory://bucket/a.bin", "ab")
@@ -0,0 +1,126 @@
+"""
+Tests of store_delta and store_delta_counts, the comparison of a store level summary with the one
+of the previous report date, and of the incremental validation saving it.
+"""
+import gc
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import PATH_PREFIXES, SHEET_NAMES, write_fixtures
+from summary_comp import process_function
+from summary_comp.process_function import STORE_CHANGES, generate_validation_report, load_checks, store_check_columns, store_delta, store_delta_counts
+from summary_comp.runtime import open_file
+
+CHECKS = [{"name": "Total Net Sales", "gpt_column": "total_net_sales", "portal_column": "sum_net_Sales", "level": "store"}]
+COLUMNS = store_check_columns(load_checks(CHECKS)[0])
+
+
+def summary(rows):
+    """
+    A store level summary of (store id, status, deviation) rows.
+    """
+    store_ids, statuses, deviations = zip(*rows)
+    return pd.DataFrame({
+        "Global_Store_Id": pd.array(store_ids, dtype="Int32"),
+        COLUMNS["deviation"]: np.array(deviations, dtype="float32"),
+        COLUMNS["status"]: pd.Categorical(statuses, categories=["PASS", "FAIL", ""]),
+    })
+
+
+PREVIOUS = summary([
+    (1, "PASS", 0.0),
+    (2, "FAIL", 10.0),
+    (4, "PASS", 0.0),
+    (5, "FAIL", 10.0),
+    (6, "FAIL", 10.0),
+    (7, "PASS", 0.01),
+    (None, "FAIL", 10.0),
+])
+CURRENT = summary([
+    (1, "FAIL", 10.0),
+    (2, "PASS", 0.0),
+    (3, "FAIL", 10.0),
+    (5, "FAIL", 20.0),
+    (6, "FAIL", 10.0),
+    (7, "PASS", 0.02),
+    (None, "PASS", 0.0),
+])
+
+
+def test_every_change_has_its_label():
+    delta = store_delta(PREVIOUS, CURRENT, CHECKS)
+
+    assert delta["Global_Store_Id"].tolist() == [1, 2, 3, 4, 5]
+    assert delta["Change"].tolist() == ["Newly failing", "Newly passing", "Appeared", "Disappeared", "Deviation changed"]
+    assert delta["Previous Status"].tolist() == ["PASS", "FAIL", "", "PASS", "FAIL"]
+    assert delta["Status"].tolist() == ["FAIL", "PASS", "FAIL", "", "FAIL"]
+    assert delta["Change in " + COLUMNS["deviation"]].tolist()[:2] == [10.0, -10.0]
+    assert delta["Change in " + COLUMNS["deviation"]].iloc[4] == 10.0
+
+
+def test_store_delta_counts():
+    previous = summary([(1, "PASS", 0.0), (2, "PASS", 0.0), (3, "PASS", 0.0), (4, "FAIL", 10.0), (5, "FAIL", 10.0)])
+    current = summary([(1, "FAIL", 10.0), (2, "FAIL", 10.0), (3, "FAIL", 10.0), (5, "FAIL", 20.0), (6, "PASS", 0.0), (7, "PASS", 0.0)])
+    counts = store_delta_counts(store_delta(previous, current, CHECKS))
+
+    assert list(counts) == STORE_CHANGES
+    assert counts == {"Newly failing": 3, "Newly passing": 0, "Appeared": 2, "Disappeared": 1, "Deviation changed": 1}
+
+
+def test_unchanged_summary_has_no_delta():
+    delta = store_delta(CURRENT, CURRENT, CHECKS)
+
+    assert delta.empty
+    assert store_delta_counts(delta) == dict.fromkeys(STORE_CHANGES, 0)
+
+
+def test_chunks_have_the_delta_of_the_whole_summary():
+    chunks = [CURRENT.iloc[:3], CURRENT.iloc[3:3], CURRENT.iloc[3:]]
+
+    pd.testing.assert_frame_equal(store_delta(PREVIOUS, chunks, CHECKS), store_delta(PREVIOUS, CURRENT, CHECKS))
+
+
+def validate(paths, report_date, **kwargs):
+    return generate_validation_report(
+        "Test", "us", paths["portal_report_path"].replace("20240101", report_date), paths["GPT_report_path"], paths["summary_report_path"],
+        SHEET_NAMES, PATH_PREFIXES, "unused", "unused", 0, [], send_notification=False, incremental=True, **kwargs,
+    )
+
+
+def test_delta_is_saved_with_the_parquet_output_only(runtime_context):
+    paths = write_fixtures("memory://bucket/", "20240101", 200, mismatch_rate=0.1)
+    write_fixtures("memory://bucket/", "20240102", 200, mismatch_rate=0.1, seed=1)
+    validate(paths, "20240101", output_formats=["parquet"])
+    message_dict = validate(paths, "20240102", output_formats=["parquet"])
+
+    assert message_dict["delta report path"] == (
+        "memory://bucket/reports/parquet/Daily_PMIX_Store_Delta/market=us/report_date=20240102/part-0.parquet"
+    )
+    with open_file(message_dict["delta report path"]) as f:
+        delta = pd.read_parquet(f)
+    assert store_delta_counts(delta) == {change: int(message_dict[f"stores {change.lower()}"]) for change in STORE_CHANGES}
+    assert len(delta) > 0
+
+
+def test_failed_comparison_leaves_no_lookup_pending(monkeypatch, runtime_context, caplog):
+    paths = write_fixtures("memory://bucket/", "20240102", 50)
+
+    def load_store_summary(*args):
+        raise OSError("previous summary not readable")
+
+    def store_level_summary(*args):
+        # fails once the load of the previous summary failed
+        time.sleep(0.1)
+        raise ValueError("comparison failed")
+
+    monkeypatch.setattr(process_function, "load_store_summary", load_store_summary)
+    monkeypatch.setattr(process_function, "store_level_summary", store_level_summary)
+    with caplog.at_level(logging.ERROR, logger="asyncio"), pytest.raises(ValueError, match="comparison failed"):
+        validate(paths, "20240102")
+    gc.collect()
+
+    assert "never retrieved" not in caplog.text
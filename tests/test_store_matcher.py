@@ -0,0 +1,92 @@
+"""
+Tests of match_stores and store_level_summary: the stores they match are the ones of the outer
+pd.merge store_level_summary was computed with before, with int ids on GPT's side and float ids
+with missing values on portal's side.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import synthetic_reports
+from summary_comp.process_function import (
+    GPT_STORE_KEY, PORTAL_STORE_KEY, load_checks, match_stores, store_check_columns, store_level_summary, update_status,
+)
+
+STORES = 2000
+
+
+@pytest.fixture
+def reports():
+    """
+    GPT's and portal's store summaries, shuffled, with portal's ids as floats and a few of them missing.
+    """
+    reports = synthetic_reports(STORES, mismatch_rate=0.05, missing_rate=0.02)
+    rng = np.random.default_rng(0)
+    GPT_summary_per_store = reports["GPT_summary_per_store"].sample(frac=1, random_state=1).reset_index(drop=True)
+    portal_summary_per_store = reports["portal_summary_per_store"].sample(frac=1, random_state=2).reset_index(drop=True)
+    portal_ids = portal_summary_per_store[PORTAL_STORE_KEY].astype("float64")
+    portal_ids[rng.random(len(portal_ids)) < 0.005] = np.nan
+    portal_summary_per_store[PORTAL_STORE_KEY] = portal_ids
+    return GPT_summary_per_store, portal_summary_per_store
+
+
+def merged_store_summary(GPT_summary_per_store, portal_summary_per_store, checks):
+    """
+    The store level summary computed with the outer merge, one row per store id.
+    """
+    merged = pd.merge(
+        GPT_summary_per_store[[GPT_STORE_KEY] + [check["gpt_column"] for check in checks]],
+        portal_summary_per_store[[PORTAL_STORE_KEY] + [check["portal_column"] for check in checks]],
+        left_on=GPT_STORE_KEY, right_on=PORTAL_STORE_KEY, how="outer", suffixes=("_GPT", "_portal"),
+    )
+    merged = merged[merged[GPT_STORE_KEY].notna() | merged[PORTAL_STORE_KEY].notna()]
+    summary = pd.DataFrame({"Global_Store_Id": merged[GPT_STORE_KEY].fillna(merged[PORTAL_STORE_KEY]).astype("int64").to_numpy()})
+    for i, check in enumerate(checks):
+        columns = store_check_columns(check)
+        summary[columns["GPT"]] = merged.iloc[:, 1 + i].to_numpy(dtype="float64")
+        summary[columns["portal"]] = merged.iloc[:, 2 + len(checks) + i].to_numpy(dtype="float64")
+        # the checks with decimals compare the values rounded to their units
+        if check["decimals"] is None:
+            summary[columns["deviation"]] = summary[columns["GPT"]] - summary[columns["portal"]]
+        else:
+            summary[columns["deviation"]] = summary[columns["GPT"]].round(check["decimals"]) - summary[columns["portal"]].round(check["decimals"])
+    summary = pd.concat([summary, update_status(summary, checks)], axis=1)
+    return summary.sort_values("Global_Store_Id", ignore_index=True)
+
+
+def test_match_stores_matches_the_outer_merge(reports):
+    GPT_summary_per_store, portal_summary_per_store = reports
+    match = match_stores(GPT_summary_per_store[GPT_STORE_KEY], portal_summary_per_store[PORTAL_STORE_KEY])
+    merged = pd.merge(
+        GPT_summary_per_store[[GPT_STORE_KEY]], portal_summary_per_store[[PORTAL_STORE_KEY]],
+        left_on=GPT_STORE_KEY, right_on=PORTAL_STORE_KEY, how="outer",
+    )
+
+    assert len(match["store_ids"]) == len(merged)
+    assert (match["GPT_rows"] >= 0).sum() == merged[GPT_STORE_KEY].notna().sum()
+    assert (match["portal_rows"] >= 0).sum() == len(portal_summary_per_store)
+    assert set(match["GPT_only"]) == set(merged.loc[merged[PORTAL_STORE_KEY].isna() & merged[GPT_STORE_KEY].notna(), GPT_STORE_KEY])
+    assert ((match["GPT_rows"] >= 0) & (match["portal_rows"] >= 0)).sum() == (merged[GPT_STORE_KEY] == merged[PORTAL_STORE_KEY]).sum()
+
+
+def test_store_level_summary_matches_the_outer_merge(reports):
+    GPT_summary_per_store, portal_summary_per_store = reports
+    checks = [check for check in load_checks() if check["level"] == "store"]
+    expected = merged_store_summary(GPT_summary_per_store, portal_summary_per_store, checks)
+
+    summary_store = store_level_summary(GPT_summary_per_store, portal_summary_per_store)
+    # the portal rows without a store id, left out of the comparison by store id
+    assert summary_store["Global_Store_Id"].isna().sum() == portal_summary_per_store[PORTAL_STORE_KEY].isna().sum()
+    summary_store = summary_store[summary_store["Global_Store_Id"].notna()].reset_index(drop=True)
+
+    assert summary_store["Global_Store_Id"].astype("int64").tolist() == expected["Global_Store_Id"].tolist()
+    for column in expected.columns[1:]:
+        if isinstance(expected[column].dtype, pd.CategoricalDtype):
+            assert summary_store[column].astype(str).tolist() == expected[column].astype(str).tolist(), column
+        else:
+            np.testing.assert_allclose(summary_store[column].astype("float64"), expected[column], rtol=1e-6, atol=1e-9, err_msg=column)
+    store_match = np.select(
+        [expected[store_check_columns(checks[0])["GPT"]].isna(), expected[store_check_columns(checks[0])["portal"]].isna()],
+        ["Portal only", "GPT only"], default="Both",
+    )
+    assert summary_store["Store Match"].astype(str).tolist() == store_match.tolist()
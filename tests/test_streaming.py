@@ -0,0 +1,97 @@
+"""
+Tests of the streamed comparison of GPT's TotXStore file (store_chunksize): its reports, parquet
+files, history and store delta are the ones of the loaded comparison, and its peak memory does
+not grow with the stores of GPT's file.
+"""
+import json
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from conftest import PATH_PREFIXES, REPO_DIR, SHEET_NAMES, write_fixtures
+from summary_comp.history import HistoryStore
+from summary_comp.process_function import generate_validation_report
+from summary_comp.runtime import open_file
+
+STORES = 1000
+# the peak RSS of a validation, run in a new process with the parquet output only
+PEAK_RSS_SCRIPT = """
+import json, sys
+from summary_comp.metrics import peak_rss_mb
+from summary_comp.process_function import generate_validation_report
+paths, sheet_names, path_prefixes, store_chunksize = map(json.loads, sys.argv[1:])
+generate_validation_report(
+    "Test", "us", paths["portal_report_path"], paths["GPT_report_path"], paths["summary_report_path"],
+    sheet_names, path_prefixes, "unused", "unused", 0, [], store_chunksize = store_chunksize,
+    send_notification = False, output_formats = ["parquet"],
+)
+print(peak_rss_mb())
+"""
+
+
+def validate(paths, summary_report_path, report_date, **kwargs):
+    return generate_validation_report(
+        "Test", "us", paths["portal_report_path"].replace("20240101", report_date), paths["GPT_report_path"], summary_report_path,
+        SHEET_NAMES, PATH_PREFIXES, "unused", "unused", 0, [], send_notification=False,
+        output_formats=["xlsx", "parquet"], history_path=summary_report_path + "history/", **kwargs,
+    )
+
+
+def read_sheet(path, sheet_name, sort_columns):
+    with open_file(path) as f:
+        return pd.read_excel(f, sheet_name=sheet_name).sort_values(sort_columns, ignore_index=True)
+
+
+@pytest.mark.parametrize("excel_engine", ["openpyxl", "xlsxwriter"])
+def test_streamed_validation_has_the_outputs_of_the_loaded_one(runtime_context, excel_engine):
+    paths = write_fixtures("memory://bucket/", "20240101", STORES, mismatch_rate=0.05, missing_rate=0.01)
+    write_fixtures("memory://bucket/", "20240102", STORES, mismatch_rate=0.05, missing_rate=0.01, seed=1)
+    messages = {}
+    for mode, store_chunksize in (("loaded", None), ("streamed", 300)):
+        summary_report_path = f"memory://bucket/{mode}/"
+        validate(paths, summary_report_path, "20240101")
+        messages[mode] = validate(
+            paths, summary_report_path, "20240102", store_chunksize=store_chunksize, excel_engine=excel_engine, incremental=True,
+        )
+
+    paths_keys = ("report path", "parquet path", "history path", "delta report path")
+    assert {key: value for key, value in messages["streamed"].items() if key not in paths_keys} == {
+        key: value for key, value in messages["loaded"].items() if key not in paths_keys
+    }
+    assert messages["loaded"]["stores only in GPT"] == "10"
+    assert int(messages["loaded"]["stores newly failing"]) > 0
+    for sheet_name, sort_columns in (("Daily_PMIX_TotXStore", ["Global_Store_Id"]), ("Daily_PMIX_Store_Delta", ["Change", "Global_Store_Id"])):
+        pd.testing.assert_frame_equal(
+            read_sheet(messages["streamed"]["report path"], sheet_name, sort_columns),
+            read_sheet(messages["loaded"]["report path"], sheet_name, sort_columns),
+        )
+    parquet_path = "parquet/Daily_PMIX_TotXStore/market=us/report_date=20240102/part-0.parquet"
+    parquet_summaries = {}
+    for mode in messages:
+        with open_file(f"memory://bucket/{mode}/{parquet_path}") as f:
+            parquet_summaries[mode] = pd.read_parquet(f).sort_values("Global_Store_Id", ignore_index=True)
+    # the chunks are written with the widest of their compact types
+    pd.testing.assert_frame_equal(parquet_summaries["streamed"], parquet_summaries["loaded"], check_dtype=False)
+    histories = {
+        mode: HistoryStore(f"memory://bucket/{mode}/history/").read(end_date="20240102", days=1)
+        .drop(columns="report_date").sort_values(["Check", "Global_Store_Id"], ignore_index=True)
+        for mode in messages
+    }
+    pd.testing.assert_frame_equal(histories["streamed"], histories["loaded"], check_categorical=False)
+
+
+def test_streamed_validation_of_a_multi_country_file_fits_in_512_mb(tmp_path):
+    # one million stores in GPT's file, as many rows as a multi-country file, the portal's has a thousand
+    paths = write_fixtures(str(tmp_path), "20240101", 1000, GPT_stores=1_000_000)
+    peak_rss_mb = {}
+    for mode, store_chunksize in (("loaded", None), ("streamed", 50000)):
+        output = subprocess.run(
+            [sys.executable, "-c", PEAK_RSS_SCRIPT] + [json.dumps(value) for value in (paths, SHEET_NAMES, PATH_PREFIXES, store_chunksize)],
+            cwd=REPO_DIR, check=True, capture_output=True, text=True,
+        ).stdout
+        peak_rss_mb[mode] = float(output.strip().splitlines()[-1])
+
+    assert peak_rss_mb["streamed"] < 512
+    assert peak_rss_mb["streamed"] < peak_rss_mb["loaded"] * 0.6, peak_rss_mb